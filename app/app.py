@@ -2,10 +2,12 @@ import os
 
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from app.config import DevelopmentConfig, ProductionConfig
 from app.redprints import register_redprints
 from extensions.db import init_db, init_redis
+from utils.session_utils import REFRESHED_TOKEN_HEADER
 
 
 def create_app():
@@ -13,7 +15,7 @@ def create_app():
 
     # 允许所有跨域请求 
     # TODO 安全设置
-    CORS(app)
+    CORS(app, expose_headers=[REFRESHED_TOKEN_HEADER])
 
     # 根据环境变量加载配置
     if os.getenv('FLASK_ENV') == 'production':
@@ -21,6 +23,11 @@ def create_app():
     else:
         app.config.from_object(DevelopmentConfig)
 
+    # 部署在反向代理之后时，从可信代理添加的请求头中获取客户端 IP 和协议
+    if app.config['PROXY_FIX_HOPS'] > 0:
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
     # 初始化数据库
     init_db(app)
 
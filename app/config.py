@@ -18,16 +18,49 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
 
     # 从环境变量加载 Token Expiry
-    TOKEN_EXPIRY = os.getenv('TOKEN_EXPIRY')
+    TOKEN_EXPIRY = int(os.getenv('TOKEN_EXPIRY', 7200))
 
     # 从环境变量加载 Token 强制刷新的阈值
-    REFRESH_THRESHOLD = os.getenv('REFRESH_THRESHOLD')
+    REFRESH_THRESHOLD = int(os.getenv('REFRESH_THRESHOLD', 1800))
+
+    # 从环境变量加载 Token 刷新后旧 Token 的宽限期（秒），宽限期内同一设备的旧 Token 仍然有效，为 0 时不启用
+    TOKEN_GRACE_PERIOD = int(os.getenv('TOKEN_GRACE_PERIOD', 30))
+
+    # 从环境变量加载进程内已校验 Token 缓存的最大条目数
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+    # 从环境变量加载 Token 校验模式，redis 表示每次请求与 Redis 中的会话对比，stateless 表示只校验签名、有效期和进程内的吊销列表
+    TOKEN_VALIDATION_MODE = os.getenv('TOKEN_VALIDATION_MODE', 'redis')
+
+    # 从环境变量加载进程启动后等待吊销列表首次同步的时间（秒），超时后无状态模式下拒绝请求
+    REVOCATION_SYNC_TIMEOUT = int(os.getenv('REVOCATION_SYNC_TIMEOUT', 3))
+
+    # 从环境变量加载吊销列表同步连接断开后的重连间隔（秒）
+    REVOCATION_RETRY_INTERVAL = int(os.getenv('REVOCATION_RETRY_INTERVAL', 1))
 
     # 从环境变量加载多次登录失败锁定时间
-    LOCK_TIME = os.getenv('LOCK_TIME')
+    LOCK_TIME = int(os.getenv('LOCK_TIME', 900))
 
     # 从环境变量加载最大登录尝试次数
-    MAX_LOGIN_ATTEMPTS = os.getenv('MAX_LOGIN_ATTEMPTS')
+    MAX_LOGIN_ATTEMPTS = int(os.getenv('MAX_LOGIN_ATTEMPTS', 5))
+
+    # 从环境变量加载密码哈希的算法和参数，例如 scrypt:32768:8:1、pbkdf2:sha256:600000，变更后旧哈希在下次登录时重新计算
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+
+    # 从环境变量加载计算密码哈希的线程数
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+
+    # 从环境变量加载等待计算密码哈希的最大任务数，超出时直接拒绝请求，应小于服务器的请求线程数
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 8))
+
+    # 从环境变量加载单个客户端 IP 登录失败限流的滑动窗口长度（秒）
+    LOGIN_IP_WINDOW = int(os.getenv('LOGIN_IP_WINDOW', 60))
+
+    # 从环境变量加载单个客户端 IP 在滑动窗口内最多的登录失败次数，成功的登录不计入
+    LOGIN_IP_LIMIT = int(os.getenv('LOGIN_IP_LIMIT', 20))
+
+    # 从环境变量加载应用前可信的反向代理层数，大于 0 时根据 X-Forwarded-For 等请求头获取客户端 IP，直接对外服务时必须为 0
+    PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', 0))
 
     # 从环境变量中加载 Redis URL
     SESSION_REDIS = redis.from_url(os.getenv('REDIS_URL'))
@@ -38,15 +71,85 @@ class Config:
     # 从环境变量中加载 AppSecret
     WECHAT_APP_SECRET = os.getenv('WECHAT_APP_SECRET')
 
+    # 从环境变量中加载微信接口地址，可指向本地模拟服务用于测试和压测
+    WECHAT_API_BASE_URL = os.getenv('WECHAT_API_BASE_URL', 'https://api.weixin.qq.com')
+
+    # 从环境变量中加载微信接口的连接超时时间（秒）
+    WECHAT_CONNECT_TIMEOUT = float(os.getenv('WECHAT_CONNECT_TIMEOUT', 3))
+
+    # 从环境变量中加载微信接口的读取超时时间（秒）
+    WECHAT_READ_TIMEOUT = float(os.getenv('WECHAT_READ_TIMEOUT', 5))
+
+    # 从环境变量中加载微信接口连接失败时的最大重试次数，已发出的请求不重试
+    WECHAT_MAX_RETRIES = int(os.getenv('WECHAT_MAX_RETRIES', 2))
+
+    # 从环境变量中加载微信接口重试的退避系数（秒）
+    WECHAT_RETRY_BACKOFF = float(os.getenv('WECHAT_RETRY_BACKOFF', 0.3))
+
+    # 从环境变量中加载微信接口的连接池大小
+    WECHAT_POOL_SIZE = int(os.getenv('WECHAT_POOL_SIZE', 10))
+
+    # 从环境变量中加载微信接口熔断的连续失败次数
+    WECHAT_BREAKER_THRESHOLD = int(os.getenv('WECHAT_BREAKER_THRESHOLD', 5))
+
+    # 从环境变量中加载微信接口熔断的持续时间（秒）
+    WECHAT_BREAKER_RESET = int(os.getenv('WECHAT_BREAKER_RESET', 30))
+
     # 从环境变量中加载 AES KEY
     AES_KEY = os.getenv('AES_KEY')
 
+    # 从环境变量中加载 AES 密钥环，格式为 “编号:Base64密钥,编号:Base64密钥”，AES_KEY 的编号为 0
+    AES_KEYS = os.getenv('AES_KEYS')
+
+    # 从环境变量中加载当前用于加密的 AES 密钥编号
+    AES_KEY_ID = int(os.getenv('AES_KEY_ID', 0))
+
+    # 从环境变量中加载盲索引的 HMAC KEY
+    BLIND_INDEX_KEY = os.getenv('BLIND_INDEX_KEY')
+
+    # 从环境变量中加载整页批量解密的线程数，不大于 1 时不使用线程池
+    DECRYPT_WORKERS = int(os.getenv('DECRYPT_WORKERS', 0))
+
+    # 从环境变量中加载加解密后端，可选 pycryptodome、cryptography，auto 表示在当前主机上测速后选择较快的后端
+    CRYPTO_BACKEND = os.getenv('CRYPTO_BACKEND', 'auto')
+
+    # 从环境变量中加载启用进程内明文缓存的加密字段，格式为 “表名.字段名,表名.字段名”，为空时不启用
+    PLAINTEXT_CACHE_FIELDS = os.getenv('PLAINTEXT_CACHE_FIELDS', 'departments.code,departments.name')
+
+    # 从环境变量中加载进程内明文缓存的最大条目数
+    PLAINTEXT_CACHE_SIZE = int(os.getenv('PLAINTEXT_CACHE_SIZE', 1024))
+
+    # 从环境变量中加载进程内明文缓存的有效期（秒）
+    PLAINTEXT_CACHE_TTL = int(os.getenv('PLAINTEXT_CACHE_TTL', 300))
+
+    # 从环境变量中加载用户凭据在 Redis 中的缓存时间（秒）
+    PRINCIPAL_REDIS_TTL = int(os.getenv('PRINCIPAL_REDIS_TTL', 3600))
+
+    # 从环境变量中加载用户凭据在进程内的缓存时间（秒）
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 5))
+
+    # 从环境变量中加载进程内用户凭据缓存的最大条目数
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 10000))
+
+    # 从环境变量中加载权限版本在进程内的缓存时间（秒）
+    PERMISSION_VERSION_CACHE_TTL = int(os.getenv('PERMISSION_VERSION_CACHE_TTL', 5))
+
+    # 从环境变量加载批量管理接口单次最多处理的用户数量
+    BULK_USER_LIMIT = int(os.getenv('BULK_USER_LIMIT', 5000))
+
+    # 从环境变量加载管理员激活、停用用户和设置密码（含批量接口）所需的权限名称，
+    # 部署后执行 flask seed-permissions --role 角色名称 创建该权限并授予管理员角色
+    USER_ADMIN_PERMISSION = os.getenv('USER_ADMIN_PERMISSION', 'user_admin')
+
     # 从环境变量中加载 PUBLIC KEY
     PUBLIC_KEY = os.getenv('PUBLIC_KEY')
 
     # 从环境变量中加载 PRIVATE KEY
     PRIVATE_KEY = os.getenv('PRIVATE_KEY')
 
+    # 从环境变量中加载 AES 会话密钥在 Redis 中的缓存时间（秒）
+    ENVELOPE_SESSION_TTL = int(os.getenv('ENVELOPE_SESSION_TTL', 1800))
+
     # 从环境变量中加载密钥对存放目录路径
     KEYS_DIR = os.getenv('KEYS_DIR')
 
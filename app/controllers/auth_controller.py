@@ -7,22 +7,25 @@
 # 描述: 认证与授权逻辑控制器
 """
 
-from datetime import datetime, timedelta
-
-import jwt
-import requests
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
 
 from app.config import Config
-from app.models import User, VisitorLog, Permission, RolePermission
-from extensions.db import redis_client, db
+from app.models import User, VisitorLog, Permission, RolePermission, UserDepartment
+from extensions.db import db, redis_client
+from utils.crypto_utils import register_envelope_session
 from utils.format_utils import format_response
+from utils.password_utils import PasswordQueueFull, hash_password, verify_password, needs_rehash
+from utils.principal_utils import invalidate_principal, invalidate_principals
 from utils.random_utils import generate_random_string
+from utils.session_utils import generate_token, store_token, revoke_session, revoke_sessions, normalize_device_id
+from utils.throttle_utils import LOGIN_LOCKED, LOGIN_RATE_LIMITED, check_login, record_login_failure, \
+    reset_login_failures
+from utils.wechat_utils import WeChatUnavailable, get_wechat_client
 
 
 class AuthController:
     @staticmethod
-    def login(data):
+    def login(data, ip=None):
         """用户登录认证"""
 
         # 校验用户名是否有效
@@ -36,61 +39,60 @@ class AuthController:
         username = data['username']
         password = data['password']
 
-        # 检查用户是否被锁定
-        lock_key = f"lock_{username}"
-        if redis_client.get(lock_key):
+        # 检查用户是否被锁定，以及客户端 IP 是否登录失败过于频繁，在校验密码和查询数据库之前拒绝
+        result = check_login(username, ip)
+        if result == LOGIN_LOCKED:
             return format_response(False, error='账户已锁定，请稍后再试'), 403
+        if result == LOGIN_RATE_LIMITED:
+            return format_response(False, error='登录失败次数过多，请稍后再试'), 429
 
         # 查找现有的用户信息
         user = User.query.filter_by(username=username, is_deleted=False).first()
 
-        # 校验用户名和密码是否正确
-        if user and check_password_hash(user.password_hash, password):
+        # 校验用户名和密码是否正确，密码哈希在独立的线程池中计算
+        try:
+            verified = user is not None and verify_password(user.password_hash, password)
+        except PasswordQueueFull:
+            return format_response(False, error='登录请求繁忙，请稍后再试'), 503
+
+        if verified:
             # 清除失败次数
-            redis_client.delete(f"login_attempts_{username}")
+            reset_login_failures(username)
 
             # 检测用户激活状态
             if not user.is_active:
                 return format_response(False, error='用户已处于停用状态'), 400
 
-            # 生成 token
-            now = datetime.now()
-            token = jwt.encode(
-                {
-                    'id': user.id,
-                    'exp': now + timedelta(seconds=Config.TOKEN_EXPIRY),
-                    'refresh_time': now + timedelta(seconds=Config.TOKEN_EXPIRY - Config.REFRESH_THRESHOLD)
-                },
-                Config.JWT_SECRET_KEY, algorithm="HS256"
-            )
-
-            # 将 Token 存入 Redis
-            redis_client.set(user.id, token, ex=Config.TOKEN_EXPIRY)
+            # 密码哈希的算法或参数已过时，使用本次登录的明文按当前配置重新计算
+            if needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = hash_password(password)
+                    db.session.commit()
+                except PasswordQueueFull:
+                    pass
+                except Exception:
+                    db.session.rollback()
+
+            # 生成当前设备的 token
+            device_id = normalize_device_id(data.get('device_id'))
+            token = generate_token(user.id, device_id)
+
+            # 将 Token 存入 Redis，不影响用户在其他设备上的登录
+            store_token(user.id, device_id, token)
             return format_response(True, {'token': token}), 200
 
-        # 登录失败，记录失败次数
-        attempts_key = f"login_attempts_{username}"
-        attempts = redis_client.get(attempts_key)
-
-        if attempts:
-            attempts = int(attempts)
-            if attempts + 1 >= Config.MAX_LOGIN_ATTEMPTS:
-                # 锁定账户
-                redis_client.set(lock_key, "locked", ex=Config.LOCK_TIME)
-                return format_response(False, error='账户已锁定，请稍后再试'), 403
-            else:
-                redis_client.incr(attempts_key)
-        else:
-            redis_client.set(attempts_key, 1, ex=Config.LOCK_TIME)
+        # 登录失败，记录失败次数，达到最大次数时锁定账户
+        if record_login_failure(username, ip):
+            return format_response(False, error='账户已锁定，请稍后再试'), 403
 
         return format_response(False, error='用户名或密码错误'), 401
 
     @staticmethod
-    def logout(user):
-        """用户注销"""
+    def logout(user, device_id=None):
+        """用户注销，只注销当前设备"""
         try:
-            # 从 Redis 中删除用户的 Token
-            redis_client.delete(user.id)
+            # 从 Redis 中删除用户在当前设备上的 Token
+            revoke_session(user.id, device_id)
             return format_response(True, {'message': '注销成功'}), 200
         except Exception as e:
             return format_response(False, error=f'注销失败: {str(e)}'), 500
@@ -130,12 +132,15 @@ class AuthController:
         old_password = data['old_password']
         new_password = data['new_password']
 
-        # 校验旧密码是否正确
-        if not check_password_hash(user.password_hash, old_password):
-            return format_response(False, error='旧密码不正确'), 400
+        try:
+            # 校验旧密码是否正确
+            if not verify_password(user.password_hash, old_password):
+                return format_response(False, error='旧密码不正确'), 400
 
-        # 更新新密码
-        user.password_hash = generate_password_hash(new_password)
+            # 更新新密码
+            user.password_hash = hash_password(new_password)
+        except PasswordQueueFull:
+            return format_response(False, error='服务繁忙，请稍后再试'), 503
 
         # 提交数据库更新
         try:
@@ -145,7 +150,8 @@ class AuthController:
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
         # 清除用户的 Token（要求重新登录）
-        redis_client.delete(user.id)
+        revoke_session(user.id)
+        invalidate_principal(user.id)
 
         return format_response(False, error='密码修改成功，请重新登录'), 200
 
@@ -167,7 +173,10 @@ class AuthController:
             return format_response(False, error='用户不存在'), 403
 
         # 设置新密码
-        user.password_hash = generate_password_hash(new_password)
+        try:
+            user.password_hash = hash_password(new_password)
+        except PasswordQueueFull:
+            return format_response(False, error='服务繁忙，请稍后再试'), 503
 
         # 提交数据库更新
         try:
@@ -177,7 +186,8 @@ class AuthController:
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
         # 清除用户的 Token（要求重新登录）
-        redis_client.delete(user.id)
+        revoke_session(user.id)
+        invalidate_principal(user.id)
 
         return format_response(True, {'message': '密码已成功更新'}), 200
 
@@ -191,19 +201,16 @@ class AuthController:
 
         code = data['code']
 
-        # 微信小程序的 AppID 和 AppSecret
-        app_id = Config.WECHAT_APP_ID
-        app_secret = Config.WECHAT_APP_SECRET
-
         # 向微信服务器发送请求，获取 openid 和 session_key
-        url = f"https://api.weixin.qq.com/sns/jscode2session?appid={app_id}&secret={app_secret}&js_code={code}&grant_type=authorization_code"
-        response = requests.get(url)
-        data = response.json()
+        try:
+            wechat_session = get_wechat_client().code2session(code)
+        except WeChatUnavailable:
+            return format_response(False, error='微信服务暂不可用，请稍后再试'), 503
 
-        if 'openid' not in data or not data['openid']:
+        if 'openid' not in wechat_session or not wechat_session['openid']:
             return format_response(False, error='无法获取 openid'), 400
 
-        openid = data['openid']
+        openid = wechat_session['openid']
 
         # 在数据库中检查用户是否已注册
         user = User.query.filter_by(openid=openid, is_deleted=False).first()
@@ -216,19 +223,12 @@ class AuthController:
         if not user.is_active:
             return format_response(False, error='用户已处于停用状态'), 400
 
-        # 生成 token
-        now = datetime.now()
-        token = jwt.encode(
-            {
-                'id': user.id,
-                'exp': now + timedelta(seconds=Config.TOKEN_EXPIRY),
-                'refresh_time': now + timedelta(seconds=Config.TOKEN_EXPIRY - Config.REFRESH_THRESHOLD)
-            },
-            Config.JWT_SECRET_KEY, algorithm="HS256"
-        )
+        # 生成当前设备的 token
+        device_id = normalize_device_id(data.get('device_id'))
+        token = generate_token(user.id, device_id)
 
-        # 将 Token 存入 Redis
-        redis_client.set(user.id, token, ex=Config.TOKEN_EXPIRY)
+        # 将 Token 存入 Redis，不影响用户在其他设备上的登录
+        store_token(user.id, device_id, token)
 
         return format_response(True, {'token': token}), 200
 
@@ -246,19 +246,16 @@ class AuthController:
 
         code = data['code']
 
-        # 微信小程序的 AppID 和 AppSecret
-        app_id = Config.WECHAT_APP_ID
-        app_secret = Config.WECHAT_APP_SECRET
-
         # 向微信服务器发送请求，获取 openid 和 session_key
-        url = f"https://api.weixin.qq.com/sns/jscode2session?appid={app_id}&secret={app_secret}&js_code={code}&grant_type=authorization_code"
-        response = requests.get(url)
-        data = response.json()
+        try:
+            wechat_session = get_wechat_client().code2session(code)
+        except WeChatUnavailable:
+            return format_response(False, error='微信服务暂不可用，请稍后再试'), 503
 
-        if 'openid' not in data or not data['openid']:
+        if 'openid' not in wechat_session or not wechat_session['openid']:
             return format_response(False, error='无法获取 openid'), 400
 
-        openid = data['openid']
+        openid = wechat_session['openid']
 
         # 查找手机号码绑定的用户
         user = User.query.filter_by(phone_number=data['phone_number'], is_deleted=False).first()
@@ -275,7 +272,7 @@ class AuthController:
                 # 如果用户不存在，创建用户
                 user = User(
                     username=generate_random_string(),
-                    password=generate_password_hash(generate_random_string()),
+                    password_hash=hash_password(generate_random_string()),
                     phone_number=data['phone_number'],
                     openid=openid,
                 )
@@ -285,19 +282,12 @@ class AuthController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
-        # 生成 token
-        now = datetime.now()
-        token = jwt.encode(
-            {
-                'id': user.id,
-                'exp': now + timedelta(seconds=Config.TOKEN_EXPIRY),
-                'refresh_time': now + timedelta(seconds=Config.TOKEN_EXPIRY - Config.REFRESH_THRESHOLD)
-            },
-            Config.JWT_SECRET_KEY, algorithm="HS256"
-        )
+        # 生成当前设备的 token
+        device_id = normalize_device_id(data.get('device_id'))
+        token = generate_token(user.id, device_id)
 
-        # 将 Token 存入 Redis
-        redis_client.set(user.id, token, ex=Config.TOKEN_EXPIRY)
+        # 将 Token 存入 Redis，不影响用户在其他设备上的登录
+        store_token(user.id, device_id, token)
 
         return format_response(True, {'token': token}), 200
 
@@ -326,7 +316,7 @@ class AuthController:
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
         # 清除用户的 Token（要求重新登录）
-        redis_client.delete(user.id)
+        revoke_session(user.id)
 
         return format_response(True, {'message': '用户解绑成功'}), 200
 
@@ -339,7 +329,7 @@ class AuthController:
         user.deleted_at = datetime.now()
 
         # 查找该用户关联的访客记录
-        visitor_logs = VisitorLog.query.filter_by(visitor_phone_number=user.phone_number, is_active=True,
+        visitor_logs = VisitorLog.query.filter_by(visitor_phone_number_index=user.phone_number_index, is_active=True,
                                                   is_deleted=False).all()
 
         for visitor_log in visitor_logs:
@@ -352,8 +342,9 @@ class AuthController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
-        # 从 Redis 中删除用户的 Token
-        redis_client.delete(user.id)
+        # 从 Redis 中删除用户的 Token 和缓存的用户凭据
+        revoke_session(user.id)
+        invalidate_principal(user.id)
 
         return format_response(True, {'message': '用户删除成功'}), 200
 
@@ -383,6 +374,9 @@ class AuthController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 清除缓存的用户凭据
+        invalidate_principal(user.id)
+
         return format_response(True, {'message': '用户账户已激活'}), 200
 
     @staticmethod
@@ -414,6 +408,137 @@ class AuthController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
-        redis_client.delete(user.id)
+        revoke_session(user.id)
+        invalidate_principal(user.id)
 
         return format_response(True, {'message': '用户已成功停用'}), 200
+
+    @staticmethod
+    def get_bulk_user_ids(data):
+        """根据用户ID列表或部门ID获取批量操作的目标用户ID，返回 (用户ID列表, 错误信息)"""
+
+        user_ids = data.get('user_ids')
+        department_id = data.get('department_id')
+
+        if user_ids is not None and department_id is not None:
+            return None, '用户ID列表和部门ID只能指定一个'
+
+        # 布尔值是 int 的子类，需要排除
+        if user_ids is not None:
+            if not isinstance(user_ids, list) or not user_ids or \
+                    not all(type(user_id) is int for user_id in user_ids):
+                return None, '用户ID列表格式不正确'
+            query = db.session.query(User.id).filter(User.id.in_(set(user_ids)))
+        elif department_id is not None:
+            if type(department_id) is not int:
+                return None, '部门ID格式不正确'
+            # 部门下未删除的成员
+            query = (db.session.query(User.id)
+                     .join(UserDepartment, UserDepartment.user_id == User.id)
+                     .filter(UserDepartment.department_id == department_id,
+                             UserDepartment.is_deleted == False)
+                     .distinct())
+        else:
+            return None, '缺少用户ID列表或部门ID'
+
+        user_ids = [user_id for user_id, in query.filter(User.is_deleted == False)
+                    .limit(Config.BULK_USER_LIMIT + 1)]
+        if len(user_ids) > Config.BULK_USER_LIMIT:
+            return None, f'单次最多处理 {Config.BULK_USER_LIMIT} 个用户'
+        return user_ids, None
+
+    @staticmethod
+    def bulk_update_users(user_ids, values, revoke):
+        """在一个事务中批量更新用户，提交后通过一次 Redis 管道清除用户凭据，revoke 为真时同时清除 Token"""
+
+        # 提交数据库更新
+        try:
+            db.session.query(User).filter(User.id.in_(user_ids)).update(values, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
+
+        with redis_client.pipeline(transaction=False) as pipeline:
+            if revoke:
+                revoke_sessions(user_ids, pipeline)
+            invalidate_principals(user_ids, pipeline)
+            pipeline.execute()
+
+        return None
+
+    @staticmethod
+    def bulk_activate_users(data):
+        """批量激活用户账户"""
+
+        user_ids, error = AuthController.get_bulk_user_ids(data)
+        if error:
+            return format_response(False, error=error), 400
+        if not user_ids:
+            return format_response(False, error='用户不存在'), 404
+
+        failure = AuthController.bulk_update_users(user_ids, {User.is_active: True}, revoke=False)
+        if failure:
+            return failure
+
+        return format_response(True, {'message': '用户账户已激活', 'count': len(user_ids)}), 200
+
+    @staticmethod
+    def bulk_deactivate_users(data):
+        """批量停用用户，并清除用户在全部设备上的 Token"""
+
+        user_ids, error = AuthController.get_bulk_user_ids(data)
+        if error:
+            return format_response(False, error=error), 400
+        if not user_ids:
+            return format_response(False, error='用户不存在'), 404
+
+        failure = AuthController.bulk_update_users(user_ids, {User.is_active: False}, revoke=True)
+        if failure:
+            return failure
+
+        return format_response(True, {'message': '用户已成功停用', 'count': len(user_ids)}), 200
+
+    @staticmethod
+    def bulk_set_password(data):
+        """管理员批量设置用户密码，并清除用户在全部设备上的 Token（要求重新登录）"""
+
+        new_password = data.get('new_password')
+        if not new_password:
+            return format_response(False, error='新密码不能为空'), 400
+
+        user_ids, error = AuthController.get_bulk_user_ids(data)
+        if error:
+            return format_response(False, error=error), 400
+        if not user_ids:
+            return format_response(False, error='用户不存在'), 404
+
+        # 所有用户设置的是同一个密码，只计算一次哈希
+        try:
+            password_hash = hash_password(new_password)
+        except PasswordQueueFull:
+            return format_response(False, error='服务繁忙，请稍后再试'), 503
+
+        failure = AuthController.bulk_update_users(user_ids, {User.password_hash: password_hash}, revoke=True)
+        if failure:
+            return failure
+
+        return format_response(True, {'message': '密码已成功更新', 'count': len(user_ids)}), 200
+
+    @staticmethod
+    def create_envelope_session(current_user, data):
+        """注册当前用户数据加密的 AES 会话密钥"""
+
+        # 校验加密后的会话密钥是否为非空字符串
+        if 'encrypted_key' not in data or not data['encrypted_key']:
+            return format_response(False, error='缺少 encrypted_key 参数'), 400
+        if not isinstance(data['encrypted_key'], str):
+            return format_response(False, error='无效的会话密钥'), 400
+
+        # 解密会话密钥并缓存，后续请求通过指纹引用
+        try:
+            fingerprint = register_envelope_session(current_user.id, data['encrypted_key'])
+        except (ValueError, TypeError):
+            return format_response(False, error='无效的会话密钥'), 400
+
+        return format_response(True, {'key_fingerprint': fingerprint, 'expires_in': Config.ENVELOPE_SESSION_TTL}), 200
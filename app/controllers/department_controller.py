@@ -12,7 +12,7 @@ from datetime import datetime
 
 from sqlalchemy import asc, desc
 
-from app.models import Department
+from app.models import Department, SearchToken
 from extensions.db import db
 from utils.format_utils import format_response
 from utils.validate_utils import validate_department_name
@@ -84,7 +84,8 @@ class DepartmentController:
         # 校验部门编号是否有效
         if 'code' not in data or not data['code'] or len(data['code'].strip()) < 2:
             return format_response(False, error='部门编号不能为空且至少为2个字符'), 400
-        if Department.query.filter(Department.code == data['code'].strip(), Department.id != department_id,
+        if Department.query.filter(Department.code == data['code'].strip(),
+                                   Department.id != department_id,
                                    Department.is_deleted == False).first():
             return format_response(False, error='部门编号已存在'), 400
 
@@ -164,11 +165,11 @@ class DepartmentController:
 
         # 如果有部门编号的条件
         if filters.get('code'):
-            query = query.filter(Department.name.contains(filters['code']))
+            query = query.filter(Department.id.in_(SearchToken.match(Department, 'code', filters['code'])))
 
         # 如果有部门名称的条件
         if filters.get('name'):
-            query = query.filter(Department.name.contains(filters['name']))
+            query = query.filter(Department.id.in_(SearchToken.match(Department, 'name', filters['name'])))
 
         # 动态排序，确保sort_field是数据库表中的有效字段
         if sort_order.lower() == 'asc':
@@ -15,6 +15,7 @@ from sqlalchemy import asc, desc
 from app.models import Permission
 from extensions.db import db
 from utils.format_utils import format_response
+from utils.permission_utils import bump_permission_version
 
 
 class PermissionController:
@@ -71,6 +72,9 @@ class PermissionController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 有效权限变化，递增全局权限版本，重新分配权限声明中的位序
+        bump_permission_version()
+
         return format_response(True, permission.to_dict()), 200
 
     @staticmethod
@@ -108,6 +112,9 @@ class PermissionController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 权限名称可能变化，递增全局权限版本，重新加载权限名称到权限ID的映射
+        bump_permission_version()
+
         return format_response(True, permission.to_dict()), 200
 
     @staticmethod
@@ -131,6 +138,9 @@ class PermissionController:
             except Exception as e:
                 db.session.rollback()
                 return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
+
+            # 有效权限变化，递增全局权限版本，重新分配权限声明中的位序
+            bump_permission_version()
             return format_response(True, {'message': '权限删除成功'}), 200
 
         return format_response(False, error='权限未找到'), 404
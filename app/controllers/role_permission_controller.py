@@ -12,6 +12,7 @@ from datetime import datetime
 from app.models import Role, Permission, RolePermission
 from extensions.db import db
 from utils.format_utils import format_response
+from utils.permission_utils import bump_permission_version
 
 
 class RolePermissionController:
@@ -72,6 +73,9 @@ class RolePermissionController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 角色的权限变化影响所有拥有该角色的用户，递增全局权限版本
+        bump_permission_version()
+
         return format_response(True, {'message': '权限已成功添加到角色'}), 200
 
     @staticmethod
@@ -112,4 +116,7 @@ class RolePermissionController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 角色的权限变化影响所有拥有该角色的用户，递增全局权限版本
+        bump_permission_version()
+
         return format_response(True, {'message': '权限已成功从角色中移除'}), 200
@@ -11,11 +11,13 @@ import json
 from datetime import datetime
 
 from sqlalchemy import asc, desc
-from werkzeug.security import generate_password_hash
 
-from app.models import User, VisitorLog
-from extensions.db import db, redis_client
+from app.models import User, VisitorLog, SearchToken
+from extensions.db import db
 from utils.format_utils import format_response
+from utils.password_utils import PasswordQueueFull, hash_password
+from utils.principal_utils import invalidate_principal
+from utils.session_utils import revoke_session
 from utils.validate_utils import validate_username, validate_phone_number, validate_name, validate_gender, \
     validate_id_type, validate_id_number
 
@@ -25,8 +27,9 @@ class UserController:
     def get_all_users(page=1, per_page=10):
         """获取所有用户信息"""
 
-        # 分页
-        paginated_users = User.query.filter_by(is_deleted=False).paginate(page=page, per_page=per_page, error_out=False)
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = User.query.filter_by(is_deleted=False).options(User.undefer_sensitive())
+        paginated_users = query.paginate(page=page, per_page=per_page, error_out=False)
 
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
@@ -65,7 +68,8 @@ class UserController:
             return format_response(False, error='手机号码不能为空'), 400
         if not validate_phone_number(data['phone_number'].strip()):
             return format_response(False, error='手机号码格式有误'), 400
-        if User.query.filter_by(phone_number=data['phone_number'].strip(), is_deleted=False).first():
+        if User.query.filter_by(phone_number=data['phone_number'].strip(),
+                                is_deleted=False).first():
             return format_response(False, error='手机号码已存在'), 400
 
         # 校验姓名格式是否正确
@@ -92,9 +96,14 @@ class UserController:
         if not validate_id_number(data['id_type'].strip(), data['id_number'].strip()):
             return format_response(False, error='证件号码不合法'), 400
 
+        try:
+            password_hash = hash_password(data['password_hash'].strip())
+        except PasswordQueueFull:
+            return format_response(False, error='服务繁忙，请稍后再试'), 503
+
         user = User(
             username=data['username'].strip(),
-            password_hash=generate_password_hash(data['password_hash'].strip(), method='scrypt'),
+            password_hash=password_hash,
             phone_number=data['phone_number'].strip(),
             name=data['name'].strip(),
             gender=data['gender'].strip(),
@@ -195,8 +204,8 @@ class UserController:
             user.deleted_at = datetime.now()
 
             # 查找该用户关联的访客记录
-            visitor_logs = VisitorLog.query.filter_by(visitor_phone_number=user.phone_number, is_active=True,
-                                                      is_deleted=False).all()
+            visitor_logs = VisitorLog.query.filter_by(visitor_phone_number_index=user.phone_number_index,
+                                                      is_active=True, is_deleted=False).all()
 
             for visitor_log in visitor_logs:
                 visitor_log.is_active = False
@@ -208,8 +217,9 @@ class UserController:
                 db.session.rollback()
                 return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
-            # 从 Redis 中删除用户的 Token
-            redis_client.delete(user.id)
+            # 从 Redis 中删除用户的 Token 和缓存的用户凭据
+            revoke_session(user.id)
+            invalidate_principal(user.id)
 
             return format_response(True, {'message': '用户删除成功'}), 200
 
@@ -236,15 +246,15 @@ class UserController:
 
         # 如果有用户名的条件
         if filters.get('username'):
-            query = query.filter(User.username.contains(filters['username']))
+            query = query.filter(User.id.in_(SearchToken.match(User, 'username', filters['username'])))
 
         # 如果有姓名的条件
         if filters.get('name'):
-            query = query.filter(User.name.contains(filters['name']))
+            query = query.filter(User.id.in_(SearchToken.match(User, 'name', filters['name'])))
 
         # 如果有手机号码的条件
         if filters.get('phone_number'):
-            query = query.filter(User.phone_number.contains(filters['phone_number']))
+            query = query.filter(User.id.in_(SearchToken.match(User, 'phone_number', filters['phone_number'])))
 
         # 如果有性别的条件
         if filters.get('gender'):
@@ -256,7 +266,7 @@ class UserController:
 
         # 如果有证件号码的条件
         if filters.get('id_number'):
-            query = query.filter(User.id_number.contains(filters['id_number']))
+            query = query.filter(User.id.in_(SearchToken.match(User, 'id_number', filters['id_number'])))
 
         # 如果有激活状态的条件
         if filters.get('is_active'):
@@ -271,7 +281,8 @@ class UserController:
             # 如果排序顺序无效，则默认使用升序
             query = query.order_by(asc(getattr(User, sort_field)))
 
-        # 分页
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = query.options(User.undefer_sensitive())
         paginated_users = query.paginate(page=page, per_page=per_page, error_out=False)
 
         # 返回分页后的数据、总页数、当前页和每页记录数
@@ -12,6 +12,7 @@ from datetime import datetime
 from app.models import User, Role, UserRole
 from extensions.db import db
 from utils.format_utils import format_response
+from utils.permission_utils import bump_permission_version
 
 
 class UserRoleController:
@@ -72,6 +73,9 @@ class UserRoleController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 递增用户的权限版本，已签发 Token 中的权限声明随之失效
+        bump_permission_version(user.id)
+
         return format_response(True, {'message': '角色已成功添加到用户'}), 200
 
     @staticmethod
@@ -112,4 +116,7 @@ class UserRoleController:
             db.session.rollback()
             return format_response(False, error=f'数据库更新失败: {str(e)}'), 500
 
+        # 递增用户的权限版本，已签发 Token 中的权限声明随之失效
+        bump_permission_version(user.id)
+
         return format_response(True, {'message': '角色已成功从用户中移除'}), 200
@@ -12,7 +12,7 @@ from datetime import datetime
 
 from sqlalchemy import asc, desc
 
-from app.models import User, Visitor
+from app.models import User, Visitor, SearchToken
 from extensions.db import db
 from utils.format_utils import format_response
 from utils.validate_utils import validate_phone_number, validate_name, validate_gender, validate_id_type, \
@@ -30,15 +30,18 @@ class VisitorAdminController:
         if not user:
             return format_response(False, error='用户未找到'), 404
 
-        return format_response(True, {"visitors": [visitor.to_dict() for visitor in user.visitors]}), 200
+        # 展示明文，随主查询一并读取加密字段
+        visitors = user.visitors.options(Visitor.undefer_sensitive()).all()
+
+        return format_response(True, {"visitors": [visitor.to_dict() for visitor in visitors]}), 200
 
     @staticmethod
     def get_all_visitors(page=1, per_page=10):
         """获取所有访客信息"""
 
-        # 分页
-        paginated_visitors = Visitor.query.filter_by(is_deleted=False).paginate(page=page, per_page=per_page,
-                                                                                error_out=False)
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = Visitor.query.filter_by(is_deleted=False).options(Visitor.undefer_sensitive())
+        paginated_visitors = query.paginate(page=page, per_page=per_page, error_out=False)
 
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
@@ -145,7 +148,8 @@ class VisitorAdminController:
             return format_response(False, error='证件号码不能为空'), 400
         if not validate_id_number(data['id_type'].strip(), data['id_number'].strip()):
             return format_response(False, error='证件号码不合法'), 400
-        if Visitor.query.filter(Visitor.id_number == data['id_number'].strip(), Visitor.id != visitor_id,
+        if Visitor.query.filter(Visitor.id_number == data['id_number'].strip(),
+                                Visitor.id != visitor_id,
                                 Visitor.is_deleted == False, Visitor.user_id == data['user_id']).first():
             return format_response(False, error='证件号码已存在'), 400
 
@@ -154,7 +158,8 @@ class VisitorAdminController:
             return format_response(False, error='手机号码不能为空'), 400
         if not validate_phone_number(data['phone_number'].strip()):
             return format_response(False, error='手机号码格式有误'), 400
-        if Visitor.query.filter(Visitor.phone_number == data['phone_number'].strip(), Visitor.id != visitor_id,
+        if Visitor.query.filter(Visitor.phone_number == data['phone_number'].strip(),
+                                Visitor.id != visitor_id,
                                 Visitor.is_deleted == False, Visitor.user_id == data['user_id']).first():
             return format_response(False, error='手机号码已存在'), 400
 
@@ -227,11 +232,11 @@ class VisitorAdminController:
 
         # 如果有姓名的条件
         if filters.get('name'):
-            query = query.filter(Visitor.name.contains(filters['name']))
+            query = query.filter(Visitor.id.in_(SearchToken.match(Visitor, 'name', filters['name'])))
 
         # 如果有手机号码的条件
         if filters.get('phone_number'):
-            query = query.filter(Visitor.phone_number.contains(filters['phone_number']))
+            query = query.filter(Visitor.id.in_(SearchToken.match(Visitor, 'phone_number', filters['phone_number'])))
 
         # 如果有性别的条件
         if filters.get('gender'):
@@ -243,7 +248,7 @@ class VisitorAdminController:
 
         # 如果有证件号码的条件
         if filters.get('id_number'):
-            query = query.filter(Visitor.id_number.contains(filters['id_number']))
+            query = query.filter(Visitor.id.in_(SearchToken.match(Visitor, 'id_number', filters['id_number'])))
 
         # 动态排序，确保sort_field是数据库表中的有效字段
         if sort_order.lower() == 'asc':
@@ -254,7 +259,8 @@ class VisitorAdminController:
             # 如果排序顺序无效，则默认使用升序
             query = query.order_by(asc(getattr(Visitor, sort_field)))
 
-        # 分页
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = query.options(Visitor.undefer_sensitive())
         paginated_visitors = query.paginate(page=page, per_page=per_page, error_out=False)
 
         # 返回分页后的数据、总页数、当前页和每页记录数
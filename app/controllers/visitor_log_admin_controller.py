@@ -12,7 +12,7 @@ from datetime import datetime
 
 from sqlalchemy import asc, desc
 
-from app.models import VisitorLog, Campus, Department, User
+from app.models import VisitorLog, Campus, Department, User, SearchToken
 from extensions.db import db
 from utils.format_utils import format_response
 from utils.time_utils import compare_time_strings, is_time_before_now, is_time_within_three_days_future, \
@@ -26,9 +26,12 @@ class VisitorLogAdminController:
     def get_all_visitor_logs(page=1, per_page=10):
         """获取所有访客记录"""
 
-        # 分页
-        paginated_visitor_logs = VisitorLog.query.filter_by(is_deleted=False).paginate(page=page, per_page=per_page,
-                                                                                       error_out=False)
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = VisitorLog.query.filter_by(is_deleted=False).options(VisitorLog.undefer_sensitive())
+        paginated_visitor_logs = query.paginate(page=page, per_page=per_page, error_out=False)
+
+        # 一次性加载整页的随行人员，避免逐条记录查询
+        VisitorLog.prefetch_accompanying_people(paginated_visitor_logs.items)
 
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
@@ -213,7 +216,7 @@ class VisitorLogAdminController:
             return format_response(False, error='访客手机号码格式有误'), 400
 
         # 校验用户是否存在
-        if not User.query.filter_by(id_number=data['visitor_id_number'],
+        if not User.query.filter_by(id_number=data['visitor_id_number'].strip(),
                                     phone_number=data['visitor_phone_number'].strip(),
                                     is_deleted=False).first():
             return format_response(False, error='该用户不存在'), 400
@@ -366,19 +369,21 @@ class VisitorLogAdminController:
 
         # 如果有访客所属单位的条件
         if filters.get('visitor_org'):
-            query = query.filter(VisitorLog.visitor_org.contains(filters['visitor_org']))
+            query = query.filter(VisitorLog.id.in_(SearchToken.match(VisitorLog, 'visitor_org', filters['visitor_org'])))
 
         # 如果有访客姓名的条件
         if filters.get('visitor_name'):
-            query = query.filter(VisitorLog.visitor_name.contains(filters['visitor_name']))
+            query = query.filter(VisitorLog.id.in_(SearchToken.match(VisitorLog, 'visitor_name', filters['visitor_name'])))
 
         # 如果有被访人姓名的条件
         if filters.get('visited_person_name'):
-            query = query.filter(VisitorLog.visited_person_name.contains(filters['visited_person_name']))
+            query = query.filter(VisitorLog.id.in_(
+                SearchToken.match(VisitorLog, 'visited_person_name', filters['visited_person_name'])))
 
         # 如果有被访人部门的条件
         if filters.get('visited_person_org'):
-            query = query.filter(VisitorLog.visited_person_org.contains(filters['visited_person_org']))
+            query = query.filter(VisitorLog.id.in_(
+                SearchToken.match(VisitorLog, 'visited_person_org', filters['visited_person_org'])))
 
         # 如果有车牌号码的条件
         if filters.get('license_plate'):
@@ -401,9 +406,13 @@ class VisitorLogAdminController:
             # 如果排序顺序无效，则默认使用升序
             query = query.order_by(asc(getattr(VisitorLog, sort_field)))
 
-        # 分页
+        # 分页，展示明文时随主查询一并读取加密字段
+        query = query.options(VisitorLog.undefer_sensitive())
         paginated_visitor_logs = query.paginate(page=page, per_page=per_page, error_out=False)
 
+        # 一次性加载整页的随行人员，避免逐条记录查询
+        VisitorLog.prefetch_accompanying_people(paginated_visitor_logs.items)
+
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
             "visitor_logs": [visitor_log.to_dict() for visitor_log in paginated_visitor_logs.items],
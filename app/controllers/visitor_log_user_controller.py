@@ -25,7 +25,7 @@ class VisitorLogUserController:
         """获取该用户所有预约记录"""
 
         # 创建查询对象
-        query = VisitorLog.query.filter(VisitorLog.visitor_phone_number == user.phone_number,
+        query = VisitorLog.query.filter(VisitorLog.visitor_phone_number_index == user.phone_number_index,
                                         VisitorLog.is_deleted == False, VisitorLog.is_active == True)
 
         # 按照状态检索预约记录
@@ -42,6 +42,9 @@ class VisitorLogUserController:
         paginated_visitor_logs = query.order_by(desc(VisitorLog.create_time)).paginate(page=page, per_page=per_page,
                                                                                        error_out=False)
 
+        # 一次性加载整页的随行人员，避免逐条记录查询
+        VisitorLog.prefetch_accompanying_people(paginated_visitor_logs.items, need_mask=True)
+
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
             "visitor_logs": [visitor_log.to_mask() for visitor_log in paginated_visitor_logs.items],
@@ -54,11 +57,12 @@ class VisitorLogUserController:
     def get_visitor_logs_by_department(user, page=1, per_page=10, status='all'):
         """根据用户所属部门获取预约记录"""
 
-        # 获取用户的部门名称列表
-        departments = user.get_departments()
+        # 获取用户的部门名称盲索引列表
+        department_indexes = user.get_department_name_indexes()
 
         # 根据部门过滤预约记录
-        query = VisitorLog.query.filter(VisitorLog.visited_person_org.in_(departments), VisitorLog.is_deleted == False)
+        query = VisitorLog.query.filter(VisitorLog.visited_person_org_index.in_(department_indexes),
+                                        VisitorLog.is_deleted == False)
 
         # 按照状态检索预约记录
         if status.lower() == 'all':
@@ -76,6 +80,9 @@ class VisitorLogUserController:
         paginated_visitor_logs = query.order_by(desc(VisitorLog.create_time)).paginate(page=page, per_page=per_page,
                                                                                        error_out=False)
 
+        # 一次性加载整页的随行人员，避免逐条记录查询
+        VisitorLog.prefetch_accompanying_people(paginated_visitor_logs.items, need_mask=True)
+
         # 返回分页后的数据、总页数、当前页和每页记录数
         return format_response(True, {
             "visitor_logs": [visitor_log.to_mask() for visitor_log in paginated_visitor_logs.items],
@@ -87,7 +94,7 @@ class VisitorLogUserController:
     @staticmethod
     def get_visitor_log_by_id(user, visitor_log_id):
         """根据ID获取预约记录"""
-        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number=user.phone_number,
+        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number_index=user.phone_number_index,
                                                  is_deleted=False, is_active=True).first()
         if visitor_log:
             return format_response(True, visitor_log.to_mask()), 200
@@ -193,7 +200,7 @@ class VisitorLogUserController:
         """更新预约记录"""
 
         # 查找现有的访客记录
-        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number=user.phone_number,
+        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number_index=user.phone_number_index,
                                                  is_deleted=False, is_active=True).first()
 
         if not visitor_log:
@@ -291,7 +298,7 @@ class VisitorLogUserController:
         """取消预约记录"""
 
         # 查找现有的预约记录
-        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number=user.phone_number,
+        visitor_log = VisitorLog.query.filter_by(id=visitor_log_id, visitor_phone_number_index=user.phone_number_index,
                                                  is_deleted=False, is_active=True).first()
 
         if not visitor_log:
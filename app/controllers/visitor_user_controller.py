@@ -67,7 +67,8 @@ class VisitorUserController:
             return format_response(False, error='证件号码不能为空'), 400
         if not validate_id_number(data['id_type'].strip(), data['id_number'].strip()):
             return format_response(False, error='证件号码不合法'), 400
-        if Visitor.query.filter_by(id_number=data['id_number'].strip(), is_deleted=False, user_id=user.id).first():
+        if Visitor.query.filter_by(id_number=data['id_number'].strip(), is_deleted=False,
+                                   user_id=user.id).first():
             return format_response(False, error='证件号码已存在'), 400
 
         # 校验手机号码是否存在并有效
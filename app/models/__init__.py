@@ -8,10 +8,11 @@ from .user_department import UserDepartment
 from .visitor import Visitor
 from .visitor_log import VisitorLog
 from .campus import Campus
+from .search_token import SearchToken
 
 
 __all__ = [
     "User", "Permission", "Role", "Department",
     "UserRole", "RolePermission", "UserDepartment",
-    "Visitor", "VisitorLog", "Campus"
+    "Visitor", "VisitorLog", "Campus", "SearchToken"
 ]
\ No newline at end of file
@@ -13,15 +13,18 @@ from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime
 from sqlalchemy.orm import relationship
 
 from extensions.db import db
-from utils.crypto_utils import aes256_encrypt_sensitive, aes256_decrypt_sensitive
+from .search_token import SearchableMixin
+from .sensitive_field import SensitiveFieldMixin, EncryptedString
 
 
-class Department(db.Model):
+class Department(SensitiveFieldMixin, SearchableMixin, db.Model):
     __tablename__ = 'departments'
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # 部门ID
-    _code = Column('code', String(255), nullable=False, index=True)  # 部门编号，唯一
-    _name = Column('name', String(255), nullable=False, index=True)  # 部门名称
+    code = Column(EncryptedString(blind_index='code_index'), nullable=False)  # 部门编号，唯一
+    code_index = Column(String(32), nullable=True, index=True)  # 部门编号盲索引
+    name = Column(EncryptedString(blind_index='name_index'), nullable=False)  # 部门名称
+    name_index = Column(String(32), nullable=True, index=True)  # 部门名称盲索引
     description = Column(String(255), nullable=True)  # 部门描述（可选）
     parent_id = Column(Integer, ForeignKey('departments.id'), nullable=True, index=True)  # 上级部门ID
     is_deleted = Column(Boolean, default=False, nullable=False, index=True)  # 逻辑删除标记
@@ -29,6 +32,9 @@ class Department(db.Model):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)  # 更新时间，用于记录何时更新
     deleted_at = Column(DateTime, nullable=True)  # 删除时间，用于记录何时删除
 
+    # 需要生成检索令牌的字段
+    __search_fields__ = ('code', 'name')
+
     # 定义反向关系
     user_departments = relationship('UserDepartment', back_populates='department', lazy='dynamic')
 
@@ -48,24 +54,6 @@ class Department(db.Model):
         lazy='dynamic',  # 动态加载，适合处理大规模一对多关系
     )
 
-    # code 属性
-    @property
-    def code(self):
-        return aes256_decrypt_sensitive(self._code)
-
-    @code.setter
-    def code(self, value):
-        self._code = aes256_encrypt_sensitive(value)
-
-    # name 属性
-    @property
-    def name(self):
-        return aes256_decrypt_sensitive(self._name)
-
-    @name.setter
-    def name(self, value):
-        self._name = aes256_encrypt_sensitive(value)
-
     def __repr__(self):
         return f'<Department {self.name}>'
 
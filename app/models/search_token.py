@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: models/search_token.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-20
+# 版本: 1.0
+# 描述: 密文字段检索令牌的模型文件。
+"""
+
+from sqlalchemy import Column, Integer, String, Index, select, func, distinct, event
+
+from extensions.db import db
+from utils.crypto_utils import hmac_ngram_tokens, hmac_search_tokens
+
+
+# 检索令牌模型
+class SearchToken(db.Model):
+    __tablename__ = 'search_tokens'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # 令牌ID
+    table_name = Column(String(50), nullable=False)  # 所属数据表
+    record_id = Column(Integer, nullable=False)  # 所属记录ID
+    field = Column(String(50), nullable=False)  # 所属字段
+    token = Column(String(16), nullable=False)  # n-gram 的 HMAC 令牌
+
+    __table_args__ = (
+        Index('ix_search_tokens_lookup', 'table_name', 'field', 'token', 'record_id'),  # 按令牌检索记录
+        Index('ix_search_tokens_record', 'table_name', 'record_id', 'field'),  # 按记录维护令牌
+    )
+
+    def __repr__(self):
+        return f'<SearchToken {self.table_name}.{self.field} {self.record_id}>'
+
+    @classmethod
+    def match(cls, model, field, keyword):
+        """生成按关键字检索密文字段的子查询，返回同时包含全部关键字令牌的记录ID"""
+        tokens = hmac_search_tokens(keyword, f'{model.__tablename__}.{field}')
+        return (select(cls.record_id)
+                .where(cls.table_name == model.__tablename__, cls.field == field, cls.token.in_(tokens))
+                .group_by(cls.record_id)
+                .having(func.count(distinct(cls.token)) == len(tokens)))
+
+
+def write_search_tokens(connection, target, values):
+    """重写记录指定字段的检索令牌"""
+    table = SearchToken.__table__
+    table_name = target.__tablename__
+
+    # 删除字段原有的令牌
+    connection.execute(table.delete().where(table.c.table_name == table_name,
+                                            table.c.record_id == target.id,
+                                            table.c.field.in_(list(values))))
+
+    # 写入字段新的令牌
+    rows = [{'table_name': table_name, 'record_id': target.id, 'field': field, 'token': token}
+            for field, value in values.items()
+            for token in hmac_ngram_tokens(value, f'{table_name}.{field}')]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+class SearchableMixin:
+    """可检索密文字段的模型混入类，字段的检索令牌随记录一同写入"""
+
+    # 需要生成检索令牌的字段
+    __search_fields__ = ()
+
+    def stage_search_tokens(self, field, value):
+        """暂存字段的明文，待记录写入数据库后生成检索令牌"""
+        self.__dict__.setdefault('_pending_search_tokens', {})[field] = value
+
+    def update_search_tokens(self):
+        """根据当前的敏感字段重新生成全部检索令牌"""
+        values = {field: getattr(self, field) for field in self.__search_fields__}
+        write_search_tokens(db.session.connection(), self, values)
+
+
+@event.listens_for(SearchableMixin, 'after_insert', propagate=True)
+@event.listens_for(SearchableMixin, 'after_update', propagate=True)
+def flush_search_tokens(mapper, connection, target):
+    """记录写入数据库后，在同一事务中写入暂存的检索令牌"""
+    pending = target.__dict__.pop('_pending_search_tokens', None)
+    if pending:
+        write_search_tokens(connection, target, pending)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: models/sensitive_field.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-21
+# 版本: 1.0
+# 描述: 敏感字段的加密列类型及模型混入类。
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import Column, event, inspect, type_coerce, VARBINARY
+from sqlalchemy.orm import Session, deferred, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+from app.config import Config
+from utils.cache_utils import TTLCache
+from utils.crypto_utils import sensitive_cipher, hmac_blind_index
+
+# 启用线程池并行解密的最少密文数量，数量太少时线程调度的开销大于收益
+PARALLEL_DECRYPT_THRESHOLD = 256
+
+# 整页解密使用的线程池，首次使用时创建
+_executor = None
+
+# 加密字段的延迟加载分组，只读取状态字段的查询不会读取和解密密文
+SENSITIVE_GROUP = 'sensitive'
+
+# 当前查询中加载的、仍持有未解密密文的实例，不在查询中时为 None
+_sealed_instances = ContextVar('sealed_instances', default=None)
+
+
+def get_decrypt_executor():
+    """获取整页解密使用的线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Config.DECRYPT_WORKERS, thread_name_prefix='decrypt')
+    return _executor
+
+
+def decrypt_values(values):
+    """批量解密密文，密文较多时按线程数分片并行解密"""
+    workers = Config.DECRYPT_WORKERS
+    if workers > 1 and len(values) >= PARALLEL_DECRYPT_THRESHOLD:
+        size = -(-len(values) // workers)
+        chunks = [values[i:i + size] for i in range(0, len(values), size)]
+        return [plaintext for chunk in get_decrypt_executor().map(sensitive_cipher.decrypt_many, chunks)
+                for plaintext in chunk]
+    return sensitive_cipher.decrypt_many(values)
+
+
+class PlaintextCache(TTLCache):
+    """进程内的明文缓存，以密文摘要为键，只用于少量且很少变化的参考数据"""
+
+    @staticmethod
+    def digest(encrypted_data):
+        """计算密文摘要，密文包含随机 IV，同一明文每次加密后的摘要都不同"""
+        return hashlib.blake2b(encrypted_data, digest_size=16).digest()
+
+    def get(self, encrypted_data):
+        """读取密文对应的明文，未命中或已过期时返回 None"""
+        return super().get(self.digest(encrypted_data))
+
+    def set(self, encrypted_data, plaintext, ttl=None):
+        """写入密文对应的明文"""
+        super().set(self.digest(encrypted_data), plaintext, ttl)
+
+
+# 启用明文缓存的加密字段共用的缓存
+plaintext_cache = PlaintextCache(Config.PLAINTEXT_CACHE_SIZE, Config.PLAINTEXT_CACHE_TTL)
+
+
+def is_plaintext_cached(table_name, key):
+    """判断加密字段是否在配置中启用了明文缓存"""
+    fields = {field.strip() for field in (Config.PLAINTEXT_CACHE_FIELDS or '').split(',')}
+    return f'{table_name}.{key}' in fields
+
+
+class SealedValue(bytes):
+    """尚未解密的密文，查询结果读取完毕后统一批量解密"""
+
+
+class EncryptedString(TypeDecorator):
+    """
+    加密存储的字符串列类型，写入时加密，读取时解密。
+
+    :param blind_index: 盲索引字段名，设置后 ==、!=、in_ 和 not_in 查询自动改为比较盲索引
+    :param mask: 脱敏函数，设置后写入时同步更新 “字段名_masked” 脱敏字段
+    :param lazy: 为 True 时延迟到整个 ORM 查询结果读取完毕后批量解密，否则逐个值解密
+    """
+
+    impl = VARBINARY(255)
+    cache_ok = True
+
+    class Comparator(TypeDecorator.Comparator):
+        """将等值查询改写为对盲索引的查询，密文上无法计算的比较直接报错，避免静默地全部匹配或全部不匹配"""
+
+        # 不比较密文内容、可以直接作用于密文列的运算
+        PASSTHROUGH_OPERATORS = (operators.is_, operators.is_not, operators.asc_op, operators.desc_op,
+                                 operators.nulls_first_op, operators.nulls_last_op, operators.distinct_op)
+
+        def operate(self, op, *other, **kwargs):
+            if op in self.PASSTHROUGH_OPERATORS or (op in (operators.eq, operators.ne) and other[0] is None):
+                return super().operate(op, *other, **kwargs)
+            blind_index = self.type.blind_index
+            if blind_index:
+                index = self.expr.table.c[blind_index]
+                if op in (operators.eq, operators.ne):
+                    return op(index, hmac_blind_index(other[0]))
+                if op in (operators.in_op, operators.not_in_op):
+                    return op(index, [hmac_blind_index(value) for value in other[0]])
+            raise TypeError(f'加密字段 {self.expr.key} 不支持 {op.__name__} 查询，'
+                                      f'等值查询需设置盲索引，模糊查询请使用检索令牌')
+
+    comparator_factory = Comparator
+
+    def __init__(self, blind_index=None, mask=None, lazy=False):
+        super().__init__()
+        self.blind_index = blind_index
+        self.mask = mask
+        self.lazy = lazy
+
+        # 按配置在映射完成后设置，启用时解密结果写入进程内明文缓存
+        self.plaintext_cache = None
+
+    def process_bind_param(self, value, dialect):
+        # bytes 视为已加密的密文，原样写入
+        if value is None or isinstance(value, bytes):
+            return value
+        return sensitive_cipher.encrypt(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if self.lazy and _sealed_instances.get() is not None:
+            return SealedValue(value)
+        if self.plaintext_cache is None:
+            return sensitive_cipher.decrypt(value)
+
+        plaintext = self.plaintext_cache.get(value)
+        if plaintext is None:
+            plaintext = sensitive_cipher.decrypt(value)
+            self.plaintext_cache.set(value, plaintext)
+        return plaintext
+
+
+def encrypted_column(column_type, **kwargs):
+    """声明加密字段，归入延迟加载分组，首次访问时整组读取"""
+    return deferred(Column(column_type, **kwargs), group=SENSITIVE_GROUP)
+
+
+@lru_cache(maxsize=None)
+def sensitive_columns(model):
+    """获取模型中全部加密字段的属性名和列类型"""
+    return tuple((prop.key, prop.columns[0].type) for prop in inspect(model).column_attrs
+                 if isinstance(prop.columns[0].type, EncryptedString))
+
+
+def raw_ciphertext(column):
+    """按原始密文读写加密字段，用于不经过解密的批量维护"""
+    return type_coerce(column, column.type.impl)
+
+
+def unseal_instances(instances):
+    """一次性解密一批实例上全部未解密的密文"""
+    pending = []
+    for instance in instances:
+        for key, column_type in sensitive_columns(type(instance)):
+            value = instance.__dict__.get(key)
+            if not isinstance(value, SealedValue):
+                continue
+
+            # 优先使用进程内明文缓存
+            cache = column_type.plaintext_cache
+            plaintext = cache.get(value) if cache is not None else None
+            if plaintext is None:
+                pending.append((instance, key, value, cache))
+            else:
+                set_committed_value(instance, key, plaintext)
+    if not pending:
+        return
+
+    plaintexts = decrypt_values([value for _, _, value, _ in pending])
+    for (instance, key, value, cache), plaintext in zip(pending, plaintexts):
+        if cache is not None:
+            cache.set(value, plaintext)
+        set_committed_value(instance, key, plaintext)
+
+
+def is_entity_query(orm_execute_state):
+    """判断查询是否只返回 ORM 实例，只返回字段的查询直接逐个解密"""
+    descriptions = orm_execute_state.statement.column_descriptions
+    for description in descriptions:
+        insp = inspect(description['type'], raiseerr=False)
+        if insp is None or not (insp.is_mapper or insp.is_aliased_class):
+            return False
+    return bool(descriptions)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def decrypt_query_result(orm_execute_state):
+    """ORM 查询读取完毕后，对结果中全部实例的密文统一批量解密"""
+    if not orm_execute_state.is_select or orm_execute_state.execution_options.get('yield_per') \
+            or not is_entity_query(orm_execute_state):
+        return None
+
+    token = _sealed_instances.set([])
+    try:
+        frozen = orm_execute_state.invoke_statement().freeze()
+        instances = _sealed_instances.get()
+    finally:
+        _sealed_instances.reset(token)
+    unseal_instances(instances)
+    return frozen()
+
+
+class SensitiveFieldMixin:
+    """敏感字段模型混入类，维护加密字段的盲索引和脱敏字段"""
+
+    @staticmethod
+    def undefer_sensitive():
+        """生成随主查询一并读取加密字段的查询选项，用于需要整批展示明文的场景"""
+        return undefer_group(SENSITIVE_GROUP)
+
+    def update_blind_index(self):
+        """根据当前的敏感字段重新计算盲索引"""
+        for key, column_type in sensitive_columns(type(self)):
+            if column_type.blind_index:
+                setattr(self, column_type.blind_index, hmac_blind_index(getattr(self, key)))
+
+    def update_masked_columns(self):
+        """根据当前的敏感字段重新计算脱敏字段"""
+        for key, column_type in sensitive_columns(type(self)):
+            if column_type.mask:
+                setattr(self, f'{key}_masked', column_type.mask(getattr(self, key)))
+
+
+@event.listens_for(SensitiveFieldMixin, 'load', propagate=True)
+@event.listens_for(SensitiveFieldMixin, 'refresh', propagate=True)
+def collect_sealed_instance(target, context, attrs=None):
+    """记录持有未解密密文的实例，不在批量解密的查询中时立即解密"""
+    instances = _sealed_instances.get()
+    if instances is None:
+        unseal_instances([target])
+    else:
+        instances.append(target)
+
+
+def sync_derived_columns(key, column_type):
+    """生成加密字段赋值时同步更新盲索引、脱敏字段和检索令牌的监听函数"""
+
+    def on_set(target, value, oldvalue, initiator):
+        if column_type.blind_index:
+            setattr(target, column_type.blind_index, hmac_blind_index(value))
+        if column_type.mask:
+            setattr(target, f'{key}_masked', column_type.mask(value))
+        if key in getattr(target, '__search_fields__', ()):
+            target.stage_search_tokens(key, value)
+
+    return on_set
+
+
+@event.listens_for(SensitiveFieldMixin, 'mapper_configured', propagate=True)
+def listen_sensitive_columns(mapper, cls):
+    """为模型的每个加密字段注册赋值监听，并按配置启用明文缓存"""
+    for key, column_type in sensitive_columns(cls):
+        if is_plaintext_cached(mapper.local_table.name, key):
+            column_type.plaintext_cache = plaintext_cache
+        event.listen(getattr(cls, key), 'set', sync_derived_columns(key, column_type))
@@ -10,73 +10,45 @@
 from datetime import datetime
 
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, make_transient_to_detached
 
 from extensions.db import db
-from utils.crypto_utils import aes256_encrypt_sensitive, aes256_decrypt_sensitive
 from utils.mask_utils import mask_name, mask_id_number, mask_phone_number
+from .search_token import SearchableMixin
+from .sensitive_field import SensitiveFieldMixin, EncryptedString, encrypted_column
 
 
 # 用户模型
-class User(db.Model):
+class User(SensitiveFieldMixin, SearchableMixin, db.Model):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # 用户ID
-    _username = Column('username', String(255), nullable=False, index=True)  # 用户名
+    username = encrypted_column(EncryptedString(blind_index='username_index', lazy=True), nullable=False)  # 用户名
+    username_index = Column(String(32), nullable=True, index=True)  # 用户名盲索引
     password_hash = Column(String(128), nullable=False)  # 密码
-    _phone_number = Column('phone_number', String(255), nullable=False, index=True)  # 手机号码
+    phone_number = encrypted_column(EncryptedString(blind_index='phone_number_index', lazy=True),
+                                    nullable=False)  # 手机号码
+    phone_number_index = Column(String(32), nullable=True, index=True)  # 手机号码盲索引
     openid = Column(String(128), nullable=True)  # OpenID
-    _name = Column('name', String(255), nullable=True, index=True)  # 姓名
+    name = encrypted_column(EncryptedString(lazy=True), nullable=True)  # 姓名
     gender = Column(String(10), nullable=True)  # 性别
     id_type = Column(String(50), nullable=True)  # 证件类型
-    _id_number = Column('id_number', String(255), nullable=True)  # 证件号码
+    id_number = encrypted_column(EncryptedString(blind_index='id_number_index', lazy=True), nullable=True)  # 证件号码
+    id_number_index = Column(String(32), nullable=True, index=True)  # 证件号码盲索引
     is_active = Column(Boolean, default=True)  # 激活标记
     is_deleted = Column(Boolean, default=False, nullable=False, index=True)  # 逻辑删除标记
     created_at = Column(DateTime, default=datetime.now, nullable=False)  # 创建时间，用于记录何时创建
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)  # 更新时间，用于记录何时更新
     deleted_at = Column(DateTime, nullable=True)  # 删除时间，用于记录何时删除
 
+    # 需要生成检索令牌的字段
+    __search_fields__ = ('username', 'phone_number', 'name', 'id_number')
+
     # 定义反向关系
     user_roles = relationship('UserRole', back_populates='user', lazy='dynamic')
     user_departments = relationship('UserDepartment', back_populates='user', lazy='dynamic')
     visitors = relationship("Visitor", back_populates="user", lazy='dynamic')
 
-    # username 属性
-    @property
-    def username(self):
-        return aes256_decrypt_sensitive(self._username)
-
-    @username.setter
-    def username(self, value):
-        self._username = aes256_encrypt_sensitive(value)
-
-    # phone_number 属性
-    @property
-    def phone_number(self):
-        return aes256_decrypt_sensitive(self._phone_number)
-
-    @phone_number.setter
-    def phone_number(self, value):
-        self._phone_number = aes256_encrypt_sensitive(value)
-
-    # name 属性
-    @property
-    def name(self):
-        return aes256_decrypt_sensitive(self._name)
-
-    @name.setter
-    def name(self, value):
-        self._name = aes256_encrypt_sensitive(value)
-
-    # id_number 属性
-    @property
-    def id_number(self):
-        return aes256_decrypt_sensitive(self._id_number)
-
-    @id_number.setter
-    def id_number(self, value):
-        self._id_number = aes256_encrypt_sensitive(value)
-
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -102,6 +74,13 @@ class User(db.Model):
             'phone_number': mask_phone_number(self.phone_number),
         }
 
+    @classmethod
+    def from_principal(cls, principal):
+        """根据缓存的用户凭据构造持久化实例，不查询数据库，访问其他字段时再按主键读取"""
+        user = cls(id=principal['id'], is_active=principal['is_active'], is_deleted=principal['is_deleted'])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
     def has_permission(self, permission_name):
         """检查用户是否具有某个权限"""
         # 遍历用户的角色，检查每个角色是否关联有指定的权限
@@ -119,3 +98,9 @@ class User(db.Model):
         # 遍历用户的所有有效的部门关联记录，返回部门名称列表
         return [user_department.department.name for user_department in
                 self.user_departments.filter_by(is_deleted=False)]
+
+    def get_department_name_indexes(self):
+        """获取用户所属的所有部门名称的盲索引"""
+        # 直接读取部门名称的盲索引，无需解密部门名称
+        return [user_department.department.name_index for user_department in
+                self.user_departments.filter_by(is_deleted=False)]
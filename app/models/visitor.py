@@ -12,56 +12,41 @@ from datetime import datetime
 from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
 
 from extensions.db import db
-from utils.crypto_utils import aes256_encrypt_sensitive, aes256_decrypt_sensitive
 from utils.mask_utils import mask_name, mask_id_number, mask_phone_number
+from .search_token import SearchableMixin
+from .sensitive_field import SensitiveFieldMixin, EncryptedString, encrypted_column
 
 
 # 访客模型
-class Visitor(db.Model):
+class Visitor(SensitiveFieldMixin, SearchableMixin, db.Model):
     __tablename__ = 'visitors'
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # 访客ID
-    _name = Column('name', String(255), nullable=False, index=True)  # 姓名
+    name = encrypted_column(EncryptedString(mask=mask_name, lazy=True), nullable=False)  # 姓名
+    name_masked = Column(String(100), nullable=True, default='')  # 脱敏后的姓名
     gender = Column(String(10), nullable=False)  # 性别
     id_type = Column(String(50), nullable=False)  # 证件类型
-    _id_number = Column('id_number', String(255), nullable=False)  # 证件号码
-    _phone_number = Column('phone_number', String(255), nullable=False, index=True)  # 手机号码
+    id_number = encrypted_column(EncryptedString(blind_index='id_number_index', mask=mask_id_number, lazy=True),
+                                 nullable=False)  # 证件号码
+    id_number_index = Column(String(32), nullable=True, index=True)  # 证件号码盲索引
+    id_number_masked = Column(String(50), nullable=True, default='')  # 脱敏后的证件号码
+    phone_number = encrypted_column(EncryptedString(blind_index='phone_number_index', mask=mask_phone_number,
+                                                    lazy=True),
+                                    nullable=False)  # 手机号码
+    phone_number_index = Column(String(32), nullable=True, index=True)  # 手机号码盲索引
+    phone_number_masked = Column(String(20), nullable=True, default='')  # 脱敏后的手机号码
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)  # 所属用户ID
     is_deleted = Column(Boolean, default=False, nullable=False, index=True)  # 逻辑删除标记
     created_at = Column(DateTime, default=datetime.now, nullable=False)  # 创建时间，用于记录何时创建
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)  # 更新时间，用于记录何时更新
     deleted_at = Column(DateTime, nullable=True)  # 删除时间，用于记录何时删除
 
+    # 需要生成检索令牌的字段
+    __search_fields__ = ('name', 'id_number', 'phone_number')
+
     # 定义反向关系
     user = db.relationship("User", back_populates="visitors")
 
-    # name 属性
-    @property
-    def name(self):
-        return aes256_decrypt_sensitive(self._name)
-
-    @name.setter
-    def name(self, value):
-        self._name = aes256_encrypt_sensitive(value)
-
-    # id_number 属性
-    @property
-    def id_number(self):
-        return aes256_decrypt_sensitive(self._id_number)
-
-    @id_number.setter
-    def id_number(self, value):
-        self._id_number = aes256_encrypt_sensitive(value)
-
-    # phone_number 属性
-    @property
-    def phone_number(self):
-        return aes256_decrypt_sensitive(self._phone_number)
-
-    @phone_number.setter
-    def phone_number(self, value):
-        self._phone_number = aes256_encrypt_sensitive(value)
-
     def __repr__(self):
         return f'<Visitor {self.name}>'
 
@@ -77,12 +62,13 @@ class Visitor(db.Model):
         }
 
     def to_mask(self):
+        # 直接读取写入时预先计算的脱敏字段，无需解密
         return {
             'id': self.id,
-            'name': mask_name(self.name),
+            'name': self.name_masked,
             'gender': self.gender,
             'id_type': self.id_type,
-            'id_number': mask_id_number(self.id_number),
-            'phone_number': mask_phone_number(self.phone_number),
+            'id_number': self.id_number_masked,
+            'phone_number': self.phone_number_masked,
             'user_id': self.user_id,
         }
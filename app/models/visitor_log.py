@@ -12,13 +12,14 @@ from datetime import datetime
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
 
 from extensions.db import db
-from utils.crypto_utils import aes256_encrypt_sensitive, aes256_decrypt_sensitive
 from utils.mask_utils import mask_name, mask_id_number, mask_phone_number, mask_org_name
+from .search_token import SearchableMixin
+from .sensitive_field import SensitiveFieldMixin, EncryptedString, encrypted_column
 from .visitor import Visitor
 
 
 # 访客记录模型
-class VisitorLog(db.Model):
+class VisitorLog(SensitiveFieldMixin, SearchableMixin, db.Model):
     __tablename__ = 'visitor_logs'
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # 访客记录ID
@@ -26,23 +27,37 @@ class VisitorLog(db.Model):
     leave_time = Column(DateTime, nullable=False)  # 离校时间
     campus = Column(String(50), nullable=False)  # 校区
     visit_type = Column(String(50), nullable=False)  # 来访类型
-    _visitor_name = Column('visitor_name', String(255), nullable=False, index=True)  # 访客姓名
-    _visitor_phone_number = Column('visitor_phone_number', String(255), nullable=False, index=True)  # 访客手机号码
+    visitor_name = encrypted_column(EncryptedString(mask=mask_name, lazy=True), nullable=False)  # 访客姓名
+    visitor_name_masked = Column(String(100), nullable=True, default='')  # 脱敏后的访客姓名
+    visitor_phone_number = encrypted_column(EncryptedString(blind_index='visitor_phone_number_index',
+                                                            mask=mask_phone_number, lazy=True),
+                                            nullable=False)  # 访客手机号码
+    visitor_phone_number_index = Column(String(32), nullable=True, index=True)  # 访客手机号码盲索引
+    visitor_phone_number_masked = Column(String(20), nullable=True, default='')  # 脱敏后的访客手机号码
     visitor_gender = Column(String(10), nullable=False)  # 访客性别
     visitor_id_type = Column(String(50), nullable=False)  # 访客证件类型
-    _visitor_id_number = Column('visitor_id_number', String(255), nullable=False)  # 访客证件号码
-    _visitor_org = Column('visitor_org', String(255), nullable=True)  # 访客所属单位
+    visitor_id_number = encrypted_column(EncryptedString(mask=mask_id_number, lazy=True), nullable=False)  # 访客证件号码
+    visitor_id_number_masked = Column(String(50), nullable=True, default='')  # 脱敏后的访客证件号码
+    visitor_org = encrypted_column(EncryptedString(mask=mask_org_name, lazy=True), nullable=True)  # 访客所属单位
+    visitor_org_masked = Column(String(255), nullable=True, default='')  # 脱敏后的访客所属单位
     accompanying_people = Column(String(100), nullable=True)  # 随行人员ID（逗号分隔）
-    _visited_person_name = Column('visited_person_name', String(255), nullable=True)  # 被访人姓名
-    _visited_person_org = Column('visited_person_org', String(255), nullable=True, index=True)  # 被访人部门
+    visited_person_name = encrypted_column(EncryptedString(mask=mask_name, lazy=True), nullable=True)  # 被访人姓名
+    visited_person_name_masked = Column(String(100), nullable=True, default='')  # 脱敏后的被访人姓名
+    visited_person_org = encrypted_column(EncryptedString(blind_index='visited_person_org_index',
+                                                          mask=mask_org_name, lazy=True),
+                                          nullable=True)  # 被访人部门
+    visited_person_org_index = Column(String(32), nullable=True, index=True)  # 被访人部门盲索引
+    visited_person_org_masked = Column(String(255), nullable=True, default='')  # 脱敏后的被访人部门
     reason = Column(String(255), nullable=True)  # 访问原因
     license_plate = Column(String(20), nullable=True)  # 车牌号码
     is_approved = Column(Boolean, nullable=True)  # 是否审批通过
     approval_note = Column(String(255), nullable=True)  # 审批备注字段
     approved_at = Column(DateTime, nullable=True)  # 审批时间
-    _approver = Column('approver', String(255), nullable=True)  # 审批人
+    approver = encrypted_column(EncryptedString(mask=mask_name, lazy=True), nullable=True)  # 审批人
+    approver_masked = Column(String(100), nullable=True, default='')  # 脱敏后的审批人
     entry_time = Column(DateTime, nullable=True)  # 进校时间
-    _verifier = Column('verifier', String(255), nullable=True)  # 核验人
+    verifier = encrypted_column(EncryptedString(mask=mask_name, lazy=True), nullable=True)  # 核验人
+    verifier_masked = Column(String(100), nullable=True, default='')  # 脱敏后的核验人
     is_cancelled = Column(Boolean, nullable=True)  # 是否取消
     cancelled_at = Column(DateTime, nullable=True)  # 取消时间
     is_active = Column(Boolean, default=True, nullable=False, index=True)  # 是否激活，当关联用户注销后设置为冻结状态
@@ -51,77 +66,9 @@ class VisitorLog(db.Model):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)  # 更新时间，用于记录何时更新
     deleted_at = Column(DateTime, nullable=True)  # 删除时间，用于记录何时删除
 
-    # visitor_name 属性
-    @property
-    def visitor_name(self):
-        return aes256_decrypt_sensitive(self._visitor_name)
-
-    @visitor_name.setter
-    def visitor_name(self, value):
-        self._visitor_name = aes256_encrypt_sensitive(value)
-
-    # visitor_id_number 属性
-    @property
-    def visitor_id_number(self):
-        return aes256_decrypt_sensitive(self._visitor_id_number)
-
-    @visitor_id_number.setter
-    def visitor_id_number(self, value):
-        self._visitor_id_number = aes256_encrypt_sensitive(value)
-
-    # visitor_phone_number 属性
-    @property
-    def visitor_phone_number(self):
-        return aes256_decrypt_sensitive(self._visitor_phone_number)
-
-    @visitor_phone_number.setter
-    def visitor_phone_number(self, value):
-        self._visitor_phone_number = aes256_encrypt_sensitive(value)
-
-    # visitor_org 属性
-    @property
-    def visitor_org(self):
-        return aes256_decrypt_sensitive(self._visitor_org)
-
-    @visitor_org.setter
-    def visitor_org(self, value):
-        self._visitor_org = aes256_encrypt_sensitive(value)
-
-    # visited_person_name 属性
-    @property
-    def visited_person_name(self):
-        return aes256_decrypt_sensitive(self._visited_person_name)
-
-    @visited_person_name.setter
-    def visited_person_name(self, value):
-        self._visited_person_name = aes256_encrypt_sensitive(value)
-
-    # visited_person_org 属性
-    @property
-    def visited_person_org(self):
-        return aes256_decrypt_sensitive(self._visited_person_org)
-
-    @visited_person_org.setter
-    def visited_person_org(self, value):
-        self._visited_person_org = aes256_encrypt_sensitive(value)
-
-    # approver 属性
-    @property
-    def approver(self):
-        return aes256_decrypt_sensitive(self._approver)
-
-    @approver.setter
-    def approver(self, value):
-        self._approver = aes256_encrypt_sensitive(value)
-
-    # verifier 属性
-    @property
-    def verifier(self):
-        return aes256_decrypt_sensitive(self._verifier)
-
-    @verifier.setter
-    def verifier(self, value):
-        self._verifier = aes256_encrypt_sensitive(value)
+    # 需要生成检索令牌的字段
+    __search_fields__ = ('visitor_name', 'visitor_id_number', 'visitor_phone_number', 'visitor_org',
+                         'visited_person_name', 'visited_person_org')
 
     def __repr__(self):
         return f'<VisitorLog {self.id}>'
@@ -155,44 +102,71 @@ class VisitorLog(db.Model):
         }
 
     def to_mask(self):
+        # 直接读取写入时预先计算的脱敏字段，无需解密
         return {
             'id': self.id,
             'visit_time': self.visit_time,
             'leave_time': self.leave_time,
             'campus': self.campus,
             'visit_type': self.visit_type,
-            'visitor_name': mask_name(self.visitor_name),
-            'visitor_phone_number': mask_phone_number(self.visitor_phone_number),
+            'visitor_name': self.visitor_name_masked,
+            'visitor_phone_number': self.visitor_phone_number_masked,
             'visitor_gender': self.visitor_gender,
             'visitor_id_type': self.visitor_id_type,
-            'visitor_id_number': mask_id_number(self.visitor_id_number),
-            'visitor_org': mask_org_name(self.visitor_org),
-            'visited_person_name': mask_name(self.visited_person_name),
-            'visited_person_org': mask_org_name(self.visited_person_org),
+            'visitor_id_number': self.visitor_id_number_masked,
+            'visitor_org': self.visitor_org_masked,
+            'visited_person_name': self.visited_person_name_masked,
+            'visited_person_org': self.visited_person_org_masked,
             'reason': self.reason,
             'license_plate': self.license_plate,
             'is_approved': self.is_approved,
             'approval_note': self.approval_note,
             'approved_at': self.approved_at,
-            'approver': mask_name(self.approver),
+            'approver': self.approver_masked,
             'entry_time': self.entry_time,
-            'verifier': mask_name(self.verifier),
+            'verifier': self.verifier_masked,
             'is_cancelled': self.is_cancelled,
             'cancelled_at': self.cancelled_at,
             'accompanying_people': self.get_accompanying_people_info(need_mask=True),
         }
 
+    @classmethod
+    def prefetch_accompanying_people(cls, instances, need_mask=False):
+        """一次查询整页记录的随行人员，避免逐条记录查询，返回查询到的访客列表"""
+        visitor_ids = {visitor_id for instance in instances for visitor_id in instance.get_accompanying_people_ids()}
+        query = Visitor.query.filter(Visitor.id.in_(visitor_ids))
+        if need_mask is False:
+            # 展示明文时随主查询一并读取加密字段，脱敏展示只读取脱敏字段
+            query = query.options(Visitor.undefer_sensitive())
+        visitors = query.all() if visitor_ids else []
+
+        visitors_by_id = {visitor.id: visitor for visitor in visitors}
+        for instance in instances:
+            instance.__dict__['_accompanying_people'] = [visitors_by_id[visitor_id] for visitor_id in
+                                                         instance.get_accompanying_people_ids()
+                                                         if visitor_id in visitors_by_id]
+        return visitors
+
+    def get_accompanying_people_ids(self):
+        """获取随行人员的ID列表"""
+        # 将 accompanying_people 逗号分隔的字符串转换为整数 ID 列表
+        if not self.accompanying_people:
+            return []
+        return [int(visitor_id) for visitor_id in self.accompanying_people.split(',') if visitor_id.strip()]
+
     def get_accompanying_people_info(self, need_mask=True):
         """获取访客记录中随行人员的详细信息"""
 
-        # 将 accompanying_people 逗号分隔的字符串转换为 ID 列表
-        accompanying_people_ids = self.accompanying_people.split(',')
-
-        # 转换为整数列表（假设 ID 都是数字）
-        accompanying_people_ids = [int(visitor_id) for visitor_id in accompanying_people_ids]
+        # 优先使用整页预加载的随行人员
+        accompanying_people = self.__dict__.get('_accompanying_people')
 
-        # 根据 ID 列表查询所有对应的访客信息
-        accompanying_people = Visitor.query.filter(Visitor.id.in_(accompanying_people_ids)).all()
+        if accompanying_people is None:
+            # 根据 ID 列表查询所有对应的访客信息
+            accompanying_people_ids = self.get_accompanying_people_ids()
+            query = Visitor.query.filter(Visitor.id.in_(accompanying_people_ids))
+            if need_mask is False:
+                query = query.options(Visitor.undefer_sensitive())
+            accompanying_people = query.all() if accompanying_people_ids else []
 
         accompanying_people_info = []
         # 判断数据是否需要脱敏处理
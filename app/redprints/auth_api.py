@@ -7,10 +7,11 @@
 # 描述: 认证与授权 API 接口
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g
 
+from app.config import Config
 from app.controllers import AuthController
-from utils.decorators import token_required
+from utils.decorators import token_required, permission_required, envelope_payload
 
 auth_api = Blueprint('auth_api', __name__)
 
@@ -19,7 +20,7 @@ auth_api = Blueprint('auth_api', __name__)
 def login():
     """用户登录认证的 API 接口"""
     data = request.json
-    response, status_code = AuthController.login(data)
+    response, status_code = AuthController.login(data, request.remote_addr)
     return jsonify(response), status_code
 
 
@@ -27,7 +28,7 @@ def login():
 @token_required
 def logout(current_user):
     """用户注销的 API 接口"""
-    response, status_code = AuthController.logout(current_user)
+    response, status_code = AuthController.logout(current_user, g.device_id)
     return jsonify(response), status_code
 
 
@@ -42,18 +43,19 @@ def get_permissions(current_user):
 
 @auth_api.route('/change_password', methods=['POST'])
 @token_required
-def change_password(current_user):
-    """修改密码的 API 接口"""
-    data = request.json
+@envelope_payload
+def change_password(current_user, data):
+    """修改密码的 API 接口，请求体可使用数字信封加密"""
     response, status_code = AuthController.change_password(current_user, data)
     return jsonify(response), status_code
 
 
 @auth_api.route('/set_password', methods=['POST'])
 @token_required
-def set_password():
-    """设置密码的 API 接口"""
-    data = request.json
+@permission_required(Config.USER_ADMIN_PERMISSION)
+@envelope_payload
+def set_password(current_user, data):
+    """设置密码的 API 接口，请求体可使用数字信封加密"""
     response, status_code = AuthController.set_password(data)
     return jsonify(response), status_code
 
@@ -76,7 +78,7 @@ def bind_user():
 
 @auth_api.route('/unbind', methods=['POST'])
 @token_required
-def unbind_user():
+def unbind_user(current_user):
     """用户解绑的 API 接口"""
     data = request.json
     response, status_code = AuthController.unbind_user(data)
@@ -94,7 +96,8 @@ def unregister(current_user):
 
 @auth_api.route('/activate', methods=['POST'])
 @token_required
-def activate_user():
+@permission_required(Config.USER_ADMIN_PERMISSION)
+def activate_user(current_user):
     """激活用户的 API 接口"""
     data = request.json
     response, status_code = AuthController.activate_user(data)
@@ -103,8 +106,48 @@ def activate_user():
 
 @auth_api.route('/deactivate', methods=['POST'])
 @token_required
-def deactivate_user():
+@permission_required(Config.USER_ADMIN_PERMISSION)
+def deactivate_user(current_user):
     """停用用户的 API 接口"""
     data = request.json
     response, status_code = AuthController.deactivate_user(data)
     return jsonify(response), status_code
+
+
+@auth_api.route('/bulk_activate', methods=['POST'])
+@token_required
+@permission_required(Config.USER_ADMIN_PERMISSION)
+def bulk_activate_users(current_user):
+    """批量激活用户的 API 接口"""
+    data = request.json
+    response, status_code = AuthController.bulk_activate_users(data)
+    return jsonify(response), status_code
+
+
+@auth_api.route('/bulk_deactivate', methods=['POST'])
+@token_required
+@permission_required(Config.USER_ADMIN_PERMISSION)
+def bulk_deactivate_users(current_user):
+    """批量停用用户的 API 接口"""
+    data = request.json
+    response, status_code = AuthController.bulk_deactivate_users(data)
+    return jsonify(response), status_code
+
+
+@auth_api.route('/bulk_set_password', methods=['POST'])
+@token_required
+@permission_required(Config.USER_ADMIN_PERMISSION)
+@envelope_payload
+def bulk_set_password(current_user, data):
+    """批量设置密码的 API 接口，请求体可使用数字信封加密"""
+    response, status_code = AuthController.bulk_set_password(data)
+    return jsonify(response), status_code
+
+
+@auth_api.route('/envelope_session', methods=['POST'])
+@token_required
+def create_envelope_session(current_user):
+    """注册数据加密会话密钥的 API 接口"""
+    data = request.json
+    response, status_code = AuthController.create_envelope_session(current_user, data)
+    return jsonify(response), status_code
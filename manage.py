@@ -1,10 +1,24 @@
+import base64
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import click
 from flask_migrate import Migrate
+from sqlalchemy import select
+from sqlalchemy.orm import undefer_group
+from werkzeug.security import generate_password_hash, check_password_hash
 from app import create_app
-from extensions.db import db
-from utils.crypto_utils import generate_rsa_key_pair
+from app.config import Config
+from extensions.db import db, redis_client
+from utils.crypto_utils import generate_rsa_key_pair, aes256_encrypt, aes256_decrypt, sensitive_cipher, \
+    is_legacy_ciphertext, upgrade_ciphertext_format, ciphertext_key_id, select_crypto_backend, get_crypto_backend
 from app.models import User, Role, Permission, UserRole, RolePermission, Department, Campus, UserDepartment, Visitor, \
     VisitorLog
+from app.models.sensitive_field import SENSITIVE_GROUP, sensitive_columns, raw_ciphertext
+from utils.password_utils import PasswordQueueFull, verify_password
+from utils.permission_utils import bump_permission_version
 
 app = create_app()
 
@@ -28,6 +42,35 @@ def create_db():
         click.echo("数据库表已创建！")
 
 
+@app.cli.command("seed-permissions")
+@click.option('--role', 'role_name', default=None, help='同时将权限授予该角色')
+def seed_permissions(role_name):
+    """创建接口依赖的内置权限，部署后执行一次，可重复执行"""
+    with app.app_context():
+        # 用户管理权限：设置密码、激活、停用用户及对应的批量接口
+        permission = Permission.query.filter_by(name=Config.USER_ADMIN_PERMISSION, is_deleted=False).first()
+        if permission is None:
+            permission = Permission(name=Config.USER_ADMIN_PERMISSION, type='api',
+                                    description='管理用户账号：设置密码、激活、停用及批量操作', is_deleted=False)
+            db.session.add(permission)
+            db.session.flush()
+            click.echo(f"权限 {permission.name} 已创建！")
+
+        if role_name:
+            role = Role.query.filter_by(name=role_name, is_deleted=False).first()
+            if role is None:
+                raise click.ClickException(f"角色不存在: {role_name}")
+            if not RolePermission.query.filter_by(role_id=role.id, permission_id=permission.id,
+                                                  is_deleted=False).first():
+                db.session.add(RolePermission(role_id=role.id, permission_id=permission.id))
+                click.echo(f"权限 {permission.name} 已授予角色 {role.name}！")
+        db.session.commit()
+
+        # 角色的权限可能变化，递增全局权限版本
+        bump_permission_version()
+        click.echo("内置权限已就绪！")
+
+
 @app.cli.command("drop-db")
 def drop_db():
     """删除数据库表"""
@@ -74,6 +117,341 @@ def downgrade_db(revision):
         click.echo(f"数据库已降级到版本 {revision}！")
 
 
+def iter_batches(model, batch_size):
+    """按主键顺序分批读取数据，避免一次性加载整张表，加密字段随主查询一并读取"""
+    last_id = 0
+    while True:
+        rows = model.query.filter(model.id > last_id).options(undefer_group(SENSITIVE_GROUP)) \
+            .order_by(model.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        yield rows
+
+
+@app.cli.command("backfill-blind-index")
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+def backfill_blind_index(batch_size):
+    """回填敏感字段的盲索引"""
+    with app.app_context():
+        for model in (User, Visitor, VisitorLog, Department):
+            count = 0
+            for rows in iter_batches(model, batch_size):
+                for row in rows:
+                    row.update_blind_index()
+                db.session.commit()
+                db.session.expunge_all()
+                count += len(rows)
+            click.echo(f"{model.__tablename__} 盲索引已回填 {count} 条记录！")
+
+
+@app.cli.command("backfill-search-tokens")
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+def backfill_search_tokens(batch_size):
+    """回填敏感字段的检索令牌"""
+    with app.app_context():
+        for model in (User, Visitor, VisitorLog, Department):
+            count = 0
+            for rows in iter_batches(model, batch_size):
+                for row in rows:
+                    row.update_search_tokens()
+                db.session.commit()
+                db.session.expunge_all()
+                count += len(rows)
+            click.echo(f"{model.__tablename__} 检索令牌已回填 {count} 条记录！")
+
+
+@app.cli.command("backfill-masked-columns")
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+def backfill_masked_columns(batch_size):
+    """回填敏感字段的脱敏字段"""
+    with app.app_context():
+        for model in (Visitor, VisitorLog):
+            count = 0
+            for rows in iter_batches(model, batch_size):
+                for row in rows:
+                    row.update_masked_columns()
+                db.session.commit()
+                db.session.expunge_all()
+                count += len(rows)
+            click.echo(f"{model.__tablename__} 脱敏字段已回填 {count} 条记录！")
+
+
+@app.cli.command("migrate-cipher-format")
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+def migrate_cipher_format(batch_size):
+    """将敏感字段的 Base64 文本密文转换为二进制格式，需先通过 upgrade-db 将字段类型变更为 VARBINARY"""
+    with app.app_context():
+        for model in (User, Visitor, VisitorLog, Department):
+            table = model.__table__
+            columns = [table.c[key] for key, _ in sensitive_columns(model)]
+            last_id, count = 0, 0
+            while True:
+                # 只读取主键和密文字段，按主键顺序分批转换
+                rows = db.session.execute(select(table.c.id, *[raw_ciphertext(column) for column in columns])
+                                          .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)).all()
+                if not rows:
+                    break
+                for row in rows:
+                    values = {column.name: upgrade_ciphertext_format(row[i + 1]) for i, column in enumerate(columns)
+                              if is_legacy_ciphertext(row[i + 1])}
+                    if values:
+                        db.session.execute(table.update().where(table.c.id == row.id).values(values))
+                        count += 1
+                db.session.commit()
+                last_id = rows[-1].id
+            click.echo(f"{table.name} 已转换 {count} 条记录！")
+
+
+# 密钥轮换时，因并发修改而未能写入的记录在同一批次内重新读取后重试的次数
+ROTATION_RETRIES = 2
+
+
+def rotate_rows(table, columns, key_id, condition, limit=None):
+    """
+    使用当前密钥重新加密满足条件的记录中不是当前密钥加密的密文，仅当密文未被并发修改时才写入。
+
+    :return: (读取的记录, 实际更新的记录数, 因密文被并发修改而未更新的主键)
+    """
+    query = select(table.c.id, *[raw_ciphertext(column) for column in columns]).where(condition).order_by(table.c.id)
+    if limit:
+        query = query.limit(limit)
+    rows = db.session.execute(query).all()
+
+    # 收集不是当前密钥加密的密文，整批解密后再整批加密
+    pending = [(row.id, column, row[i + 1]) for row in rows for i, column in enumerate(columns)
+               if row[i + 1] is not None and ciphertext_key_id(row[i + 1]) != key_id]
+    plaintexts = sensitive_cipher.decrypt_many([value for _, _, value in pending])
+    encrypted = sensitive_cipher.encrypt_many(plaintexts)
+
+    updates = {}
+    for (row_id, column, value), new_value in zip(pending, encrypted):
+        updates.setdefault(row_id, []).append((column, value, new_value))
+
+    # 仅当密文未被并发修改时才写入，避免覆盖请求中的更新
+    count, rejected = 0, []
+    for row_id, items in updates.items():
+        result = db.session.execute(table.update()
+                                    .where(table.c.id == row_id,
+                                           *[raw_ciphertext(column) == value for column, value, _ in items])
+                                    .values({column.name: new_value for column, _, new_value in items}))
+        if result.rowcount:
+            count += result.rowcount
+        else:
+            rejected.append(row_id)
+    db.session.commit()
+    return rows, count, rejected
+
+
+def rotate_rows_with_retry(table, columns, key_id, condition, limit=None):
+    """重新加密满足条件的记录，被并发修改的记录（如仍在使用旧密钥的服务器写入的）重新读取后重试"""
+    rows, count, rejected = rotate_rows(table, columns, key_id, condition, limit)
+    for _ in range(ROTATION_RETRIES):
+        if not rejected:
+            break
+        _, retried, rejected = rotate_rows(table, columns, key_id, table.c.id.in_(rejected))
+        count += retried
+    return rows, count, rejected
+
+
+@app.cli.command("rotate-aes-key")
+@click.option('--batch-size', default=200, show_default=True, help='每批处理的记录数')
+@click.option('--rows-per-second', default=500, show_default=True, help='每秒最多处理的记录数')
+@click.option('--restart', is_flag=True, help='忽略断点，从头开始')
+def rotate_aes_key(batch_size, rows_per_second, restart):
+    """
+    使用当前密钥重新加密敏感字段，按主键分批执行，断点保存在 Redis 中，可随时中断后继续。
+
+    多次重试后仍被并发修改的记录保存在 Redis 的待重试集合中，下次执行时优先处理。
+    """
+    with app.app_context():
+        key_id = sensitive_cipher.active_key_id
+        remaining = 0
+        for model in (User, Visitor, VisitorLog, Department):
+            table = model.__table__
+            columns = [table.c[key] for key, _ in sensitive_columns(model)]
+
+            # 读取断点和上次未能写入的记录
+            checkpoint_key = f"aes_key_rotation:{table.name}:{key_id}"
+            retry_key = f"{checkpoint_key}:retry"
+            if restart:
+                redis_client.delete(checkpoint_key, retry_key)
+            last_id = int(redis_client.get(checkpoint_key) or 0)
+
+            count = 0
+            retry_ids = [int(row_id) for row_id in redis_client.smembers(retry_key)]
+            if retry_ids:
+                _, count, rejected = rotate_rows_with_retry(table, columns, key_id, table.c.id.in_(retry_ids))
+                redis_client.delete(retry_key)
+                if rejected:
+                    redis_client.sadd(retry_key, *rejected)
+
+            while True:
+                start = time.perf_counter()
+                rows, updated, rejected = rotate_rows_with_retry(table, columns, key_id, table.c.id > last_id,
+                                                                 batch_size)
+                if not rows:
+                    break
+                count += updated
+
+                # 保存断点，仍未能写入的记录留待下次执行
+                if rejected:
+                    redis_client.sadd(retry_key, *rejected)
+                last_id = rows[-1].id
+                redis_client.set(checkpoint_key, last_id)
+
+                # 限制处理速度，避免影响线上请求
+                delay = len(rows) / rows_per_second - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            click.echo(f"{table.name} 已重新加密 {count} 条记录！")
+            skipped = redis_client.scard(retry_key)
+            if skipped:
+                remaining += skipped
+                click.echo(f"{table.name} 有 {skipped} 条记录被并发修改，未能重新加密，请稍后再次执行！")
+
+        if remaining:
+            click.echo(f"密钥轮换未完成，共 {remaining} 条记录待重试，当前密钥编号 {key_id}！")
+        else:
+            click.echo(f"已完成密钥轮换，当前密钥编号 {key_id}！")
+
+
+@app.cli.command("bench-serialize")
+@click.option('--rows', default=1000, show_default=True, help='模拟的访客记录数')
+def bench_serialize(rows):
+    """对比访客记录敏感字段逐个解密与批量解密的耗时"""
+    # 模拟访客记录中的 8 个敏感字段
+    sample = ['张三', '13800000000', '110101199001011234', '某某科技有限公司', '李四', '计算机学院', '王五', '赵六']
+    key = base64.b64decode(Config.AES_KEY.encode('utf-8'))
+    legacy_page = [[aes256_encrypt(value, key) for value in sample] for _ in range(rows)]
+    page = [sensitive_cipher.encrypt_many(sample) for _ in range(rows)]
+
+    # 改造前：Base64 文本密文，每个字段都重新解码密钥并创建 cipher 对象
+    start = time.perf_counter()
+    for row in legacy_page:
+        [aes256_decrypt(value, base64.b64decode(Config.AES_KEY.encode('utf-8'))) for value in row]
+    before = (time.perf_counter() - start) / rows * 1e6
+
+    # 改造后：按记录批量解密
+    start = time.perf_counter()
+    for row in page:
+        sensitive_cipher.decrypt_many(row)
+    after_row = (time.perf_counter() - start) / rows * 1e6
+
+    # 改造后：整页批量解密
+    start = time.perf_counter()
+    sensitive_cipher.decrypt_many([value for row in page for value in row])
+    after_page = (time.perf_counter() - start) / rows * 1e6
+
+    click.echo(f"逐字段解密: {before:.1f} us/条")
+    click.echo(f"按记录批量解密: {after_row:.1f} us/条")
+    click.echo(f"整页批量解密: {after_page:.1f} us/条")
+
+
+@app.cli.command("crypto-bench")
+@click.option('--count', default=10000, show_default=True, help='短敏感字段的数量')
+@click.option('--payload-mb', default=32, show_default=True, help='大数据的大小（MB）')
+def crypto_bench(count, payload_mb):
+    """测量各加解密后端在当前主机上的吞吐量，并给出较快的后端"""
+    payload_size = payload_mb * 1024 * 1024
+    backend, results = select_crypto_backend(count, payload_size)
+    for name, result in results.items():
+        click.echo(f"[{name}]")
+        click.echo(f"  短字段加密: {count / result['field_encrypt']:.0f} 条/秒")
+        click.echo(f"  短字段解密: {count / result['field_decrypt']:.0f} 条/秒")
+        click.echo(f"  大数据加密: {payload_mb / result['stream_encrypt']:.1f} MB/秒")
+        click.echo(f"  大数据解密: {payload_mb / result['stream_decrypt']:.1f} MB/秒")
+    click.echo(f"较快的后端: {backend.name}，可设置环境变量 CRYPTO_BACKEND={backend.name} 固定使用")
+    click.echo(f"当前配置 CRYPTO_BACKEND={Config.CRYPTO_BACKEND}，进程内使用的后端: {get_crypto_backend().name}")
+
+
+def measure_login_burst(verify, logins, threads):
+    """
+    模拟多线程服务器在登录高峰时的表现：登录请求和普通请求共用同一组请求线程，
+    返回登录吞吐量、被拒绝的登录次数，以及普通请求从提交到完成的耗时。
+    """
+    password_hash = generate_password_hash('password', Config.PASSWORD_HASH_METHOD)
+    page = [{'id': i, 'name': '张三', 'phone_number': '13800000000', 'visit_time': '2024-10-27 08:00'}
+            for i in range(50)]
+    rejected = []
+
+    def login():
+        try:
+            verify(password_hash, 'password')
+        except PasswordQueueFull:
+            rejected.append(1)
+
+    def request():
+        json.dumps(page, ensure_ascii=False)
+
+    with ThreadPoolExecutor(max_workers=threads) as server:
+        start = time.perf_counter()
+        futures = [server.submit(login) for _ in range(logins)]
+
+        # 登录期间每 10 毫秒发起一个普通请求
+        latencies = []
+        while not futures or not all(future.done() for future in futures):
+            submitted = time.perf_counter()
+            server.submit(request).result()
+            latencies.append(time.perf_counter() - submitted)
+            if not futures and len(latencies) >= 100:
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return (logins - len(rejected)) / elapsed, len(rejected), statistics.median(latencies) * 1e3, \
+        latencies[int(len(latencies) * 0.99)] * 1e3
+
+
+@app.cli.command("bench-login")
+@click.option('--logins', default=200, show_default=True, help='并发登录的次数')
+@click.option('--threads', default=16, show_default=True, help='模拟服务器的请求线程数')
+def bench_login(logins, threads):
+    """对比登录高峰时请求线程直接校验密码与在独立线程池中校验密码对普通请求耗时的影响"""
+    click.echo(f"密码哈希算法: {Config.PASSWORD_HASH_METHOD}，线程池: {Config.PASSWORD_HASH_WORKERS} 线程，"
+               f"队列上限: {Config.PASSWORD_HASH_QUEUE}")
+    for title, verify, count in (('无登录请求', check_password_hash, 0),
+                                 ('请求线程直接校验', check_password_hash, logins),
+                                 ('独立线程池校验', verify_password, logins)):
+        throughput, rejected, p50, p99 = measure_login_burst(verify, count, threads)
+        click.echo(f"{title}: 登录 {throughput:.1f} 次/秒，拒绝 {rejected} 次，"
+                   f"普通请求耗时 p50 {p50:.2f} ms，p99 {p99:.2f} ms")
+
+
+@app.cli.command("wechat-stub")
+@click.option('--port', default=8090, show_default=True, help='监听端口')
+@click.option('--delay', default=0.0, show_default=True, help='每个请求的模拟延迟（秒）')
+def wechat_stub(port, delay):
+    """启动本地微信接口模拟服务，将 WECHAT_API_BASE_URL 设置为 http://127.0.0.1:<port> 后用于测试和压测"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delay)
+            url = urlparse(self.path)
+            if url.path != '/sns/jscode2session':
+                self.send_error(404)
+                return
+            code = parse_qs(url.query).get('js_code', [''])[0]
+            body = json.dumps({'openid': f'stub-{code}', 'session_key': base64.b64encode(code.encode()).decode()})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    click.echo(f"微信接口模拟服务已启动: http://127.0.0.1:{port}")
+    ThreadingHTTPServer(('127.0.0.1', port), Handler).serve_forever()
+
+
 @app.cli.command("run-server")
 def run_server():
     """运行服务器"""
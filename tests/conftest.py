@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/conftest.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 测试公共夹具，使用内存 SQLite 数据库和 fakeredis，无需外部服务。
+"""
+
+import base64
+import os
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+# 配置在导入时读取环境变量，必须在导入应用之前设置
+os.environ.update({
+    'DATABASE_URL': 'sqlite://',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'SECRET_KEY': 'test-secret-key',
+    'JWT_SECRET_KEY': 'test-jwt-secret-key-with-enough-length',
+    'AES_KEY': base64.b64encode(b'k' * 32).decode(),
+    'BLIND_INDEX_KEY': base64.b64encode(b'b' * 32).decode(),
+    'CRYPTO_BACKEND': 'pycryptodome',
+})
+
+from app import create_app  # noqa: E402
+from app.models import User, Role, Permission, UserRole, RolePermission  # noqa: E402
+from extensions.db import db, redis_client  # noqa: E402
+from utils import permission_utils  # noqa: E402
+from utils.principal_utils import principal_cache  # noqa: E402
+from utils.session_utils import token_claims_cache, refreshed_token_cache, generate_token, store_token  # noqa: E402
+
+# 所有测试共用一个 fakeredis 实例，注册的 Lua 脚本对象绑定在该实例上
+_fake_redis = fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def app():
+    """创建应用并初始化空数据库和 Redis"""
+    app = create_app()
+    app.config['TESTING'] = True
+    redis_client._redis_client = _fake_redis
+    _fake_redis.flushall()
+    for cache in (principal_cache, token_claims_cache, refreshed_token_cache,
+                  permission_utils.permission_version_cache):
+        cache.clear()
+    permission_utils._permission_ids.update(version=None, ids={}, bits={})
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """创建用户，传入权限名称时创建角色并授予这些权限"""
+    counter = iter(range(1, 10000))
+
+    def _make_user(*permission_names, password_hash='x'):
+        n = next(counter)
+        user = User(username=f'user{n}', password_hash=password_hash, phone_number=f'1380000{n:04d}',
+                    name=f'用户{n}')
+        db.session.add(user)
+        db.session.flush()
+        if permission_names:
+            role = Role(name=f'role{n}')
+            db.session.add(role)
+            db.session.flush()
+            db.session.add(UserRole(user_id=user.id, role_id=role.id))
+            for name in permission_names:
+                permission = Permission.query.filter_by(name=name).first()
+                if permission is None:
+                    permission = Permission(name=name, type='api')
+                    db.session.add(permission)
+                    db.session.flush()
+                db.session.add(RolePermission(role_id=role.id, permission_id=permission.id))
+        db.session.commit()
+        return user
+
+    return _make_user
+
+
+@pytest.fixture
+def login(app):
+    """为用户签发 Token 并存入会话，返回请求头"""
+
+    def _login(user, device_id='test'):
+        token = generate_token(user.id, device_id)
+        store_token(user.id, device_id, token)
+        return {'Authorization': token}
+
+    return _login
+
+
+@pytest.fixture
+def run_command(app, monkeypatch):
+    """在测试应用上执行 manage.py 中的命令，返回命令的执行结果"""
+    import manage
+    # 导入 manage.py 时创建的应用会重新初始化 Redis 客户端
+    redis_client._redis_client = _fake_redis
+    monkeypatch.setattr(manage, 'app', app)
+    runner = app.test_cli_runner()
+
+    def _run_command(name, *args):
+        result = runner.invoke(getattr(manage, name), list(args))
+        assert result.exception is None, result.output
+        return result
+
+    return _run_command
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_blind_index.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 敏感字段盲索引的测试。
+"""
+
+import pytest
+
+from app.models import User, Visitor
+from extensions.db import db
+from utils.crypto_utils import hmac_blind_index
+
+
+def compile_where(query):
+    """编译查询的条件和绑定参数"""
+    compiled = query.statement.whereclause.compile()
+    return str(compiled), list(compiled.params.values())
+
+
+@pytest.mark.parametrize('field, value', [('username', 'alice'), ('phone_number', '13800001234')])
+def test_filter_by_compiles_to_blind_index(app, field, value):
+    where, params = compile_where(User.query.filter_by(**{field: value}))
+
+    assert where == f'users.{field}_index = :{field}_index_1'
+    assert params == [hmac_blind_index(value)]
+
+
+def test_in_compiles_to_blind_index(app):
+    where, params = compile_where(User.query.filter(User.phone_number.in_(['13800001234', '13800005678'])))
+
+    assert 'users.phone_number_index IN' in where
+    assert params == [[hmac_blind_index('13800001234'), hmac_blind_index('13800005678')]]
+
+
+def test_blind_index_is_set_on_assignment(make_user):
+    user = make_user()
+    assert user.username_index == hmac_blind_index(user.username)
+    assert user.phone_number_index == hmac_blind_index(user.phone_number)
+
+    user.phone_number = '13900009999'
+    user.id_number = None
+
+    assert user.phone_number_index == hmac_blind_index('13900009999')
+    assert user.id_number_index is None
+
+
+def test_lookup_by_blind_index(make_user):
+    user = make_user()
+    make_user()
+
+    assert User.query.filter_by(username=user.username).one().id == user.id
+    assert User.query.filter(User.phone_number != user.phone_number).count() == 1
+
+
+def test_backfill_blind_index(make_user, run_command):
+    users = [make_user(), make_user()]
+    visitor = Visitor(user_id=users[0].id, name='张三', gender='男', id_type='身份证', id_number='110101199001011234',
+                      phone_number='13800001234')
+    db.session.add(visitor)
+    db.session.commit()
+    phone_numbers = {user.id: user.phone_number for user in users}
+
+    # 模拟上线盲索引之前写入的数据
+    db.session.execute(User.__table__.update().values(username_index=None, phone_number_index=None))
+    db.session.execute(Visitor.__table__.update().values(id_number_index=None, phone_number_index=None))
+    db.session.commit()
+    assert User.query.filter_by(phone_number=phone_numbers[users[0].id]).first() is None
+
+    result = run_command('backfill_blind_index')
+
+    assert 'users 盲索引已回填 2 条记录' in result.output
+    for user_id, phone_number in phone_numbers.items():
+        assert User.query.filter_by(phone_number=phone_number).one().id == user_id
+    assert Visitor.query.filter_by(id_number='110101199001011234').one().id == visitor.id
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_bulk_admin.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 批量管理用户接口的测试。
+"""
+
+import pytest
+
+from app.config import Config
+from app.models import User, Role, Permission, UserRole, RolePermission
+from extensions.db import db
+
+
+@pytest.mark.parametrize('path, payload', [
+    ('/api/auth/bulk_activate', {}),
+    ('/api/auth/bulk_deactivate', {}),
+    ('/api/auth/bulk_set_password', {'new_password': 'hijacked'}),
+])
+def test_bulk_endpoints_reject_non_admin(client, make_user, login, path, payload):
+    attacker = make_user()
+    victim = make_user()
+    victim_id, victim_hash = victim.id, victim.password_hash
+
+    response = client.post(path, json={'user_ids': [victim_id], **payload}, headers=login(attacker))
+
+    assert response.status_code == 403
+    db.session.expire_all()
+    victim = db.session.get(User, victim_id)
+    assert victim.is_active and victim.password_hash == victim_hash
+
+
+def test_bulk_deactivate_as_admin(client, make_user, login):
+    admin = make_user(Config.USER_ADMIN_PERMISSION)
+    users = [make_user(), make_user()]
+    user_ids = [user.id for user in users]
+
+    response = client.post('/api/auth/bulk_deactivate', json={'user_ids': user_ids}, headers=login(admin))
+
+    assert response.status_code == 200
+    assert response.json['data']['count'] == 2
+    db.session.expire_all()
+    assert not any(db.session.get(User, user_id).is_active for user_id in user_ids)
+
+
+@pytest.mark.parametrize('payload, error', [
+    ({'user_ids': [True]}, '用户ID列表格式不正确'),
+    ({'user_ids': ['1']}, '用户ID列表格式不正确'),
+    ({'user_ids': []}, '用户ID列表格式不正确'),
+    ({'department_id': [1]}, '部门ID格式不正确'),
+    ({'department_id': {'id': 1}}, '部门ID格式不正确'),
+    ({'department_id': True}, '部门ID格式不正确'),
+    ({'user_ids': [1], 'department_id': 1}, '用户ID列表和部门ID只能指定一个'),
+    ({}, '缺少用户ID列表或部门ID'),
+])
+def test_bulk_target_validation(client, make_user, login, payload, error):
+    admin = make_user(Config.USER_ADMIN_PERMISSION)
+
+    response = client.post('/api/auth/bulk_deactivate', json=payload, headers=login(admin))
+
+    assert response.status_code == 400
+    assert response.json['error'] == error
+
+
+def test_seed_permissions_enables_admin_endpoints(client, make_user, login, run_command):
+    admin = make_user()
+    role = Role(name='管理员')
+    db.session.add(role)
+    db.session.flush()
+    db.session.add(UserRole(user_id=admin.id, role_id=role.id))
+    db.session.commit()
+    user_id = make_user().id
+
+    assert client.post('/api/auth/deactivate', json={'user_id': user_id}, headers=login(admin)).status_code == 403
+
+    run_command('seed_permissions', '--role', '管理员')
+    run_command('seed_permissions', '--role', '管理员')
+
+    assert Permission.query.filter_by(name=Config.USER_ADMIN_PERMISSION).count() == 1
+    assert RolePermission.query.filter_by(role_id=role.id).count() == 1
+    assert client.post('/api/auth/deactivate', json={'user_id': user_id}, headers=login(admin)).status_code == 200
+
+
+def test_unbind_user(client, make_user, login):
+    user = make_user()
+    user.openid = 'openid-1'
+    db.session.commit()
+
+    response = client.post('/api/auth/unbind', json={'openid': 'openid-1'}, headers=login(user))
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, user.id).openid is None
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_crypto_stream.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: AES-256-GCM 流式加密格式的测试。
+"""
+
+import io
+
+import pytest
+
+from utils.crypto_backend import available_crypto_backends
+from utils.crypto_utils import STREAM_HEADER, STREAM_TAG_SIZE, aes256_gcm_encrypt_stream, aes256_gcm_decrypt_stream
+
+KEY = b'k' * 32
+CHUNK_SIZE = 64
+RECORD_SIZE = CHUNK_SIZE + STREAM_TAG_SIZE
+BACKENDS = available_crypto_backends()
+
+
+def encrypt(data, backend=None, chunk_size=CHUNK_SIZE):
+    dst = io.BytesIO()
+    written = aes256_gcm_encrypt_stream(io.BytesIO(data), dst, KEY, chunk_size, backend=backend)
+    assert written == len(dst.getvalue())
+    return dst.getvalue()
+
+
+def decrypt(data, backend=None):
+    dst = io.BytesIO()
+    written = aes256_gcm_decrypt_stream(io.BytesIO(data), dst, KEY, backend=backend)
+    assert written == len(dst.getvalue())
+    return dst.getvalue()
+
+
+def records(encrypted):
+    """将密文拆分为头部和各个分块"""
+    body = encrypted[STREAM_HEADER.size:]
+    return encrypted[:STREAM_HEADER.size], [body[i:i + RECORD_SIZE] for i in range(0, len(body), RECORD_SIZE)]
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE * 3, CHUNK_SIZE * 3 + 5])
+@pytest.mark.parametrize('encrypt_backend', BACKENDS, ids=lambda backend: backend.name)
+@pytest.mark.parametrize('decrypt_backend', BACKENDS, ids=lambda backend: backend.name)
+def test_round_trip(size, encrypt_backend, decrypt_backend):
+    data = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+
+    encrypted = encrypt(data, encrypt_backend)
+
+    # 空数据也写入一个末块，整块的数据不会多出一个空的末块
+    assert len(records(encrypted)[1]) == max(1, -(-size // CHUNK_SIZE))
+    assert decrypt(encrypted, decrypt_backend) == data
+
+
+def test_rejects_truncation_at_chunk_boundary():
+    header, chunks = records(encrypt(b'x' * CHUNK_SIZE * 3))
+
+    for count in (1, 2):
+        with pytest.raises(ValueError):
+            decrypt(header + b''.join(chunks[:count]))
+    with pytest.raises(ValueError):
+        decrypt(header)
+
+
+def test_rejects_swapped_chunks():
+    header, chunks = records(encrypt(b'a' * CHUNK_SIZE + b'b' * CHUNK_SIZE + b'c' * 10))
+
+    with pytest.raises(ValueError):
+        decrypt(header + chunks[1] + chunks[0] + chunks[2])
+
+
+def test_rejects_modified_header():
+    encrypted = encrypt(b'x' * CHUNK_SIZE * 2)
+    version, chunk_size, nonce_prefix = STREAM_HEADER.unpack(encrypted[:STREAM_HEADER.size])
+    body = encrypted[STREAM_HEADER.size:]
+
+    # 修改 nonce 前缀或分块大小都会使认证失败
+    tampered_nonce = STREAM_HEADER.pack(version, chunk_size, bytes([nonce_prefix[0] ^ 1]) + nonce_prefix[1:])
+    tampered_size = STREAM_HEADER.pack(version, chunk_size * 2, nonce_prefix)
+    for header in (tampered_nonce, tampered_size):
+        with pytest.raises(ValueError):
+            decrypt(header + body)
+
+    with pytest.raises(ValueError, match='不支持的流式密文版本'):
+        decrypt(b'\x02' + encrypted[1:])
+    with pytest.raises(ValueError, match='分块大小无效'):
+        decrypt(STREAM_HEADER.pack(version, 0, nonce_prefix) + body)
+    with pytest.raises(ValueError, match='密文头部不完整'):
+        decrypt(encrypted[:STREAM_HEADER.size - 1])
+
+
+def test_rejects_modified_chunk():
+    encrypted = bytearray(encrypt(b'x' * CHUNK_SIZE * 2))
+    encrypted[STREAM_HEADER.size + 3] ^= 1
+
+    with pytest.raises(ValueError):
+        decrypt(bytes(encrypted))
+
+
+@pytest.mark.parametrize('chunk_size', [0, -1, 16 * 1024 * 1024 + 1])
+def test_encrypt_rejects_invalid_chunk_size(chunk_size):
+    with pytest.raises(ValueError, match='分块大小无效'):
+        encrypt(b'x', chunk_size=chunk_size)
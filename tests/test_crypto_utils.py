@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_crypto_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 敏感字段密文格式和批量加解密的测试。
+"""
+
+import base64
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from Crypto.Util.Padding import pad
+
+from utils.crypto_utils import SensitiveFieldCipher, aes256_encrypt, is_legacy_ciphertext, upgrade_ciphertext_format
+
+KEY = b'k' * 32
+OTHER_KEY = b'o' * 32
+
+# 覆盖空字符串、分组边界前后（15、16、17 字节）、多个分组和多字节字符
+PLAINTEXTS = ['', 'a' * 15, 'a' * 16, 'a' * 17, '13800001234', '110101199001011234' * 3, '张三', '某某科技有限公司 ✓']
+
+
+def reference_encrypt(key, plaintext):
+    """使用标准 CBC 模式加密，返回 IV 和密文的组合"""
+    iv = get_random_bytes(AES.block_size)
+    return iv + AES.new(key, AES.MODE_CBC, iv).encrypt(pad(plaintext.encode('utf-8'), AES.block_size))
+
+
+@pytest.fixture
+def cipher():
+    return SensitiveFieldCipher({0: KEY}, 0)
+
+
+@pytest.mark.parametrize('as_bytes', [False, True])
+def test_legacy_base64_ciphertext(cipher, as_bytes):
+    legacy = aes256_encrypt('13800001234', KEY)
+    if as_bytes:
+        legacy = legacy.encode('ascii')
+
+    assert is_legacy_ciphertext(legacy)
+    assert cipher.decrypt(legacy) == '13800001234'
+    assert cipher.decrypt(upgrade_ciphertext_format(legacy)) == '13800001234'
+
+
+def test_binary_ciphertext_is_not_legacy(cipher):
+    assert not is_legacy_ciphertext(cipher.encrypt('13800001234'))
+    assert not is_legacy_ciphertext(None)
+
+
+def test_encrypt_many_matches_standard_cbc(cipher):
+    values = PLAINTEXTS + [None]
+
+    encrypted = cipher.encrypt_many(values)
+
+    assert encrypted[-1] is None
+    for plaintext, data in zip(PLAINTEXTS, encrypted):
+        assert data[:2] == b'\x02\x00'
+        iv, ciphertext = data[2:18], data[18:]
+        assert ciphertext == AES.new(KEY, AES.MODE_CBC, iv).encrypt(pad(plaintext.encode('utf-8'), AES.block_size))
+
+
+def test_decrypt_many_matches_standard_cbc(cipher):
+    values = [b'\x02\x00' + reference_encrypt(KEY, plaintext) for plaintext in PLAINTEXTS]
+
+    assert cipher.decrypt_many(values + [None]) == PLAINTEXTS + [None]
+
+
+def test_decrypt_many_mixed_formats_and_keys():
+    cipher = SensitiveFieldCipher({0: KEY, 7: OTHER_KEY}, 7)
+    values, expected = [], []
+    for n, plaintext in enumerate(PLAINTEXTS):
+        raw = reference_encrypt(KEY, plaintext)
+        values += [
+            b'\x01' + raw,  # V1，密钥 0
+            b'\x02\x07' + reference_encrypt(OTHER_KEY, plaintext),  # V2，密钥 7
+            base64.b64encode(raw).decode('ascii'),  # Base64 文本
+            base64.b64encode(raw),  # 以 ASCII 字节保存的 Base64 文本
+            None,
+        ]
+        expected += [plaintext] * 4 + [None]
+
+    assert cipher.decrypt_many(values) == expected
+    assert cipher.decrypt_many(cipher.encrypt_many(PLAINTEXTS)) == PLAINTEXTS
+
+
+@pytest.mark.parametrize('data', [
+    b'\x02\x00' + b'x' * 16,  # 只有 IV
+    b'\x02\x00' + b'x' * 33,  # 不是分组的整数倍
+    b'\x01' + b'x' * 20,
+    b'',
+])
+def test_decrypt_many_rejects_invalid_length(cipher, data):
+    with pytest.raises(ValueError, match='密文长度无效'):
+        cipher.decrypt_many([b'\x02\x00' + reference_encrypt(KEY, 'ok'), data])
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_envelope_session.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 数据加密会话密钥接口的测试。
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.config import Config
+from app.models import User
+from extensions.db import db, redis_client
+from utils import crypto_utils
+
+
+def test_envelope_session_requires_token(client):
+    response = client.post('/api/auth/envelope_session', json={'encrypted_key': 'abc'})
+
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('encrypted_key', [123, ['abc'], {'key': 'abc'}])
+def test_envelope_session_rejects_non_string_key(client, make_user, login, encrypted_key):
+    response = client.post('/api/auth/envelope_session', json={'encrypted_key': encrypted_key},
+                           headers=login(make_user()))
+
+    assert response.status_code == 400
+
+
+@pytest.fixture(scope='module')
+def rsa_key():
+    return RSA.generate(2048)
+
+
+@pytest.fixture
+def rsa_keys(rsa_key, monkeypatch):
+    """使用临时生成的 RSA 密钥对"""
+    key = rsa_key
+    monkeypatch.setattr(Config, 'PUBLIC_KEY', key.publickey().export_key().decode())
+    monkeypatch.setattr(Config, 'PRIVATE_KEY', key.export_key().decode())
+    caches = (crypto_utils.load_public_key_from_env, crypto_utils.load_private_key_from_env,
+              crypto_utils.get_rsa_encrypt_cipher, crypto_utils.get_rsa_decrypt_cipher)
+    for cache in caches:
+        cache.cache_clear()
+    yield
+    for cache in caches:
+        cache.cache_clear()
+
+
+@pytest.fixture
+def envelope(client, rsa_keys):
+    """为用户注册会话密钥，返回使用该会话密钥加密请求体的函数"""
+
+    def _envelope(headers):
+        key = get_random_bytes(32)
+        encrypted_key = crypto_utils.rsa_encrypt_aes_key(key)
+        response = client.post('/api/auth/envelope_session', json={'encrypted_key': encrypted_key}, headers=headers)
+        assert response.status_code == 200
+        fingerprint = response.json['data']['key_fingerprint']
+        return fingerprint, lambda payload: {'key_fingerprint': fingerprint,
+                                             'encrypted_data': crypto_utils.aes256_encrypt(json.dumps(payload), key)}
+
+    return _envelope
+
+
+def make_password_user(make_user):
+    return make_user(password_hash=generate_password_hash('old-password', Config.PASSWORD_HASH_METHOD))
+
+
+def password_changed(user_id):
+    db.session.expire_all()
+    return check_password_hash(db.session.get(User, user_id).password_hash, 'new-password')
+
+
+def test_change_password_with_session_key(client, make_user, login, envelope):
+    user = make_password_user(make_user)
+    headers = login(user)
+    _, seal = envelope(headers)
+
+    response = client.post('/api/auth/change_password',
+                           json=seal({'old_password': 'old-password', 'new_password': 'new-password'}),
+                           headers=headers)
+
+    assert response.status_code == 200
+    assert password_changed(user.id)
+
+
+def test_change_password_with_rsa_envelope(client, make_user, login, rsa_keys):
+    user = make_password_user(make_user)
+    key = get_random_bytes(32)
+    payload = json.dumps({'old_password': 'old-password', 'new_password': 'new-password'})
+
+    response = client.post('/api/auth/change_password', headers=login(user), json={
+        'encrypted_key': crypto_utils.rsa_encrypt_aes_key(key),
+        'encrypted_data': crypto_utils.aes256_encrypt(payload, key),
+    })
+
+    assert response.status_code == 200
+    assert password_changed(user.id)
+
+
+def test_session_key_is_bound_to_its_user(client, make_user, login, envelope):
+    owner, other = make_password_user(make_user), make_password_user(make_user)
+    _, seal = envelope(login(owner))
+
+    response = client.post('/api/auth/change_password',
+                           json=seal({'old_password': 'old-password', 'new_password': 'new-password'}),
+                           headers=login(other))
+
+    assert response.status_code == 400
+    assert not password_changed(other.id)
+
+
+def test_logout_deletes_session_keys(client, make_user, login, envelope):
+    user = make_password_user(make_user)
+    headers = login(user)
+    fingerprint, seal = envelope(headers)
+    assert crypto_utils.load_envelope_session_key(user.id, fingerprint)
+
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+
+    assert not redis_client.exists(crypto_utils.envelope_session_key(user.id))
+    with pytest.raises(KeyError):
+        crypto_utils.load_envelope_session_key(user.id, fingerprint)
+
+
+def test_expired_session_key_is_rejected(client, make_user, login, envelope, monkeypatch):
+    user = make_password_user(make_user)
+    fingerprint, _ = envelope(login(user))
+
+    now = time.time() + Config.ENVELOPE_SESSION_TTL + 1
+    monkeypatch.setattr(crypto_utils, 'time', SimpleNamespace(time=lambda: now))
+
+    with pytest.raises(KeyError):
+        crypto_utils.load_envelope_session_key(user.id, fingerprint)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_login_throttle.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 登录限流的测试。
+"""
+
+import pytest
+from flask import request
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.config import Config
+from app.controllers import AuthController
+
+
+@pytest.fixture
+def ip_limit(monkeypatch):
+    monkeypatch.setattr(Config, 'LOGIN_IP_LIMIT', 3)
+    monkeypatch.setattr(Config, 'MAX_LOGIN_ATTEMPTS', 100)
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user(password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1'))
+
+
+def test_successful_logins_do_not_count_towards_ip_limit(client, user, ip_limit):
+    for _ in range(5):
+        response = client.post('/api/auth/login', json={'username': user.username, 'password': 'secret'})
+        assert response.status_code == 200
+
+
+def test_failed_logins_are_limited_per_ip(client, user, ip_limit):
+    for _ in range(3):
+        response = client.post('/api/auth/login', json={'username': user.username, 'password': 'wrong'})
+        assert response.status_code == 401
+
+    response = client.post('/api/auth/login', json={'username': user.username, 'password': 'secret'})
+    assert response.status_code == 429
+
+    # 其他 IP 不受影响
+    response = client.post('/api/auth/login', json={'username': user.username, 'password': 'secret'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.status_code == 200
+
+
+def test_missing_ip_skips_ip_window(user, ip_limit):
+    for _ in range(5):
+        _, status = AuthController.login({'username': user.username, 'password': 'wrong'}, None)
+        assert status == 401
+
+
+def test_proxy_fix_uses_forwarded_client_ip(monkeypatch):
+    monkeypatch.setattr(Config, 'PROXY_FIX_HOPS', 1)
+    app = create_app()
+
+    @app.route('/_remote_addr')
+    def remote_addr():
+        return request.remote_addr
+
+    response = app.test_client().get('/_remote_addr', headers={'X-Forwarded-For': '203.0.113.7'},
+                                      environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.text == '203.0.113.7'
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_permission_claims.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 根据 Token 中的权限声明鉴权，以及权限版本变化后回退到查询数据库的测试。
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.controllers.permission_controller import PermissionController
+from app.controllers.role_permission_controller import RolePermissionController
+from app.controllers.user_role_controller import UserRoleController
+from app.config import Config
+from app.models import User, Role, Permission
+from extensions.db import db
+from utils.decorators import token_required, permission_required
+from utils.session_utils import REFRESHED_TOKEN_HEADER, decode_token
+
+
+@pytest.fixture
+def routes(app):
+    @app.route('/_read')
+    @token_required
+    @permission_required('user:read')
+    def _read(current_user):
+        return {'ok': True}
+
+    @app.route('/_write')
+    @token_required
+    @permission_required('user:write')
+    def _write(current_user):
+        return {'ok': True}
+
+
+@pytest.fixture
+def has_permission_calls(monkeypatch):
+    """记录回退到 User.has_permission 查询数据库的次数"""
+    calls = []
+    has_permission = User.has_permission
+
+    def recording_has_permission(user, permission_name):
+        calls.append(permission_name)
+        return has_permission(user, permission_name)
+
+    monkeypatch.setattr(User, 'has_permission', recording_has_permission)
+    return calls
+
+
+@pytest.fixture
+def statements(app):
+    """记录执行的 SQL 语句"""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def reader(make_user):
+    user = make_user('user:read')
+    db.session.add(Permission(name='user:write', type='api'))
+    db.session.commit()
+    return user
+
+
+def test_claims_authorize_without_queries(client, routes, reader, login, has_permission_calls, statements):
+    headers = login(reader)
+    client.get('/_read', headers=headers)
+    statements.clear()
+
+    assert client.get('/_read', headers=headers).status_code == 200
+    assert client.get('/_write', headers=headers).status_code == 403
+    assert statements == []
+    assert has_permission_calls == []
+
+
+def test_role_permission_change_falls_back_to_database(client, routes, reader, login, has_permission_calls):
+    headers = login(reader)
+    assert client.get('/_write', headers=headers).status_code == 403
+
+    role = Role.query.filter_by(name=f'role{reader.id}').first()
+    write = Permission.query.filter_by(name='user:write').first()
+    RolePermissionController.add_permissions_to_role(role.id, [write.id])
+
+    assert client.get('/_write', headers=headers).status_code == 200
+    assert has_permission_calls == ['user:write']
+
+
+def test_user_role_change_falls_back_to_database(client, routes, reader, login, has_permission_calls):
+    headers = login(reader)
+    assert client.get('/_read', headers=headers).status_code == 200
+
+    role = Role.query.filter_by(name=f'role{reader.id}').first()
+    UserRoleController.remove_roles_from_user(reader.id, [role.id])
+
+    assert client.get('/_read', headers=headers).status_code == 403
+    assert has_permission_calls == ['user:read']
+
+
+def test_new_token_after_change_uses_claims_again(client, routes, reader, login, has_permission_calls):
+    role = Role.query.filter_by(name=f'role{reader.id}').first()
+    UserRoleController.remove_roles_from_user(reader.id, [role.id])
+
+    assert client.get('/_read', headers=login(reader)).status_code == 403
+    assert has_permission_calls == []
+
+
+def test_refresh_reuses_claims_while_versions_match(client, routes, reader, login, statements):
+    threshold = Config.REFRESH_THRESHOLD
+    Config.REFRESH_THRESHOLD = Config.TOKEN_EXPIRY + 60
+    try:
+        headers = login(reader)
+    finally:
+        Config.REFRESH_THRESHOLD = threshold
+    statements.clear()
+
+    response = client.get('/_read', headers=headers)
+
+    assert response.status_code == 200
+    assert REFRESHED_TOKEN_HEADER in response.headers
+    assert not [statement for statement in statements if 'user_role' in statement]
+
+
+def test_claims_use_dense_bit_positions(client, routes, make_user, login):
+    # 大量权限被删除后，权限ID很大，但位图长度只与有效权限的数量有关
+    for n in range(200):
+        db.session.add(Permission(name=f'deleted{n}', type='api', is_deleted=True))
+    db.session.commit()
+    user = make_user('user:read')
+    assert Permission.query.filter_by(name='user:read').one().id > 200
+
+    claims = decode_token(login(user)['Authorization'])
+
+    assert int(claims['perms'], 16).bit_length() <= Permission.query.filter_by(is_deleted=False).count()
+    assert client.get('/_read', headers=login(user)).status_code == 200
+    assert client.get('/_write', headers=login(user)).status_code == 403
+
+
+def test_deleting_permission_keeps_claims_consistent(client, routes, make_user, login, has_permission_calls):
+    unused = Permission(name='unused', type='api')
+    db.session.add(unused)
+    db.session.commit()
+    user = make_user('user:read')
+    headers = login(user)
+
+    # 删除位序在前的权限后，其余权限的位序随之变化，旧 Token 回退到查询数据库，新 Token 使用新的位序
+    PermissionController.delete_permission(unused.id)
+
+    assert client.get('/_read', headers=headers).status_code == 200
+    assert has_permission_calls == ['user:read']
+    assert client.get('/_read', headers=login(user)).status_code == 200
+    assert has_permission_calls == ['user:read']
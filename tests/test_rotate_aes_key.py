@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_rotate_aes_key.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 敏感字段密钥轮换命令的测试。
+"""
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Department
+from app.models.sensitive_field import raw_ciphertext
+from extensions.db import db, redis_client
+from utils.crypto_utils import SensitiveFieldCipher, sensitive_cipher, ciphertext_key_id
+
+NEW_KEY_ID = 5
+NEW_KEY = b'n' * 32
+CHECKPOINT_KEY = f'aes_key_rotation:departments:{NEW_KEY_ID}'
+
+
+@pytest.fixture
+def old_cipher(app):
+    """轮换前的密钥环，只有编号为 0 的密钥"""
+    sensitive_cipher.active_key_id  # 加载配置中的密钥环
+    return SensitiveFieldCipher(dict(sensitive_cipher._keys), 0)
+
+
+@pytest.fixture
+def departments(app, old_cipher):
+    """创建 4 个使用旧密钥加密的部门"""
+    rows = [Department(code=f'D00{n}', name=f'部门{n}') for n in range(1, 5)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+@pytest.fixture
+def rotated_keyring(old_cipher, monkeypatch):
+    """切换到包含新旧两个密钥的密钥环，新密钥为当前密钥"""
+    monkeypatch.setattr(sensitive_cipher, '_keys', {**old_cipher._keys, NEW_KEY_ID: NEW_KEY})
+    monkeypatch.setattr(sensitive_cipher, '_active_key_id', NEW_KEY_ID)
+    monkeypatch.setattr(sensitive_cipher, '_ecbs', {})
+
+
+def key_ids():
+    """读取各部门名称密文的密钥编号"""
+    table = Department.__table__
+    rows = db.session.execute(select(table.c.id, raw_ciphertext(table.c.name)).order_by(table.c.id)).all()
+    return {row_id: ciphertext_key_id(value) for row_id, value in rows}
+
+
+def names():
+    db.session.expire_all()
+    return [department.name for department in Department.query.order_by(Department.id)]
+
+
+def test_rotate_mixed_keyring_and_resume_from_checkpoint(run_command, departments, rotated_keyring):
+    # 一条记录已由使用新密钥的服务器写入，断点表明前两条记录已处理
+    department = db.session.get(Department, departments[3])
+    department.code, department.name = 'X004', '已轮换'
+    db.session.commit()
+    redis_client.set(CHECKPOINT_KEY, departments[1])
+
+    result = run_command('rotate_aes_key', '--rows-per-second', '100000')
+
+    assert 'departments 已重新加密 1 条记录' in result.output
+    assert '已完成密钥轮换' in result.output
+    assert key_ids() == {departments[0]: 0, departments[1]: 0, departments[2]: NEW_KEY_ID,
+                         departments[3]: NEW_KEY_ID}
+    assert int(redis_client.get(CHECKPOINT_KEY)) == departments[3]
+
+    result = run_command('rotate_aes_key', '--rows-per-second', '100000', '--restart')
+
+    assert 'departments 已重新加密 2 条记录' in result.output
+    assert set(key_ids().values()) == {NEW_KEY_ID}
+    assert names() == ['部门1', '部门2', '部门3', '已轮换']
+
+
+@pytest.mark.parametrize('conflicts, retried', [(1, False), (10, True)])
+def test_rotate_retries_rows_modified_concurrently(run_command, departments, rotated_keyring, old_cipher,
+                                                   monkeypatch, conflicts, retried):
+    # 模拟仍在使用旧密钥的服务器在读取密文后、写入前修改了同一条记录
+    table = Department.__table__
+    target = departments[1]
+    decrypt_many = sensitive_cipher.decrypt_many
+    writes = []
+
+    def concurrent_decrypt_many(values):
+        if values and len(writes) < conflicts:
+            writes.append(target)
+            db.session.execute(table.update().where(table.c.id == target)
+                               .values(name=old_cipher.encrypt('并发修改')))
+        return decrypt_many(values)
+
+    monkeypatch.setattr(sensitive_cipher, 'decrypt_many', concurrent_decrypt_many)
+    result = run_command('rotate_aes_key', '--rows-per-second', '100000')
+
+    if not retried:
+        # 同一批次内重新读取后重试成功
+        assert 'departments 已重新加密 4 条记录' in result.output
+        assert '已完成密钥轮换' in result.output
+    else:
+        # 多次重试后仍被并发修改的记录留待下次执行
+        assert 'departments 已重新加密 3 条记录' in result.output
+        assert '1 条记录被并发修改' in result.output
+        assert key_ids()[target] == 0
+        assert redis_client.smembers(f'{CHECKPOINT_KEY}:retry') == {str(target).encode()}
+
+        monkeypatch.setattr(sensitive_cipher, 'decrypt_many', decrypt_many)
+        result = run_command('rotate_aes_key', '--rows-per-second', '100000')
+
+        assert 'departments 已重新加密 1 条记录' in result.output
+        assert '已完成密钥轮换' in result.output
+
+    assert set(key_ids().values()) == {NEW_KEY_ID}
+    assert names() == ['部门1', '并发修改', '部门3', '部门4']
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_search_tokens.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 密文字段检索令牌的测试。
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import User, Visitor, VisitorLog, SearchToken
+from extensions.db import db
+
+
+def search(client, path, key, filters):
+    """调用检索接口，返回结果的ID列表"""
+    response = client.get(path, query_string={'filters': json.dumps(filters)})
+    assert response.status_code == 200
+    return [row['id'] for row in response.json['data'][key]]
+
+
+@pytest.fixture
+def users(app):
+    rows = [User(username='ouyang', password_hash='x', phone_number='13800001234', name='欧阳娜娜'),
+            User(username='zhang', password_hash='x', phone_number='13900005678', name='张三丰')]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+@pytest.fixture
+def visitors(users):
+    rows = [Visitor(user_id=users[0], name='欧阳娜娜', gender='女', id_type='身份证', id_number='110101199001011234',
+                    phone_number='13800001234'),
+            Visitor(user_id=users[1], name='张三丰', gender='男', id_type='身份证', id_number='320102198512125678',
+                    phone_number='13900005678')]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+@pytest.fixture
+def visitor_logs(app):
+    now = datetime.now()
+    rows = [VisitorLog(visit_time=now, leave_time=now + timedelta(hours=2), campus='主校区', visit_type='公务',
+                       visitor_name=name, visitor_phone_number=phone, visitor_gender='男', visitor_id_type='身份证',
+                       visitor_id_number='110101199001011234', visitor_org=org, visited_person_name=person,
+                       visited_person_org='信息中心')
+            for name, phone, org, person in [('欧阳娜娜', '13800001234', '某某科技有限公司', '李四'),
+                                             ('张三丰', '13900005678', '武当山管理处', '王五')]]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+@pytest.mark.parametrize('filters, index', [
+    ({'name': '娜'}, 0),
+    ({'name': '阳娜'}, 0),
+    ({'name': '欧阳娜娜'}, 0),
+    ({'name': '三丰'}, 1),
+    ({'username': 'zha'}, 1),
+    ({'phone_number': '1234'}, 0),
+    ({'name': '娜', 'phone_number': '5678'}, None),
+    ({'name': '李'}, None),
+])
+def test_search_users(client, users, filters, index):
+    expected = [] if index is None else [users[index]]
+    assert search(client, '/api/users/search', 'users', filters) == expected
+
+
+@pytest.mark.parametrize('filters, index', [
+    ({'name': '丰'}, 1),
+    ({'name': '欧阳'}, 0),
+    ({'name': '张三丰'}, 1),
+    ({'phone_number': '01234'}, 0),
+    ({'id_number': '19851212'}, 1),
+    ({'name': '欧阳丰'}, None),
+])
+def test_search_visitors(client, visitors, filters, index):
+    expected = [] if index is None else [visitors[index]]
+    assert search(client, '/api/visitors_admin/search', 'visitors', filters) == expected
+
+
+@pytest.mark.parametrize('filters, index', [
+    ({'visitor_name': '娜'}, 0),
+    ({'visitor_name': '三丰'}, 1),
+    ({'visitor_org': '科技有限'}, 0),
+    ({'visited_person_name': '王'}, 1),
+    ({'visited_person_org': '信息'}, 'all'),
+    ({'visitor_org': '武当', 'visited_person_name': '李四'}, None),
+])
+def test_search_visitor_logs(client, visitor_logs, filters, index):
+    expected = visitor_logs if index == 'all' else [] if index is None else [visitor_logs[index]]
+    assert search(client, '/api/visitor_logs_admin/search', 'visitor_logs', filters) == expected
+
+
+def test_update_replaces_search_tokens(client, users):
+    user = db.session.get(User, users[0])
+    user.name = '李小龙'
+    db.session.commit()
+
+    assert search(client, '/api/users/search', 'users', {'name': '欧阳'}) == []
+    assert search(client, '/api/users/search', 'users', {'name': '小龙'}) == [users[0]]
+
+    # 未修改的字段保留原有的令牌
+    assert search(client, '/api/users/search', 'users', {'phone_number': '1234'}) == [users[0]]
+    assert SearchToken.query.filter_by(table_name='users', record_id=users[0], field='name').count() == \
+        SearchToken.query.filter_by(table_name='users', record_id=users[1], field='name').count()
+
+
+def test_backfill_search_tokens(client, users, visitors, visitor_logs, run_command):
+    SearchToken.query.delete()
+    db.session.commit()
+    assert search(client, '/api/users/search', 'users', {'name': '娜'}) == []
+
+    result = run_command('backfill_search_tokens')
+
+    assert 'users 检索令牌已回填 2 条记录' in result.output
+    assert 'visitor_logs 检索令牌已回填 2 条记录' in result.output
+    assert search(client, '/api/users/search', 'users', {'name': '娜'}) == [users[0]]
+    assert search(client, '/api/visitors_admin/search', 'visitors', {'name': '三丰'}) == [visitors[1]]
+    assert search(client, '/api/visitor_logs_admin/search', 'visitor_logs', {'visitor_org': '科技'}) == \
+        [visitor_logs[0]]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_sensitive_field.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 加密字段查询改写和部门检索的测试。
+"""
+
+import json
+
+import pytest
+
+from app.models import Department, User
+from extensions.db import db
+
+
+@pytest.fixture
+def departments(app):
+    """创建两个部门"""
+    rows = [Department(code='D001', name='信息中心'), Department(code='D002', name='财务处')]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def test_in_and_not_in_use_blind_index(departments):
+    assert [d.id for d in Department.query.filter(Department.code.in_(['D001']))] == [departments[0]]
+    assert [d.id for d in Department.query.filter(Department.code.not_in(['D001']))] == [departments[1]]
+    assert [d.id for d in Department.query.filter(Department.code != 'D001')] == [departments[1]]
+
+
+@pytest.mark.parametrize('build', [
+    lambda: Department.name.contains('信息'),
+    lambda: Department.name.like('%信息%'),
+    lambda: Department.code.startswith('D'),
+    lambda: Department.code > 'D001',
+    lambda: User.name == '用户1',
+])
+def test_unsupported_operators_raise(app, build):
+    with pytest.raises(TypeError, match='加密字段'):
+        build()
+
+
+def test_null_comparison_is_allowed(departments):
+    assert Department.query.filter(Department.name.is_not(None)).count() == 2
+    assert Department.query.filter(Department.name == None).count() == 0  # noqa: E711
+
+
+@pytest.mark.parametrize('filters, index', [
+    ({'name': '信息'}, 0),
+    ({'name': '财务处'}, 1),
+    ({'code': '002'}, 1),
+])
+def test_search_departments(client, departments, filters, index):
+    response = client.get('/api/departments/search', query_string={'filters': json.dumps(filters)})
+
+    assert response.status_code == 200
+    assert [d['id'] for d in response.json['data']['departments']] == [departments[index]]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_token_refresh.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: Token 刷新的测试。
+"""
+
+import pytest
+
+from app.config import Config
+from utils import session_utils
+from utils.decorators import token_required
+from utils.session_utils import REFRESHED_TOKEN_HEADER
+
+
+@pytest.fixture
+def ping(app):
+    @app.route('/_ping')
+    @token_required
+    def _ping(current_user):
+        return {'id': current_user.id}
+
+
+@pytest.fixture
+def minted(monkeypatch):
+    """统计校验 Token 时生成新 Token 的次数"""
+    tokens = []
+    generate_token = session_utils.generate_token
+
+    def counting_generate_token(*args):
+        tokens.append(generate_token(*args))
+        return tokens[-1]
+
+    monkeypatch.setattr(session_utils, 'generate_token', counting_generate_token)
+    return tokens
+
+
+@pytest.fixture
+def refresh_due_token(make_user, login):
+    """签发一个已超过刷新时间的 Token"""
+    threshold = Config.REFRESH_THRESHOLD
+    Config.REFRESH_THRESHOLD = Config.TOKEN_EXPIRY + 60
+    try:
+        return login(make_user())
+    finally:
+        Config.REFRESH_THRESHOLD = threshold
+
+
+def test_refresh_mints_once_and_grace_token_is_not_refreshed_again(client, ping, minted, refresh_due_token):
+    response = client.get('/_ping', headers=refresh_due_token)
+    assert response.status_code == 200
+    assert response.headers[REFRESHED_TOKEN_HEADER] == minted[0]
+
+    # 宽限期内继续使用旧 Token 照常处理，但不再生成新的 Token
+    for _ in range(3):
+        response = client.get('/_ping', headers=refresh_due_token)
+        assert response.status_code == 200
+        assert REFRESHED_TOKEN_HEADER not in response.headers
+    assert len(minted) == 1
+
+    response = client.get('/_ping', headers={'Authorization': minted[0]})
+    assert response.status_code == 200
+
+
+def test_refresh_takes_one_redis_round_trip(client, ping, refresh_due_token, monkeypatch):
+    from extensions.db import redis_client
+    # 先完成一次请求，使用户凭据进入进程内缓存
+    client.get('/_ping', headers=refresh_due_token)
+    session_utils.store_token(session_utils.decode_token(refresh_due_token['Authorization'])['id'], 'test',
+                              refresh_due_token['Authorization'])
+    session_utils.refreshed_token_cache.clear()
+
+    commands = []
+    execute_command = redis_client._redis_client.execute_command
+
+    def counting_execute_command(*args, **kwargs):
+        commands.append(args[0])
+        return execute_command(*args, **kwargs)
+
+    monkeypatch.setattr(redis_client._redis_client, 'execute_command', counting_execute_command)
+    response = client.get('/_ping', headers=refresh_due_token)
+
+    assert response.status_code == 200
+    assert REFRESHED_TOKEN_HEADER in response.headers
+    assert commands == ['EVALSHA']
+
+
+def test_invalid_token_is_not_refreshed(client, ping, minted, refresh_due_token, app):
+    from extensions.db import redis_client
+    redis_client.flushall()
+
+    # 被拒绝替换的 Token 最多生成一次新的 Token，之后的请求不再生成，也不返回新的 Token
+    for _ in range(3):
+        response = client.get('/_ping', headers=refresh_due_token)
+        assert response.status_code == 403
+        assert REFRESHED_TOKEN_HEADER not in response.headers
+    assert len(minted) <= 1
+
+
+@pytest.fixture
+def stateless(monkeypatch):
+    monkeypatch.setattr(Config, 'TOKEN_VALIDATION_MODE', 'stateless')
+
+
+def test_stateless_refresh_mints_once_per_token(client, ping, stateless, refresh_due_token, minted):
+    headers = [client.get('/_ping', headers=refresh_due_token).headers.get(REFRESHED_TOKEN_HEADER) for _ in range(3)]
+
+    assert len(minted) == 1
+    assert headers == minted * 3
+
+
+def test_stateless_revoked_token_is_not_refreshed(client, ping, stateless, refresh_due_token, monkeypatch):
+    session_utils.revoke_session(session_utils.decode_token(refresh_due_token['Authorization'])['id'])
+    monkeypatch.setattr(session_utils, 'generate_token', lambda *args: pytest.fail('revoked token was refreshed'))
+
+    response = client.get('/_ping', headers=refresh_due_token)
+
+    assert response.status_code == 403
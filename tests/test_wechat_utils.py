@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: tests/test_wechat_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 微信接口客户端重试和熔断的测试。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.config import Config
+from utils.wechat_utils import WeChatClient, WeChatUnavailable
+
+
+@pytest.fixture
+def wechat():
+    """本地模拟的微信接口，按设置的状态码、响应和延迟返回，并记录收到的请求数"""
+    state = {'status': 200, 'body': {'openid': 'openid-1', 'session_key': 'key'}, 'delay': 0, 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['requests'] += 1
+            time.sleep(state['delay'])
+            body = json.dumps(state['body']).encode('utf-8')
+            self.send_response(state['status'])
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = WeChatClient(f'http://127.0.0.1:{server.server_port}')
+    client.timeout = (1, 0.2)
+    yield client, state
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_connect_failures_are_retried():
+    retry = WeChatClient.create_session().get_adapter('https://api.weixin.qq.com').max_retries
+
+    assert retry.connect == Config.WECHAT_MAX_RETRIES
+    assert retry.read == 0 and retry.status == 0 and retry.other == 0
+
+
+@pytest.mark.parametrize('status, delay', [(500, 0), (503, 0), (200, 0.5)])
+def test_sent_requests_are_not_retried(wechat, status, delay):
+    client, state = wechat
+    state.update(status=status, delay=delay)
+
+    with pytest.raises(WeChatUnavailable):
+        client.code2session('code')
+
+    # code 只能使用一次，已发出的请求不能重试
+    assert state['requests'] == 1
+
+
+def test_system_busy_opens_breaker(wechat):
+    client, state = wechat
+    state['body'] = {'errcode': -1, 'errmsg': 'system error'}
+
+    for _ in range(Config.WECHAT_BREAKER_THRESHOLD):
+        with pytest.raises(WeChatUnavailable):
+            client.code2session('code')
+    state['body'] = {'openid': 'openid-1'}
+
+    with pytest.raises(WeChatUnavailable, match='熔断'):
+        client.code2session('code')
+    assert state['requests'] == Config.WECHAT_BREAKER_THRESHOLD
+
+
+def test_request_errors_do_not_open_breaker(wechat):
+    client, state = wechat
+    state['body'] = {'errcode': 40029, 'errmsg': 'invalid code'}
+
+    for _ in range(Config.WECHAT_BREAKER_THRESHOLD + 1):
+        assert client.code2session('code')['errcode'] == 40029
+    assert client.breaker.allow()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/cache_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-24
+# 版本: 1.0
+# 描述: 进程内缓存工具。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """进程内的 LRU 缓存，限制容量并按有效期淘汰，可在多个线程中共用"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，可单独指定有效期，超出容量时淘汰最久未使用的条目"""
+        expiry = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items[key] = (value, expiry)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        """删除缓存"""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
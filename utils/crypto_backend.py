@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/crypto_backend.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-23
+# 版本: 1.0
+# 描述: 加解密后端，分别基于 pycryptodome 和 cryptography（OpenSSL）实现，输出的密文格式完全一致。
+"""
+
+from Crypto.Cipher import PKCS1_OAEP, AES
+from Crypto.PublicKey import RSA
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # 未安装 cryptography 时只能使用 pycryptodome 后端
+    AESGCM = None
+
+
+class PycryptodomeGcm:
+    """pycryptodome 的 AES-GCM 运算对象，每次运算创建新的 cipher 对象"""
+
+    def __init__(self, key):
+        self._key = key
+
+    def encrypt(self, nonce, data, associated_data):
+        """加密数据，返回密文和 16 字节认证标签的组合"""
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(associated_data)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def decrypt(self, nonce, data, associated_data):
+        """校验认证标签并解密数据，校验失败时抛出 ValueError"""
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(associated_data)
+        return cipher.decrypt_and_verify(data[:-16], data[-16:])
+
+
+class PycryptodomeBackend:
+    """基于 pycryptodome 的加解密后端"""
+
+    name = 'pycryptodome'
+
+    @staticmethod
+    def ecb(key):
+        """创建 AES-ECB 分组运算对象"""
+        return AES.new(key, AES.MODE_ECB)
+
+    @staticmethod
+    def cbc_encrypt(key, iv, data):
+        """使用 AES-CBC 加密已填充的数据"""
+        return AES.new(key, AES.MODE_CBC, iv).encrypt(data)
+
+    @staticmethod
+    def cbc_decrypt(key, iv, data):
+        """使用 AES-CBC 解密数据，不去掉填充"""
+        return AES.new(key, AES.MODE_CBC, iv).decrypt(data)
+
+    @staticmethod
+    def gcm(key):
+        """创建 AES-GCM 运算对象"""
+        return PycryptodomeGcm(key)
+
+    @staticmethod
+    def rsa_oaep(pem):
+        """根据 PEM 格式的公钥或私钥创建 RSA-OAEP（SHA-1）加解密对象"""
+        return PKCS1_OAEP.new(RSA.import_key(pem))
+
+
+class CryptographyEcb:
+    """cryptography 的 AES-ECB 分组运算对象，上下文对象不能跨线程共用，每次运算单独创建"""
+
+    def __init__(self, key):
+        self._cipher = Cipher(algorithms.AES(key), modes.ECB())
+
+    def encrypt(self, data):
+        return self._cipher.encryptor().update(data)
+
+    def decrypt(self, data):
+        return self._cipher.decryptor().update(data)
+
+
+class CryptographyGcm:
+    """cryptography 的 AES-GCM 运算对象，密文和认证标签的组合方式与 pycryptodome 后端相同"""
+
+    def __init__(self, key):
+        self._aead = AESGCM(key)
+
+    def encrypt(self, nonce, data, associated_data):
+        """加密数据，返回密文和 16 字节认证标签的组合"""
+        return self._aead.encrypt(nonce, data, associated_data)
+
+    def decrypt(self, nonce, data, associated_data):
+        """校验认证标签并解密数据，校验失败时抛出 ValueError"""
+        try:
+            return self._aead.decrypt(nonce, data, associated_data)
+        except InvalidTag:
+            raise ValueError('MAC check failed')
+
+
+class CryptographyRsaOaep:
+    """cryptography 的 RSA-OAEP 加解密对象，填充参数与 pycryptodome 的 PKCS1_OAEP 默认值一致"""
+
+    def __init__(self, pem):
+        if b'PRIVATE KEY' in pem:
+            self._private_key = serialization.load_pem_private_key(pem, password=None)
+            self._public_key = self._private_key.public_key()
+        else:
+            self._private_key = None
+            self._public_key = serialization.load_pem_public_key(pem)
+        self._padding = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA1()), algorithm=hashes.SHA1(), label=None)
+
+    def encrypt(self, data):
+        return self._public_key.encrypt(data, self._padding)
+
+    def decrypt(self, data):
+        if self._private_key is None:
+            raise TypeError('This is not a private key')
+        return self._private_key.decrypt(data, self._padding)
+
+
+class CryptographyBackend:
+    """基于 cryptography（OpenSSL）的加解密后端"""
+
+    name = 'cryptography'
+
+    @staticmethod
+    def ecb(key):
+        """创建 AES-ECB 分组运算对象"""
+        return CryptographyEcb(key)
+
+    @staticmethod
+    def cbc_encrypt(key, iv, data):
+        """使用 AES-CBC 加密已填充的数据"""
+        return Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor().update(data)
+
+    @staticmethod
+    def cbc_decrypt(key, iv, data):
+        """使用 AES-CBC 解密数据，不去掉填充"""
+        return Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor().update(data)
+
+    @staticmethod
+    def gcm(key):
+        """创建 AES-GCM 运算对象"""
+        return CryptographyGcm(key)
+
+    @staticmethod
+    def rsa_oaep(pem):
+        """根据 PEM 格式的公钥或私钥创建 RSA-OAEP（SHA-1）加解密对象"""
+        return CryptographyRsaOaep(pem)
+
+
+def available_crypto_backends():
+    """获取当前环境中可用的加解密后端"""
+    backends = [PycryptodomeBackend()]
+    if AESGCM is not None:
+        backends.append(CryptographyBackend())
+    return backends
+
+
+def create_crypto_backend(name):
+    """根据名称创建加解密后端"""
+    for backend in available_crypto_backends():
+        if backend.name == name:
+            return backend
+    raise EnvironmentError(f'加解密后端不可用: {name}')
@@ -7,7 +7,13 @@
 # 描述: 实现了数据的加密解密功能。
 """
 import base64
+import hashlib
+import hmac
+import io
 import os
+import struct
+import time
+from functools import lru_cache
 
 from Crypto.Cipher import PKCS1_OAEP, AES
 from Crypto.PublicKey import RSA
@@ -15,6 +21,8 @@ from Crypto.PublicKey.RSA import RsaKey
 from Crypto.Random import get_random_bytes
 
 from app.config import Config
+from extensions.db import redis_client
+from utils.crypto_backend import available_crypto_backends, create_crypto_backend
 
 
 def generate_rsa_key_pair():
@@ -41,6 +49,7 @@ def generate_rsa_key_pair():
         print(f"目录 {keys_directory} 已存在")
 
 
+@lru_cache(maxsize=None)
 def load_public_key_from_file():
     """从文件加载 RSA 公钥"""
     public_key_path = Config.PUBLIC_KEY_PATH
@@ -53,6 +62,7 @@ def load_public_key_from_file():
         raise ValueError(f"公钥文件内容无效: {public_key_path}")
 
 
+@lru_cache(maxsize=None)
 def load_private_key_from_file():
     """从文件加载 RSA 私钥"""
     private_key_path = Config.PRIVATE_KEY_PATH
@@ -65,6 +75,7 @@ def load_private_key_from_file():
         raise ValueError(f"私钥文件内容无效: {private_key_path}")
 
 
+@lru_cache(maxsize=None)
 def load_public_key_from_env():
     """从环境变量加载 RSA 公钥"""
     public_key_data = Config.PUBLIC_KEY
@@ -74,6 +85,7 @@ def load_public_key_from_env():
         raise EnvironmentError(f"环境变量 PUBLIC_KEY 中未找到公钥数据")
 
 
+@lru_cache(maxsize=None)
 def load_private_key_from_env():
     """从环境变量加载 RSA 私钥"""
     private_key_data = Config.PRIVATE_KEY
@@ -127,18 +139,69 @@ def rsa_decrypt_str_to_str(private_key: RsaKey, encrypted_data: str) -> str:
     return decrypted_data.decode('utf-8')  # 解码为字符串
 
 
-def rsa_encrypt_aes_key(aes_key):
-    """加载 RSA 公钥对 AES 密钥进行加密"""
+@lru_cache(maxsize=None)
+def get_rsa_encrypt_cipher():
+    """获取进程内缓存的 RSA 公钥 OAEP 加密对象"""
     if Config.PUBLIC_KEY:
-        return rsa_encrypt_bytes_to_str(load_public_key_from_env(), aes_key)
-    return rsa_encrypt_bytes_to_str(load_public_key_from_file(), aes_key)
+        return get_crypto_backend().rsa_oaep(load_public_key_from_env().export_key())
+    return get_crypto_backend().rsa_oaep(load_public_key_from_file().export_key())
 
 
-def rsa_decrypt_aes_key(aes_key):
-    """加载 RSA 私钥对 AES 密钥进行解密"""
+@lru_cache(maxsize=None)
+def get_rsa_decrypt_cipher():
+    """获取进程内缓存的 RSA 私钥 OAEP 解密对象"""
     if Config.PRIVATE_KEY:
-        return rsa_decrypt_str_to_bytes(load_private_key_from_env(), aes_key)
-    return rsa_decrypt_str_to_bytes(load_private_key_from_file(), aes_key)
+        return get_crypto_backend().rsa_oaep(load_private_key_from_env().export_key())
+    return get_crypto_backend().rsa_oaep(load_private_key_from_file().export_key())
+
+
+def rsa_encrypt_aes_key(aes_key):
+    """使用 RSA 公钥对 AES 密钥进行加密"""
+    encrypted_data = get_rsa_encrypt_cipher().encrypt(aes_key)  # 加密后的字节数据
+    return base64.b64encode(encrypted_data).decode('utf-8')  # 编码为 base64 字符串
+
+
+def rsa_decrypt_aes_key(aes_key):
+    """使用 RSA 私钥对 AES 密钥进行解密"""
+    encrypted_data_bytes = base64.b64decode(aes_key.encode('utf-8'))  # base64 解码为字节数据
+    return get_rsa_decrypt_cipher().decrypt(encrypted_data_bytes)  # 解密为字节数据
+
+
+def envelope_session_key(user_id):
+    """用户 AES 会话密钥在 Redis 中的键，字段为会话密钥指纹"""
+    return f"envelope_session:{user_id}"
+
+
+def register_envelope_session(user_id, encrypted_key):
+    """解密客户端使用 RSA 加密的 AES 会话密钥并缓存到 Redis，只有注册的用户可以使用，返回会话密钥的指纹"""
+    key = rsa_decrypt_aes_key(encrypted_key)
+    fingerprint = hashlib.sha256(key).hexdigest()[:32]
+
+    # Redis 中只保存经服务端密钥加密后的会话密钥和过期时间戳，用户的全部会话密钥随最后一次注册一同过期
+    expiry = int(time.time()) + Config.ENVELOPE_SESSION_TTL
+    encrypted_session_key = sensitive_cipher.encrypt(f"{base64.b64encode(key).decode('utf-8')}:{expiry}")
+    with redis_client.pipeline(transaction=False) as pipeline:
+        pipeline.hset(envelope_session_key(user_id), fingerprint, encrypted_session_key)
+        pipeline.expire(envelope_session_key(user_id), Config.ENVELOPE_SESSION_TTL)
+        pipeline.execute()
+    return fingerprint
+
+
+def load_envelope_session_key(user_id, fingerprint):
+    """根据指纹从 Redis 中读取用户注册的 AES 会话密钥"""
+    encrypted_session_key = redis_client.hget(envelope_session_key(user_id), fingerprint)
+    if not encrypted_session_key:
+        raise KeyError('会话密钥不存在或已过期')
+    key, expiry = sensitive_cipher.decrypt(encrypted_session_key).rsplit(':', 1)
+    if int(expiry) <= time.time():
+        raise KeyError('会话密钥不存在或已过期')
+    return base64.b64decode(key)
+
+
+def revoke_envelope_sessions(user_ids, pipeline):
+    """删除用户注册的全部 AES 会话密钥，Redis 命令加入传入的管道，由调用方统一执行"""
+    if user_ids:
+        pipeline.delete(*[envelope_session_key(user_id) for user_id in user_ids])
 
 
 def pad(data: bytes) -> bytes:
@@ -158,14 +221,14 @@ def unpad(data: bytes) -> bytes:
 def aes256_encrypt(data: str, key: bytes) -> str:
     """使用 AES-256 加密数据"""
     # 生成随机的初始化向量 (IV)
-    cipher = AES.new(key, AES.MODE_CBC)
+    iv = get_random_bytes(AES.block_size)
 
     # 填充数据
     padded_data = pad(data.encode('utf-8'))
-    ciphertext = cipher.encrypt(padded_data)
+    ciphertext = get_crypto_backend().cbc_encrypt(key, iv, padded_data)
 
     # 返回 IV 和密文的组合，进行 Base64 编码
-    return base64.b64encode(cipher.iv + ciphertext).decode('utf-8')
+    return base64.b64encode(iv + ciphertext).decode('utf-8')
 
 
 def aes256_decrypt(encrypted_data: str, key: bytes) -> str:
@@ -176,16 +239,21 @@ def aes256_decrypt(encrypted_data: str, key: bytes) -> str:
     # 提取 IV 和密文
     iv = encrypted_data[:16]
     ciphertext = encrypted_data[16:]
-    cipher = AES.new(key, AES.MODE_CBC, iv)
 
     # 解密并去掉填充
-    decrypted_data = unpad(cipher.decrypt(ciphertext))
+    decrypted_data = unpad(get_crypto_backend().cbc_decrypt(key, iv, ciphertext))
     return decrypted_data.decode('utf-8')
 
 
-def aes256_encrypt_data(data):
-    """随机生成 AES-256 密钥对数据进行加密"""
+def aes256_encrypt_data(data, key_fingerprint=None, user_id=None):
+    """随机生成 AES-256 密钥对数据进行加密，指定会话密钥指纹时使用该用户已缓存的会话密钥"""
     try:
+        if key_fingerprint:
+            return {
+                'key_fingerprint': key_fingerprint,  # 会话密钥指纹
+                'encrypted_data': aes256_encrypt(data, load_envelope_session_key(user_id, key_fingerprint)),  # 加密后的数据
+            }
+
         key = get_random_bytes(32)  # 生成 AES 密钥
         encrypted_data = aes256_encrypt(data, key)  # 加密数据
 
@@ -197,11 +265,14 @@ def aes256_encrypt_data(data):
         return {'error': str(e)}, 400  # 错误处理
 
 
-def aes256_decrypt_data(data):
-    """使用 AES-256 密钥对数据进行解密"""
+def aes256_decrypt_data(data, user_id=None):
+    """使用 AES-256 密钥对数据进行解密，使用会话密钥时只能使用 user_id 注册的会话密钥"""
     try:
         # 解码密钥和加密数据
-        key = rsa_decrypt_aes_key(data['encrypted_key'])  # 使用 RSA 解密 AES 密钥
+        if data.get('key_fingerprint'):
+            key = load_envelope_session_key(user_id, data['key_fingerprint'])  # 使用该用户已缓存的会话密钥
+        else:
+            key = rsa_decrypt_aes_key(data['encrypted_key'])  # 使用 RSA 解密 AES 密钥
         encrypted_data = data['encrypted_data']  # 加密后的数据
         decrypted_data = aes256_decrypt(encrypted_data, key)  # 解密数据
 
@@ -210,15 +281,399 @@ def aes256_decrypt_data(data):
         return {'error': str(e)}, 400  # 错误处理
 
 
+# 流式加密格式，头部 = 版本号(1字节) + 分块大小(4字节) + 随机 nonce 前缀(7字节)
+# 每个分块 = AES-GCM 密文 + 认证标签(16字节)，nonce = nonce 前缀 + 分块序号(4字节) + 末块标记(1字节)
+# 头部作为每个分块的附加认证数据，分块序号防止重排，末块标记防止截断
+STREAM_FORMAT_V1 = b'\x01'
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+STREAM_NONCE_PREFIX_SIZE = 7
+STREAM_TAG_SIZE = 16
+STREAM_HEADER = struct.Struct('>cI7s')
+STREAM_NONCE = struct.Struct('>7sIB')
+
+
+def read_exactly(stream, size):
+    """从文件对象中读取指定长度的数据，直到读满或到达文件末尾"""
+    data = stream.read(size)
+    if len(data) == size or not data:
+        return data
+
+    buffer = bytearray(data)
+    while len(buffer) < size:
+        data = stream.read(size - len(buffer))
+        if not data:
+            break
+        buffer += data
+    return bytes(buffer)
+
+
+def stream_nonce(nonce_prefix, counter, is_last):
+    """生成单个分块使用的 nonce"""
+    if counter > 0xFFFFFFFF:
+        raise ValueError('数据过大，分块数量超出上限')
+    return STREAM_NONCE.pack(nonce_prefix, counter, int(is_last))
+
+
+def aes256_gcm_encrypt_stream(src, dst, key: bytes, chunk_size=STREAM_CHUNK_SIZE, backend=None) -> int:
+    """使用 AES-256-GCM 分块加密文件对象，返回写入的字节数"""
+    if not 0 < chunk_size <= STREAM_MAX_CHUNK_SIZE:
+        raise ValueError(f"分块大小无效: {chunk_size}")
+    gcm = (backend or get_crypto_backend()).gcm(key)
+
+    nonce_prefix = get_random_bytes(STREAM_NONCE_PREFIX_SIZE)
+    header = STREAM_HEADER.pack(STREAM_FORMAT_V1, chunk_size, nonce_prefix)
+    dst.write(header)
+    written = len(header)
+
+    # 预读下一个分块以确定当前分块是否为最后一块，空数据也会写入一个末块
+    counter = 0
+    chunk = read_exactly(src, chunk_size)
+    while True:
+        next_chunk = read_exactly(src, chunk_size)
+        is_last = not next_chunk
+        record = gcm.encrypt(stream_nonce(nonce_prefix, counter, is_last), chunk, header)
+        dst.write(record)
+        written += len(record)
+        if is_last:
+            return written
+        chunk = next_chunk
+        counter += 1
+
+
+def aes256_gcm_decrypt_stream(src, dst, key: bytes, backend=None) -> int:
+    """使用 AES-256-GCM 分块解密文件对象，返回写入的明文字节数
+
+    每个分块通过认证后才会写入 dst，认证失败时抛出 ValueError，调用方应丢弃已写入的部分数据。
+    """
+    header = read_exactly(src, STREAM_HEADER.size)
+    if len(header) != STREAM_HEADER.size:
+        raise ValueError('密文头部不完整')
+    version, chunk_size, nonce_prefix = STREAM_HEADER.unpack(header)
+    if version != STREAM_FORMAT_V1:
+        raise ValueError(f"不支持的流式密文版本: {version!r}")
+    if not 0 < chunk_size <= STREAM_MAX_CHUNK_SIZE:
+        raise ValueError(f"分块大小无效: {chunk_size}")
+    gcm = (backend or get_crypto_backend()).gcm(key)
+
+    written = 0
+    counter = 0
+    record_size = chunk_size + STREAM_TAG_SIZE
+    record = read_exactly(src, record_size)
+    while True:
+        if len(record) < STREAM_TAG_SIZE:
+            raise ValueError('密文已被截断')
+        next_record = read_exactly(src, record_size)
+        is_last = not next_record
+        chunk = gcm.decrypt(stream_nonce(nonce_prefix, counter, is_last), record, header)
+        dst.write(chunk)
+        written += len(chunk)
+        if is_last:
+            return written
+        record = next_record
+        counter += 1
+
+
+def aes256_encrypt_stream_data(src, dst, key_fingerprint=None, user_id=None):
+    """分块加密文件对象，随机生成 AES-256 密钥或使用该用户已缓存的会话密钥，返回解密所需的密钥信息"""
+    if key_fingerprint:
+        aes256_gcm_encrypt_stream(src, dst, load_envelope_session_key(user_id, key_fingerprint))
+        return {'key_fingerprint': key_fingerprint}  # 会话密钥指纹
+
+    key = get_random_bytes(32)  # 生成 AES 密钥
+    aes256_gcm_encrypt_stream(src, dst, key)
+    return {'encrypted_key': rsa_encrypt_aes_key(key)}  # 使用 RSA 加密 AES 密钥
+
+
+def aes256_decrypt_stream_data(data, src, dst, user_id=None):
+    """根据密钥信息分块解密文件对象，返回写入的明文字节数，使用会话密钥时只能使用 user_id 注册的会话密钥"""
+    if data.get('key_fingerprint'):
+        key = load_envelope_session_key(user_id, data['key_fingerprint'])  # 使用该用户已缓存的会话密钥
+    else:
+        key = rsa_decrypt_aes_key(data['encrypted_key'])  # 使用 RSA 解密 AES 密钥
+    return aes256_gcm_decrypt_stream(src, dst, key)
+
+
+# 敏感字段二进制密文格式的版本号
+# V1：版本号(1字节) + IV(16字节) + 密文，使用编号为 0 的密钥
+# V2：版本号(1字节) + 密钥编号(1字节) + IV(16字节) + 密文
+CIPHER_FORMAT_V1 = b'\x01'
+CIPHER_FORMAT_V2 = b'\x02'
+
+# 旧格式密文（Base64 文本与 V1）使用的密钥编号，即 AES_KEY
+LEGACY_KEY_ID = 0
+
+
+def is_legacy_ciphertext(encrypted_data) -> bool:
+    """判断密文是否为旧的 Base64 文本格式，字符串一定是旧格式"""
+    if isinstance(encrypted_data, str):
+        return True
+    return encrypted_data is not None and bytes(encrypted_data[:1]) not in (CIPHER_FORMAT_V1, CIPHER_FORMAT_V2)
+
+
+def unpack_ciphertext(encrypted_data):
+    """解析敏感字段密文，返回密钥编号以及 IV 和密文的组合，兼容旧的 Base64 文本格式"""
+    if is_legacy_ciphertext(encrypted_data):
+        # Base64 字符不会与版本号冲突，字段类型变更后旧数据以 ASCII 字节的形式保存
+        return LEGACY_KEY_ID, memoryview(base64.b64decode(encrypted_data))
+    view = memoryview(encrypted_data)
+    if view[:1] == CIPHER_FORMAT_V2:
+        return view[1], view[2:]
+    return LEGACY_KEY_ID, view[1:]
+
+
+def ciphertext_key_id(encrypted_data):
+    """获取密文使用的密钥编号，无需解密"""
+    return None if encrypted_data is None else unpack_ciphertext(encrypted_data)[0]
+
+
+def pack_ciphertext(key_id, data) -> bytes:
+    """按 V2 格式组合密钥编号、IV 和密文"""
+    return CIPHER_FORMAT_V2 + bytes([key_id]) + bytes(data)
+
+
+def upgrade_ciphertext_format(encrypted_data) -> bytes:
+    """将旧格式的密文转换为 V2 二进制格式，无需解密"""
+    return pack_ciphertext(*unpack_ciphertext(encrypted_data))
+
+
+def load_aes_keyring():
+    """从配置加载 AES 密钥环，AES_KEYS 格式为 “编号:Base64密钥,编号:Base64密钥”"""
+    keys = {}
+    if Config.AES_KEY:
+        keys[LEGACY_KEY_ID] = base64.b64decode(Config.AES_KEY.encode('utf-8'))
+    for item in (Config.AES_KEYS or '').split(','):
+        if not item.strip():
+            continue
+        key_id, key = item.split(':', 1)
+        if not 0 <= int(key_id) <= 255:
+            raise ValueError(f'密钥编号超出范围: {key_id}')
+        keys[int(key_id)] = base64.b64decode(key.strip().encode('utf-8'))
+    if Config.AES_KEY_ID not in keys:
+        raise EnvironmentError(f'密钥环中未找到当前密钥: {Config.AES_KEY_ID}')
+    return keys, Config.AES_KEY_ID
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    """按字节异或两段等长数据，整段转换为大整数一次完成"""
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+class SensitiveFieldCipher:
+    """敏感字段加解密引擎，密钥环只加载一次，并提供批量加解密接口"""
+
+    def __init__(self, keys: dict = None, active_key_id: int = None, backend=None):
+        self._keys = keys
+        self._active_key_id = active_key_id
+        self._backend = backend
+        self._ecbs = {}
+
+    @property
+    def backend(self):
+        """分组运算使用的加解密后端，未指定时使用进程内选定的后端"""
+        if self._backend is None:
+            self._backend = get_crypto_backend()
+        return self._backend
+
+    @property
+    def active_key_id(self):
+        """当前用于加密的密钥编号"""
+        if self._keys is None:
+            self._keys, self._active_key_id = load_aes_keyring()
+        return self._active_key_id
+
+    def ecb(self, key_id):
+        """获取密钥对应的 AES-ECB 分组运算对象，CBC 链接由批量接口自行完成"""
+        ecb = self._ecbs.get(key_id)
+        if ecb is None:
+            if self._keys is None:
+                self._keys, self._active_key_id = load_aes_keyring()
+            if key_id not in self._keys:
+                raise KeyError(f'密钥环中未找到密钥: {key_id}')
+            ecb = self._ecbs[key_id] = self.backend.ecb(self._keys[key_id])
+        return ecb
+
+    def encrypt(self, data):
+        """加密单个敏感字段"""
+        return self.encrypt_many([data])[0]
+
+    def decrypt(self, encrypted_data):
+        """解密单个敏感字段"""
+        return self.decrypt_many([encrypted_data])[0]
+
+    def encrypt_many(self, values):
+        """使用当前密钥批量加密敏感字段，所有记录的同一轮分组合并为一次 AES 运算"""
+        results = [None] * len(values)
+        indexes = [i for i, value in enumerate(values) if value is not None]
+        if not indexes:
+            return results
+
+        key_id = self.active_key_id
+        ecb = self.ecb(key_id)
+
+        # 填充明文并一次性生成全部 IV
+        padded = [pad(values[i].encode('utf-8')) for i in indexes]
+        ivs = get_random_bytes(AES.block_size * len(indexes))
+        chains = [ivs[j * AES.block_size:(j + 1) * AES.block_size] for j in range(len(indexes))]
+        outputs = [[chain] for chain in chains]
+
+        # CBC 在单条记录内是串行的，但不同记录之间相互独立，按分组轮次批量加密
+        rounds = max(len(data) for data in padded) // AES.block_size
+        for r in range(rounds):
+            start, end = r * AES.block_size, (r + 1) * AES.block_size
+            active = [j for j, data in enumerate(padded) if len(data) > start]
+            blocks = ecb.encrypt(xor_bytes(b''.join(padded[j][start:end] for j in active),
+                                           b''.join(chains[j] for j in active)))
+            for k, j in enumerate(active):
+                chains[j] = blocks[k * AES.block_size:(k + 1) * AES.block_size]
+                outputs[j].append(chains[j])
+
+        # 返回版本号、密钥编号、IV 和密文的组合
+        header = CIPHER_FORMAT_V2 + bytes([key_id])
+        for j, i in enumerate(indexes):
+            results[i] = b''.join([header] + outputs[j])
+        return results
+
+    def decrypt_many(self, values):
+        """批量解密敏感字段，同一密钥的全部密文拼接后只做一次 AES 运算和一次异或"""
+        results = [None] * len(values)
+
+        # 解析二进制或 Base64 格式的密文，并按密钥编号分组
+        groups = {}
+        for i, value in enumerate(values):
+            if value is not None:
+                key_id, raw = unpack_ciphertext(value)
+                if len(raw) < 2 * AES.block_size or len(raw) % AES.block_size:
+                    raise ValueError('密文长度无效')
+                groups.setdefault(key_id, []).append((i, raw))
+
+        for key_id, items in groups.items():
+            # CBC 解密：P_i = D(C_i) xor C_(i-1)，其中 C_0 为 IV，即每条密文去掉末尾一个分组
+            ciphertext = b''.join(raw[AES.block_size:] for _, raw in items)
+            chain = b''.join(raw[:-AES.block_size] for _, raw in items)
+            plaintext = xor_bytes(self.ecb(key_id).decrypt(ciphertext), chain)
+
+            # 按每条密文的长度切分并去掉填充
+            offset = 0
+            for i, raw in items:
+                length = len(raw) - AES.block_size
+                results[i] = unpad(plaintext[offset:offset + length]).decode('utf-8')
+                offset += length
+        return results
+
+
+# 进程内共享的敏感字段加解密引擎
+sensitive_cipher = SensitiveFieldCipher()
+
+
+# 测速使用的模拟敏感字段
+BENCHMARK_SAMPLE = ['张三', '13800000000', '110101199001011234', '某某科技有限公司']
+
+
+def benchmark_crypto_backend(backend, count=256, payload_size=1024 * 1024):
+    """测量加解密后端处理短敏感字段和大数据的耗时（秒），使用随机密钥，不依赖密钥配置"""
+    key = get_random_bytes(32)
+    cipher = SensitiveFieldCipher({LEGACY_KEY_ID: key}, LEGACY_KEY_ID, backend)
+    values = [BENCHMARK_SAMPLE[i % len(BENCHMARK_SAMPLE)] for i in range(count)]
+    payload = get_random_bytes(payload_size)
+    results = {}
+
+    start = time.perf_counter()
+    encrypted = cipher.encrypt_many(values)
+    results['field_encrypt'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cipher.decrypt_many(encrypted)
+    results['field_decrypt'] = time.perf_counter() - start
+
+    src, dst = io.BytesIO(payload), io.BytesIO()
+    start = time.perf_counter()
+    aes256_gcm_encrypt_stream(src, dst, key, backend=backend)
+    results['stream_encrypt'] = time.perf_counter() - start
+
+    src, dst = io.BytesIO(dst.getvalue()), io.BytesIO()
+    start = time.perf_counter()
+    aes256_gcm_decrypt_stream(src, dst, key, backend=backend)
+    results['stream_decrypt'] = time.perf_counter() - start
+    return results
+
+
+# 测速的两类负载：短敏感字段的批量加解密和大数据的流式加解密
+BENCHMARK_WORKLOADS = {
+    'field': ('field_encrypt', 'field_decrypt'),
+    'stream': ('stream_encrypt', 'stream_decrypt'),
+}
+
+
+def score_crypto_backends(results):
+    """
+    按负载分别计分，每类负载的得分为该后端的耗时与最快后端耗时之比，各类负载的得分相加，越小越快。
+
+    两类负载的耗时相差几个数量级，直接相加时总耗时几乎完全由大数据决定，分别计分使短敏感字段的性能同样计入。
+    """
+    scores = {name: 0.0 for name in results}
+    for metrics in BENCHMARK_WORKLOADS.values():
+        elapsed = {name: sum(result[metric] for metric in metrics) for name, result in results.items()}
+        fastest = min(elapsed.values())
+        for name, value in elapsed.items():
+            scores[name] += value / fastest if fastest > 0 else 1.0
+    return scores
+
+
+def select_crypto_backend(count=256, payload_size=1024 * 1024):
+    """在当前主机上测量全部可用后端，返回两类负载综合得分最优的后端以及各后端的测量结果"""
+    backends = available_crypto_backends()
+    results = {backend.name: benchmark_crypto_backend(backend, count, payload_size) for backend in backends}
+    scores = score_crypto_backends(results)
+    return min(backends, key=lambda backend: scores[backend.name]), results
+
+
+@lru_cache(maxsize=None)
+def get_crypto_backend():
+    """获取进程内使用的加解密后端，配置为 auto 时启动后首次使用前测速选择较快的后端"""
+    if Config.CRYPTO_BACKEND == 'auto':
+        return select_crypto_backend()[0]
+    return create_crypto_backend(Config.CRYPTO_BACKEND)
+
+
 def aes256_encrypt_sensitive(data):
     """使用 AES-256 密钥对敏感数据进行加密"""
-    key = base64.b64decode(Config.AES_KEY.encode('utf-8'))  # 加载密钥
-    encrypted_data = aes256_encrypt(data, key)  # 加密数据
-    return encrypted_data
+    return sensitive_cipher.encrypt(data)
 
 
 def aes256_decrypt_sensitive(encrypted_data):
     """使用 AES-256 密钥对敏感数据进行解密"""
-    key = base64.b64decode(Config.AES_KEY.encode('utf-8'))  # 加载密钥
-    decrypted_data = aes256_decrypt(encrypted_data, key)  # 解密数据
-    return decrypted_data
+    return sensitive_cipher.decrypt(encrypted_data)
+
+
+def hmac_blind_index(data):
+    """使用 HMAC-SHA256 计算敏感数据的盲索引，用于密文字段的等值查询"""
+    if data is None:
+        return None
+    key = base64.b64decode(Config.BLIND_INDEX_KEY.encode('utf-8'))  # 加载盲索引密钥
+    digest = hmac.new(key, data.encode('utf-8'), hashlib.sha256).digest()
+    return digest[:16].hex()  # 截取前 128 位，以十六进制字符串保存
+
+
+# 生成检索令牌时使用的 n-gram 长度
+NGRAM_SIZES = (1, 2, 3)
+
+
+def hmac_ngram_tokens(data, scope):
+    """将敏感数据切分为 n-gram 并计算 HMAC 令牌，用于密文字段的模糊检索"""
+    if not data:
+        return set()
+    key = base64.b64decode(Config.BLIND_INDEX_KEY.encode('utf-8'))  # 加载盲索引密钥
+    grams = {data[i:i + size] for size in NGRAM_SIZES for i in range(len(data) - size + 1)}
+    # 令牌以字段作用域区分，避免不同字段之间可以互相比对
+    return {hmac.new(key, f'{scope}:{gram}'.encode('utf-8'), hashlib.sha256).digest()[:8].hex() for gram in grams}
+
+
+def hmac_search_tokens(keyword, scope):
+    """计算检索关键字对应的 HMAC 令牌，取不超过最大 n-gram 长度的全部子串"""
+    if not keyword:
+        return set()
+    size = min(len(keyword), max(NGRAM_SIZES))
+    key = base64.b64decode(Config.BLIND_INDEX_KEY.encode('utf-8'))  # 加载盲索引密钥
+    grams = {keyword[i:i + size] for i in range(len(keyword) - size + 1)}
+    return {hmac.new(key, f'{scope}:{gram}'.encode('utf-8'), hashlib.sha256).digest()[:8].hex() for gram in grams}
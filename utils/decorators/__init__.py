@@ -1,2 +1,3 @@
+from .envelope_decorator import envelope_payload
 from .permission_decorator import permission_required
 from .token_decorator import token_required
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/envelope_decorator.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-11-01
+# 版本: 1.0
+# 描述: 数字信封请求体解密装饰器。
+"""
+
+import json
+from functools import wraps
+
+from flask import jsonify, request
+
+from utils.crypto_utils import aes256_decrypt_data
+from utils.format_utils import format_response
+
+
+def envelope_payload(f):
+    """
+    数字信封解密装饰器，放在 token_required 之后，将请求体作为参数传给被装饰的函数。
+
+    请求体包含 encrypted_data 时视为数字信封：携带 key_fingerprint 时使用当前用户注册的会话密钥，
+    否则使用 encrypted_key 中 RSA 加密的密钥，解密得到 JSON 请求体；其他请求体原样传入。
+    """
+
+    @wraps(f)
+    def wrapper(current_user, *args, **kwargs):
+        data = request.json
+        if isinstance(data, dict) and 'encrypted_data' in data:
+            if not data.get('key_fingerprint') and not data.get('encrypted_key'):
+                return jsonify(format_response(False, error='缺少 key_fingerprint 或 encrypted_key 参数')), 400
+
+            # 解密失败时返回 (错误信息, 状态码)
+            decrypted = aes256_decrypt_data(data, current_user.id)
+            if isinstance(decrypted, tuple):
+                return jsonify(format_response(False, error='无法解密请求数据，会话密钥可能已过期')), 400
+            try:
+                data = json.loads(decrypted)
+            except ValueError:
+                return jsonify(format_response(False, error='无效的 JSON')), 400
+
+        return f(current_user, data, *args, **kwargs)
+
+    return wrapper
@@ -9,9 +9,10 @@
 
 from functools import wraps
 
-from flask import jsonify
+from flask import jsonify, g
 
 from utils.format_utils import format_response
+from utils.permission_utils import check_permission_claims
 
 
 def permission_required(required_permission):
@@ -20,8 +21,11 @@ def permission_required(required_permission):
     def decorator(f):
         @wraps(f)
         def wrapper(current_user, *args, **kwargs):
-            # 检查当前用户是否拥有所需的权限
-            if not current_user.has_permission(required_permission):
+            # 权限版本一致时根据 Token 中的权限声明鉴权，否则查询数据库检查当前用户是否拥有所需的权限
+            allowed = check_permission_claims(current_user.id, g.get('token_claims'), required_permission)
+            if allowed is None:
+                allowed = current_user.has_permission(required_permission)
+            if not allowed:
                 return jsonify(format_response(False, error='权限不足，无法访问该资源')), 403
 
             # 如果权限验证通过，继续执行被装饰的函数
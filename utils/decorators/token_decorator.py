@@ -7,16 +7,28 @@
 # 描述: Token 验证装饰器。
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from functools import wraps
 
 import jwt
-from flask import jsonify, request
+from flask import jsonify, request, after_this_request, g
 
 from app.config import Config
 from app.models import User
-from extensions.db import redis_client
 from utils.format_utils import format_response
+from utils.principal_utils import principal_cache, load_principal
+from utils.revocation_utils import revocation_list, ensure_revocation_listener
+from utils.session_utils import SESSION_INVALID, SESSION_VALID, SESSION_REFRESHED, REFRESHED_TOKEN_HEADER, \
+    decode_token, validate_session, get_refreshed_token, discard_refreshed_token
+
+
+def attach_refreshed_token(token):
+    """在当前请求的响应头中附带刷新后的 Token"""
+
+    @after_this_request
+    def add_header(response):
+        response.headers[REFRESHED_TOKEN_HEADER] = token
+        return response
 
 
 def token_required(f):
@@ -32,37 +44,63 @@ def token_required(f):
             return jsonify(format_response(False, error='Token 丢失')), 403
 
         try:
-            # 解码 Token，验证其有效性
-            data = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['id'], is_deleted=False).first()
+            # 解码 Token，验证其有效性，已校验过的 Token 直接使用缓存的声明
+            data = decode_token(token)
+
+            # 当前时间超过了刷新时间时，校验通过后刷新 Token
+            device_id = data['device']
+            refresh_due = datetime.now() > datetime.fromtimestamp(data['refresh_time'])
+
+            if Config.TOKEN_VALIDATION_MODE == 'stateless':
+                # 无状态模式只校验签名、有效期和进程内的吊销列表，不访问 Redis
+                if not ensure_revocation_listener():
+                    return jsonify(format_response(False, error='服务暂不可用，请稍后再试')), 503
+
+                if revocation_list.is_revoked(data['id'], device_id, data['iat']):
+                    return jsonify(format_response(False, error='Token 已失效')), 403
+
+                # 停用和删除用户时都会吊销其全部 Token，未吊销的 Token 对应的用户处于正常状态
+                principal = {'id': data['id'], 'is_active': True, 'is_deleted': False}
+                status = SESSION_VALID
 
-            if not current_user:
+                # 未吊销的 Token 超过刷新时间时刷新，每个旧 Token 在当前进程中只生成一次新的 Token
+                new_token = get_refreshed_token(token, data) if refresh_due else None
+                if new_token:
+                    status = SESSION_REFRESHED
+            else:
+                # 超过刷新时间时预先生成新的 Token，由校验脚本在 Token 仍是设备当前的 Token 时原子地替换；
+                # 每个旧 Token 在当前进程中只生成一次，被拒绝替换后同一旧 Token 的请求不再生成
+                new_token = get_refreshed_token(token, data) if refresh_due else None
+
+                # 与 Redis 中该设备的 Token 摘要对比并完成刷新，进程内没有缓存用户凭据时一并读取，只需一次 Redis 往返
+                principal = principal_cache.get(data['id'])
+                status, principal_data = validate_session(data['id'], device_id, token,
+                                                          with_principal=principal is None, new_token=new_token)
+                if new_token and status != SESSION_REFRESHED:
+                    discard_refreshed_token(token, data)
+
+                if status == SESSION_INVALID:
+                    # 如果 Redis 中存储的 Token 与请求中的 Token 不一致，返回 403 错误
+                    return jsonify(format_response(False, error='Token 已失效')), 403
+
+                # 鉴权只读取缓存的用户凭据，接口实际用到其他字段时再按主键读取
+                if principal is None:
+                    principal = load_principal(data['id'], principal_data)
+
+            if not principal or principal['is_deleted']:
                 # 如果没有找到对应的用户，返回 403 错误
                 return jsonify(format_response(False, error='用户不存在')), 403
 
-            # 从 Redis 获取当前用户的 Token，并与请求中的 Token 对比
-            stored_token = redis_client.get(current_user.id)
-            if stored_token != token:
-                # 如果 Redis 中存储的 Token 与请求中的 Token 不一致，返回 403 错误
-                return jsonify(format_response(False, error='Token 已失效')), 403
-
-            # 获取当前时间和刷新时间
-            now = datetime.now()
-            refresh_time = datetime.fromtimestamp(data['refresh_time'])
-
-            # 如果当前时间超过了刷新时间，则生成新的 Token
-            if now > refresh_time:
-                new_token = jwt.encode(
-                    {
-                        'id': current_user.id,
-                        'exp': now + timedelta(seconds=Config.TOKEN_EXPIRY),
-                        'refresh_time': now + timedelta(seconds=Config.TOKEN_EXPIRY - Config.REFRESH_THRESHOLD)
-                    },
-                    Config.SECRET_KEY, algorithm="HS256"
-                )
-                # 将新的 Token 存入 Redis 中，并设置过期时间
-                redis_client.set(current_user.id, new_token, ex=Config.TOKEN_EXPIRY)
-                return jsonify({'new_token': new_token}), 200
+            # Token 已刷新时照常处理请求，通过响应头返回新的 Token；
+            # 宽限期内的旧 Token 同样照常处理，新的 Token 已由先完成刷新的请求返回
+            if status == SESSION_REFRESHED:
+                attach_refreshed_token(new_token)
+
+            # 记录当前请求的设备，用于只注销当前设备；记录 Token 声明，用于根据权限声明鉴权
+            g.device_id = device_id
+            g.token_claims = data
+
+            current_user = User.from_principal(principal)
 
         # 捕获 Token 过期异常
         except jwt.ExpiredSignatureError:
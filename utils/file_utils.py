@@ -7,8 +7,15 @@
 # 描述: 实现了数据的导入导出功能。
 """
 
+from tempfile import SpooledTemporaryFile
+
 import pandas as pd
 
+from utils.crypto_utils import aes256_gcm_encrypt_stream, aes256_gcm_decrypt_stream
+
+# 加解密 Excel 时明文缓冲区在内存中的最大字节数，超出后转存到临时文件
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
 
 def import_excel(file_path, sheet_name=0):
     """
@@ -87,3 +94,36 @@ def export_excel(dataframe, file_path, sheet_name='Sheet1'):
     row_count_len = len(dataframe)
 
     return row_count_len
+
+
+def import_encrypted_excel(src, key, sheet_name=0):
+    """
+    从流式加密的 Excel 文件对象导入数据。
+
+    :param src: 加密后的 Excel 文件对象
+    :param key: AES-256 密钥
+    :param sheet_name: 要导入的工作表名称或索引，默认为第一个
+    :return: DataFrame
+    """
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        # 逐块解密并校验，全部通过认证后再交给 pandas 解析
+        aes256_gcm_decrypt_stream(src, buffer, key)
+        buffer.seek(0)
+        return import_excel(buffer, sheet_name=sheet_name)
+
+
+def export_encrypted_excel(dataframe, dst, key, sheet_name='Sheet1'):
+    """
+    将 DataFrame 导出为流式加密的 Excel 文件对象。
+
+    :param dataframe: 要导出的 DataFrame
+    :param dst: 加密后数据写入的文件对象
+    :param key: AES-256 密钥
+    :param sheet_name: 要保存的工作表名称，默认为 'Sheet1'
+    :return row_count_len: 记录行数
+    """
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        row_count_len = export_excel(dataframe, buffer, sheet_name=sheet_name)
+        buffer.seek(0)
+        aes256_gcm_encrypt_stream(buffer, dst, key)
+    return row_count_len
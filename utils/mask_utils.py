@@ -20,11 +20,15 @@ def mask_name(name):
 
 def mask_id_number(id_number):
     # 证件号码脱敏
+    if not id_number:
+        return ''
     return id_number[:2] + '*' * (len(id_number) - 4) + id_number[-2:]
 
 
 def mask_phone_number(phone_number):
     # 手机号脱敏
+    if not phone_number:
+        return ''
     return phone_number[:2] + '*' * (len(phone_number) - 7) + phone_number[-2:]
 
 
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/password_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-27
+# 版本: 1.0
+# 描述: 密码哈希的生成与校验，在独立的有界线程池中执行，避免登录高峰占满处理请求的线程。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.config import Config
+
+
+class PasswordQueueFull(Exception):
+    """等待计算密码哈希的任务已达上限"""
+
+
+# 密码哈希线程池，首次使用时创建
+_executor = None
+
+# 正在执行和排队的密码哈希任务数量上限
+_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE)
+
+
+def get_password_executor():
+    """获取密码哈希线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='password')
+    return _executor
+
+
+def run_password_task(func, *args):
+    """在密码哈希线程池中执行任务并等待结果，排队的任务已满时抛出 PasswordQueueFull"""
+    if not _slots.acquire(blocking=False):
+        raise PasswordQueueFull()
+    try:
+        return get_password_executor().submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    """按配置的算法和参数生成密码哈希"""
+    return run_password_task(generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    """校验密码是否与哈希一致"""
+    return run_password_task(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def current_hash_method():
+    """配置的算法和参数在哈希中的完整写法，例如 scrypt 对应 scrypt:32768:8:1"""
+    return generate_password_hash('', Config.PASSWORD_HASH_METHOD).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """判断密码哈希的算法或参数是否与当前配置不一致"""
+    return password_hash.split('$', 1)[0] != current_hash_method()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/permission_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-30
+# 版本: 1.0
+# 描述: Token 中的权限声明，以位图记录用户的全部权限，权限版本一致时直接据此鉴权，无需查询数据库。
+"""
+
+import threading
+import time
+from functools import lru_cache
+
+from app.config import Config
+from app.models import Permission, RolePermission, UserRole
+from extensions.db import db, redis_client
+from utils.cache_utils import TTLCache
+
+# 全局权限版本在 Redis 中的键，角色的权限或权限名称变化时递增
+GLOBAL_PERMISSION_VERSION_KEY = 'permission_version'
+
+# 递增权限版本，新版本取当前毫秒时间戳和原版本加一中的较大值，Redis 数据丢失后也不会与已签发的版本重复
+# KEYS[1] 权限版本键，ARGV[1] 当前毫秒时间戳，ARGV[2] 为 1 时只在版本不存在时设置
+BUMP_VERSION_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and ARGV[2] == '1' then
+    return tonumber(current)
+end
+local version = tonumber(ARGV[1])
+if current and tonumber(current) >= version then
+    version = tonumber(current) + 1
+end
+redis.call('SET', KEYS[1], version)
+return version
+"""
+
+# 进程内缓存的权限版本，其他进程中的变更最多延迟一个有效期生效
+permission_version_cache = TTLCache(Config.PRINCIPAL_CACHE_SIZE, Config.PERMISSION_VERSION_CACHE_TTL)
+
+# 权限名称到权限ID的映射，以及权限ID到位图中位序的映射，全局权限版本变化时重新加载
+_permission_ids = {'version': None, 'ids': {}, 'bits': {}}
+_permission_ids_lock = threading.Lock()
+
+
+def user_permission_version_key(user_id):
+    """用户权限版本在 Redis 中的键，用户的角色变化时递增"""
+    return f"permission_version:{user_id}"
+
+
+@lru_cache(maxsize=None)
+def get_bump_version_script():
+    """注册递增权限版本的脚本，之后通过 EVALSHA 调用"""
+    return redis_client.register_script(BUMP_VERSION_SCRIPT)
+
+
+def bump_permission_version(user_id=None):
+    """递增指定用户或全局的权限版本，已签发 Token 中的权限声明随之失效，鉴权回退到查询数据库"""
+    key = user_permission_version_key(user_id) if user_id else GLOBAL_PERMISSION_VERSION_KEY
+    get_bump_version_script()(keys=[key], args=[int(time.time() * 1000), 0])
+    if user_id:
+        permission_version_cache.delete(user_id)
+    else:
+        permission_version_cache.clear()
+
+
+def get_permission_versions(user_id):
+    """获取 [全局权限版本, 用户权限版本]，进程内缓存一小段时间，版本不存在时初始化"""
+    versions = permission_version_cache.get(user_id)
+    if versions is None:
+        keys = [GLOBAL_PERMISSION_VERSION_KEY, user_permission_version_key(user_id)]
+        versions = redis_client.mget(keys)
+        versions = [int(version) if version is not None else
+                    int(get_bump_version_script()(keys=[key], args=[int(time.time() * 1000), 1]))
+                    for key, version in zip(keys, versions)]
+        permission_version_cache.set(user_id, versions)
+    return versions
+
+
+def load_permission_index(version):
+    """
+    加载全局权限版本对应的权限映射，有效权限按权限ID排序后依次分配位序，位图长度只与有效权限的数量有关。
+
+    权限的增删和改名都会递增全局权限版本，同一版本下各进程加载的位序一致。
+    """
+    if _permission_ids['version'] != version:
+        with _permission_ids_lock:
+            if _permission_ids['version'] != version:
+                ids, bits = {}, {}
+                for permission_id, name in (db.session.query(Permission.id, Permission.name)
+                                            .filter(Permission.is_deleted == False)
+                                            .order_by(Permission.id)):
+                    ids.setdefault(name, []).append(permission_id)
+                    bits[permission_id] = len(bits)
+                _permission_ids.update(version=version, ids=ids, bits=bits)
+    return _permission_ids
+
+
+def permission_claims(user_id, previous_claims=None):
+    """
+    生成 Token 中的权限声明，先读取版本再查询权限，查询期间的变更会使版本不一致而不会使用过期的权限。
+
+    :param previous_claims: 刷新 Token 时传入旧 Token 的声明，权限版本未变化时直接沿用其中的权限，无需查询数据库
+    """
+    versions = get_permission_versions(user_id)
+    if previous_claims and 'perms' in previous_claims and list(previous_claims.get('pv', [])) == versions:
+        return {'perms': previous_claims['perms'], 'pv': versions}
+    permission_ids = (db.session.query(Permission.id)
+                      .join(RolePermission, RolePermission.permission_id == Permission.id)
+                      .join(UserRole, UserRole.role_id == RolePermission.role_id)
+                      .filter(UserRole.user_id == user_id,
+                              UserRole.is_deleted == False,
+                              RolePermission.is_deleted == False,
+                              Permission.is_deleted == False)
+                      .distinct())
+    bits = load_permission_index(versions[0])['bits']
+    mask = 0
+    for permission_id, in permission_ids:
+        if permission_id not in bits:
+            # 权限映射加载后才新增的权限，不写入权限声明，鉴权时回退到查询数据库
+            return {'pv': versions}
+        mask |= 1 << bits[permission_id]
+    return {'perms': format(mask, 'x'), 'pv': versions}
+
+
+def get_permission_bits(permission_name, version):
+    """获取权限名称对应的全部位序，全局权限版本变化后重新加载"""
+    index = load_permission_index(version)
+    return [index['bits'][permission_id] for permission_id in index['ids'].get(permission_name, [])]
+
+
+def check_permission_claims(user_id, claims, permission_name):
+    """
+    根据 Token 中的权限声明判断用户是否具有指定权限。
+
+    :return: 权限版本一致时返回是否具有该权限，缺少声明或版本不一致时返回 None，由调用方查询数据库
+    """
+    if not claims or 'perms' not in claims or 'pv' not in claims:
+        return None
+    versions = get_permission_versions(user_id)
+    if list(claims['pv']) != versions:
+        return None
+    mask = int(claims['perms'], 16)
+    return any(mask >> bit & 1 for bit in get_permission_bits(permission_name, versions[0]))
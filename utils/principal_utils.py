@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/principal_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-24
+# 版本: 1.0
+# 描述: 鉴权使用的用户凭据缓存，Redis 中保存精简的用户状态，进程内再缓存一小段时间。
+"""
+
+import json
+
+from app.config import Config
+from app.models import User
+from extensions.db import db, redis_client
+from utils.cache_utils import TTLCache
+
+# 进程内的用户凭据缓存，有效期较短，其他进程中的变更最多延迟一个有效期生效
+principal_cache = TTLCache(Config.PRINCIPAL_CACHE_SIZE, Config.PRINCIPAL_CACHE_TTL)
+
+
+def principal_key(user_id):
+    """用户凭据在 Redis 中的键"""
+    return f"principal:{user_id}"
+
+
+def load_principal(user_id, data=None):
+    """
+    读取用户凭据，依次查找进程内缓存、Redis 和数据库，用户不存在时返回 None。
+
+    :param data: 已从 Redis 中读取的凭据数据，传入时（包括 Redis 中不存在时的空值）不再查找缓存和 Redis
+    """
+    if data is None:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+        data = redis_client.get(principal_key(user_id))
+
+    if data:
+        principal = json.loads(data)
+    else:
+        # 只读取鉴权需要的状态字段
+        row = db.session.query(User.id, User.is_active, User.is_deleted).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        principal = {'id': row.id, 'is_active': bool(row.is_active), 'is_deleted': row.is_deleted}
+        redis_client.set(principal_key(user_id), json.dumps(principal), ex=Config.PRINCIPAL_REDIS_TTL)
+
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id):
+    """用户状态变更后清除缓存的用户凭据"""
+    principal_cache.delete(user_id)
+    redis_client.delete(principal_key(user_id))
+
+
+def invalidate_principals(user_ids, pipeline):
+    """批量清除用户凭据缓存，Redis 中的删除命令加入传入的管道，由调用方统一执行"""
+    for user_id in user_ids:
+        principal_cache.delete(user_id)
+    if user_ids:
+        pipeline.delete(*[principal_key(user_id) for user_id in user_ids])
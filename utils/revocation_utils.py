@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/revocation_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-29
+# 版本: 1.0
+# 描述: Token 吊销列表，无状态校验模式下在进程内判断 Token 是否已吊销，通过 Redis 发布订阅在各进程间同步。
+"""
+
+import json
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from app.config import Config
+from extensions.db import redis_client
+
+# 吊销记录在 Redis 中的有序集合，成员为 “用户ID” 或 “用户ID:设备标识”，分数为吊销时间
+REVOCATION_KEY = 'token_revocations'
+
+# 发布吊销记录的频道
+REVOCATION_CHANNEL = 'token_revocations'
+
+
+def revocation_member(user_id, device_id=None):
+    """吊销记录的成员，指定设备时只吊销该设备的 Token，否则吊销用户全部设备的 Token"""
+    return f"{user_id}:{device_id}" if device_id else str(user_id)
+
+
+class RevocationList:
+    """
+    进程内的吊销列表，记录每个用户（或设备）的吊销时间，签发时间不晚于吊销时间的 Token 视为已吊销。
+
+    超过 Token 有效期的记录不再有意义，定期清理，列表大小只与有效期内的吊销次数有关。
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._pruned_at = time.time()
+
+    def add(self, member, revoked_at):
+        """添加吊销记录，同一成员保留最晚的吊销时间"""
+        with self._lock:
+            if revoked_at > self._revoked.get(member, 0):
+                self._revoked[member] = revoked_at
+            now = time.time()
+            if now - self._pruned_at > 60:
+                self._revoked = {member: revoked_at for member, revoked_at in self._revoked.items()
+                                 if revoked_at > now - self.ttl}
+                self._pruned_at = now
+
+    def is_revoked(self, user_id, device_id, issued_at):
+        """判断在指定时间签发的 Token 是否已吊销"""
+        for member in (revocation_member(user_id), revocation_member(user_id, device_id)):
+            revoked_at = self._revoked.get(member)
+            if revoked_at is not None and issued_at <= revoked_at:
+                return True
+        return False
+
+    def mark_synced(self):
+        """已从 Redis 中加载全部吊销记录"""
+        self._synced.set()
+
+    def wait_synced(self, timeout):
+        """等待首次同步完成，超时后返回 False"""
+        return self._synced.wait(timeout)
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+# 当前进程的吊销列表
+revocation_list = RevocationList(Config.TOKEN_EXPIRY)
+
+
+def publish_revocations(members, pipeline=None):
+    """
+    记录并发布吊销，同时立即更新当前进程的吊销列表。
+
+    :param pipeline: 传入时 Redis 命令加入该管道，由调用方统一执行，否则单独使用一个管道执行
+    """
+    if not members:
+        return
+    now = time.time()
+    pipe = pipeline if pipeline is not None else redis_client.pipeline(transaction=False)
+    pipe.zadd(REVOCATION_KEY, {member: now for member in members})
+    pipe.zremrangebyscore(REVOCATION_KEY, '-inf', now - Config.TOKEN_EXPIRY)
+    pipe.publish(REVOCATION_CHANNEL, json.dumps({'members': members, 'revoked_at': now}))
+    if pipeline is None:
+        pipe.execute()
+    for member in members:
+        revocation_list.add(member, now)
+
+
+def sync_revocations():
+    """订阅吊销频道并加载 Redis 中的吊销记录，之后持续接收其他进程发布的吊销，连接断开时重连并重新加载"""
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            # 先订阅再加载，加载期间发布的吊销不会遗漏
+            pubsub.subscribe(REVOCATION_CHANNEL)
+            entries = redis_client.zrangebyscore(REVOCATION_KEY, time.time() - Config.TOKEN_EXPIRY, '+inf',
+                                                 withscores=True)
+            for member, revoked_at in entries:
+                revocation_list.add(member.decode('utf-8') if isinstance(member, bytes) else member, revoked_at)
+            revocation_list.mark_synced()
+
+            for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                data = json.loads(message['data'])
+                for member in data['members']:
+                    revocation_list.add(member, data['revoked_at'])
+        except RedisError:
+            time.sleep(Config.REVOCATION_RETRY_INTERVAL)
+
+
+# 同步线程，首次使用时在当前进程中启动，避免在多进程部署的主进程中启动后无法随 fork 继承
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_revocation_listener():
+    """在当前进程中启动吊销列表的同步线程，等待首次同步完成，超时后返回 False"""
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = threading.Thread(target=sync_revocations, name='token-revocations', daemon=True)
+                _listener.start()
+    return revocation_list.wait_synced(Config.REVOCATION_SYNC_TIMEOUT)
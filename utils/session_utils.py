@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/session_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-25
+# 版本: 1.0
+# 描述: 登录会话的 Token 生成、存储与校验，校验和刷新通过 Redis Lua 脚本一次完成。
+"""
+
+import hashlib
+import re
+import secrets
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import jwt
+
+from app.config import Config
+from extensions.db import redis_client
+from utils.cache_utils import TTLCache
+from utils.crypto_utils import revoke_envelope_sessions
+from utils.permission_utils import permission_claims
+from utils.principal_utils import principal_key
+from utils.revocation_utils import revocation_member, publish_revocations
+
+# 会话校验结果
+SESSION_INVALID = 0  # Token 与存储的不一致
+SESSION_VALID = 1  # Token 有效，无需刷新
+SESSION_REFRESHED = 2  # Token 有效，已替换为刷新后的 Token
+SESSION_SUPERSEDED = 3  # Token 已被其他请求刷新，仍在宽限期内
+
+# 返回刷新后 Token 的响应头
+REFRESHED_TOKEN_HEADER = 'X-Refreshed-Token'
+
+# 客户端提供的设备标识只允许字母、数字、下划线和短横线
+DEVICE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# 已校验签名的 Token 声明，以 Token 摘要为键，有效期不超过 Token 的过期时间和刷新时间
+token_claims_cache = TTLCache(Config.TOKEN_CACHE_SIZE, Config.TOKEN_EXPIRY)
+
+# 刷新后的 Token，以旧 Token 摘要为键，每个旧 Token 在每个进程中只刷新一次；值为空字符串表示旧 Token 已被拒绝刷新
+refreshed_token_cache = TTLCache(Config.TOKEN_CACHE_SIZE, Config.TOKEN_EXPIRY)
+
+# 每个用户的会话保存在一个哈希中，字段为设备标识，值为 “Token 摘要:过期时间戳”，
+# 刷新后旧 Token 的摘要保存在 “设备标识:previous” 字段中，宽限期结束后失效
+
+# 写入设备的 Token，并清理已过期的设备
+# KEYS[1] 会话键，ARGV[1] 设备标识，ARGV[2] Token 摘要，ARGV[3] 当前时间戳，ARGV[4] Token 有效期
+STORE_SESSION_SCRIPT = """
+local now = tonumber(ARGV[3])
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 1, #fields, 2 do
+    local expiry = tonumber(string.match(fields[i + 1], ':(%d+)$'))
+    if expiry == nil or expiry <= now then
+        redis.call('HDEL', KEYS[1], fields[i])
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. ':' .. (now + tonumber(ARGV[4])))
+redis.call('HDEL', KEYS[1], ARGV[1] .. ':previous')
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+# 校验请求中的 Token，并顺带读取用户凭据；传入刷新后 Token 的摘要时，在设备当前的 Token 仍是请求中的 Token 时
+# 原子地替换，并发请求中只有一个能完成刷新，校验、刷新和读取用户凭据只需一次 Redis 往返
+# KEYS[1] 会话键，KEYS[2] 用户凭据键
+# ARGV[1] 设备标识，ARGV[2] 请求中 Token 的摘要，ARGV[3] 当前时间戳，ARGV[4] 是否读取用户凭据，
+# ARGV[5] 刷新后 Token 的摘要（不刷新时为空），ARGV[6] Token 有效期，ARGV[7] 宽限期
+VALIDATE_SESSION_SCRIPT = """
+local principal = ''
+if ARGV[4] == '1' then
+    principal = redis.call('GET', KEYS[2]) or ''
+end
+
+local now = tonumber(ARGV[3])
+local function matches(value)
+    if not value then
+        return false
+    end
+    local digest, expiry = string.match(value, '^(.*):(%d+)$')
+    return digest == ARGV[2] and tonumber(expiry) > now
+end
+
+if matches(redis.call('HGET', KEYS[1], ARGV[1])) then
+    if ARGV[5] == '' then
+        return {1, principal}
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[5] .. ':' .. (now + tonumber(ARGV[6])))
+    if tonumber(ARGV[7]) > 0 then
+        redis.call('HSET', KEYS[1], ARGV[1] .. ':previous', ARGV[2] .. ':' .. (now + tonumber(ARGV[7])))
+    end
+    if redis.call('TTL', KEYS[1]) < tonumber(ARGV[6]) then
+        redis.call('EXPIRE', KEYS[1], ARGV[6])
+    end
+    return {2, principal}
+end
+-- 宽限期内仍接受刚被刷新的 Token，不再重复刷新
+if matches(redis.call('HGET', KEYS[1], ARGV[1] .. ':previous')) then
+    return {3, principal}
+end
+return {0, principal}
+"""
+
+
+def session_key(user_id):
+    """用户会话在 Redis 中的键"""
+    return f"session:{user_id}"
+
+
+def token_digest(token):
+    """计算 Token 的摘要，Redis 和进程内缓存中只保存摘要"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+
+def normalize_device_id(device_id):
+    """校验客户端提供的设备标识，未提供或格式不正确时随机生成"""
+    if device_id and DEVICE_ID_PATTERN.match(str(device_id)):
+        return str(device_id)
+    return secrets.token_hex(8)
+
+
+def generate_token(user_id, device_id, previous_claims=None):
+    """
+    生成用户在指定设备上的 Token，刷新时间以时间戳保存，签发时间精确到微秒，用于判断是否已吊销。
+
+    Token 中同时记录用户的权限位图和签发时的权限版本，刷新 Token 时传入旧 Token 的声明，权限版本未变化时沿用其中的权限。
+    """
+    now = datetime.now()
+    return jwt.encode(
+        {
+            'id': user_id,
+            'device': device_id,
+            'iat': now.timestamp(),
+            'exp': now + timedelta(seconds=Config.TOKEN_EXPIRY),
+            'refresh_time': (now + timedelta(seconds=Config.TOKEN_EXPIRY - Config.REFRESH_THRESHOLD)).timestamp(),
+            **permission_claims(user_id, previous_claims)
+        },
+        Config.JWT_SECRET_KEY, algorithm="HS256"
+    )
+
+
+def decode_token(token):
+    """解码 Token 并校验签名和有效期，同一 Token 在刷新时间前只校验一次签名"""
+    digest = token_digest(token)
+    claims = token_claims_cache.get(digest)
+    if claims is None:
+        claims = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"], options={'require': ['device', 'iat']})
+        ttl = min(claims['exp'], claims['refresh_time']) - time.time()
+        if ttl > 0:
+            token_claims_cache.set(digest, claims, ttl)
+    return claims
+
+
+def get_refreshed_token(token, claims):
+    """
+    获取旧 Token 刷新后的 Token，每个旧 Token 在每个进程中只生成一次，客户端未及时替换旧 Token 时返回同一个 Token。
+
+    :return: 刷新后的 Token，旧 Token 已被拒绝刷新时返回 None
+    """
+    digest = token_digest(token)
+    new_token = refreshed_token_cache.get(digest)
+    if new_token is None:
+        new_token = generate_token(claims['id'], claims['device'], claims)
+        refreshed_token_cache.set(digest, new_token, claims['exp'] - time.time())
+    return new_token or None
+
+
+def discard_refreshed_token(token, claims):
+    """丢弃 Redis 拒绝替换的刷新后 Token，同一旧 Token 之后的请求不再生成新的 Token"""
+    ttl = claims['exp'] - time.time()
+    if ttl > 0:
+        refreshed_token_cache.set(token_digest(token), '', ttl)
+
+
+@lru_cache(maxsize=None)
+def get_session_scripts():
+    """注册会话脚本，之后通过 EVALSHA 调用"""
+    return redis_client.register_script(STORE_SESSION_SCRIPT), redis_client.register_script(VALIDATE_SESSION_SCRIPT)
+
+
+def store_token(user_id, device_id, token):
+    """将用户在指定设备上的 Token 摘要存入 Redis 中，同一设备上原有的 Token 随之失效"""
+    store_script, _ = get_session_scripts()
+    store_script(keys=[session_key(user_id)],
+                 args=[device_id, token_digest(token), int(time.time()), Config.TOKEN_EXPIRY])
+
+
+def revoke_session(user_id, device_id=None):
+    """
+    删除用户指定设备或全部设备的 Token（要求重新登录）并发布吊销，清空进程内已校验的 Token 声明。
+
+    用户注册的 AES 会话密钥不区分设备，注销任一设备时一并删除，客户端重新登录后重新注册。
+    """
+    with redis_client.pipeline(transaction=False) as pipeline:
+        if device_id:
+            pipeline.hdel(session_key(user_id), device_id, f"{device_id}:previous")
+        else:
+            pipeline.delete(session_key(user_id))
+        revoke_envelope_sessions([user_id], pipeline)
+        publish_revocations([revocation_member(user_id, device_id)], pipeline)
+        pipeline.execute()
+    token_claims_cache.clear()
+
+
+def revoke_sessions(user_ids, pipeline):
+    """批量删除用户全部设备的 Token 和 AES 会话密钥并发布吊销，Redis 命令加入传入的管道，由调用方统一执行"""
+    if user_ids:
+        pipeline.delete(*[session_key(user_id) for user_id in user_ids])
+        revoke_envelope_sessions(user_ids, pipeline)
+        publish_revocations([revocation_member(user_id) for user_id in user_ids], pipeline)
+    token_claims_cache.clear()
+
+
+def validate_session(user_id, device_id, token, with_principal=False, new_token=None):
+    """
+    校验请求中的 Token 是否为用户在该设备上当前的 Token，或宽限期内刚被刷新的 Token。
+
+    :param new_token: 刷新后的 Token，传入时在校验通过后原子地替换设备当前的 Token，旧 Token 在宽限期内仍然有效
+    :return: (校验结果, Redis 中的用户凭据)，未读取用户凭据时为 None，读取后 Redis 中不存在时为空字符串；
+             new_token 只有在校验结果为 SESSION_REFRESHED 时才生效，否则应丢弃
+    """
+    _, validate_script = get_session_scripts()
+    status, principal = validate_script(
+        keys=[session_key(user_id), principal_key(user_id)],
+        args=[device_id, token_digest(token), int(time.time()), int(with_principal),
+              token_digest(new_token) if new_token else '', Config.TOKEN_EXPIRY, Config.TOKEN_GRACE_PERIOD],
+    )
+    return int(status), principal if with_principal else None
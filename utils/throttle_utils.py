@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/throttle_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-26
+# 版本: 1.0
+# 描述: 登录限流，账户失败计数与锁定、客户端 IP 失败次数的滑动窗口限流均通过 Redis Lua 脚本原子完成。
+"""
+
+import os
+import time
+from functools import lru_cache
+
+from app.config import Config
+from extensions.db import redis_client
+
+# 登录检查结果
+LOGIN_ALLOWED = 0  # 允许登录
+LOGIN_LOCKED = 1  # 账户已锁定
+LOGIN_RATE_LIMITED = 2  # 客户端 IP 登录失败过于频繁
+
+# 检查账户是否已锁定，以及客户端 IP 在滑动窗口内的登录失败次数是否已达上限，未获取到客户端 IP 时不传入窗口键
+# 只统计失败的登录，共用出口 IP 的正常用户（反向代理、校园网 NAT）不会因成功登录而被限流
+# KEYS[1] 账户锁定键，KEYS[2] IP 滑动窗口键（可选）
+# ARGV[1] 当前时间（毫秒），ARGV[2] 窗口长度（毫秒），ARGV[3] 窗口内最多失败次数
+CHECK_LOGIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 1
+end
+
+if #KEYS > 1 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+    if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[3]) then
+        return 2
+    end
+end
+return 0
+"""
+
+# 记录一次登录失败，首次失败时设置计数的过期时间，达到最大次数时锁定账户并清除计数，同时计入客户端 IP 的滑动窗口
+# KEYS[1] 失败次数键，KEYS[2] 账户锁定键，KEYS[3] IP 滑动窗口键（可选）
+# ARGV[1] 最大登录尝试次数，ARGV[2] 锁定时间（秒），ARGV[3] 当前时间（毫秒），ARGV[4] 窗口长度（毫秒），ARGV[5] 本次失败的唯一标识
+RECORD_FAILURE_SCRIPT = """
+if #KEYS > 2 then
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[5])
+    redis.call('PEXPIRE', KEYS[3], ARGV[4])
+end
+
+local attempts = redis.call('INCR', KEYS[1])
+if attempts == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if attempts >= tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[2], 'locked', 'EX', ARGV[2])
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+
+def lock_key(username):
+    """账户锁定标记在 Redis 中的键"""
+    return f"lock_{username}"
+
+
+def attempts_key(username):
+    """登录失败次数在 Redis 中的键"""
+    return f"login_attempts_{username}"
+
+
+def ip_window_key(ip):
+    """客户端 IP 登录请求滑动窗口在 Redis 中的键"""
+    return f"login_ip:{ip}"
+
+
+@lru_cache(maxsize=None)
+def get_login_scripts():
+    """注册登录限流脚本，之后通过 EVALSHA 调用"""
+    return redis_client.register_script(CHECK_LOGIN_SCRIPT), redis_client.register_script(RECORD_FAILURE_SCRIPT)
+
+
+def login_keys(keys, ip):
+    """未获取到客户端 IP 时只检查账户，不使用 IP 滑动窗口"""
+    return keys + [ip_window_key(ip)] if ip else keys
+
+
+def check_login(username, ip):
+    """登录前检查账户锁定和客户端 IP 限流，一次 Redis 往返，返回登录检查结果"""
+    check_script, _ = get_login_scripts()
+    return int(check_script(
+        keys=login_keys([lock_key(username)], ip),
+        args=[int(time.time() * 1000), Config.LOGIN_IP_WINDOW * 1000, Config.LOGIN_IP_LIMIT],
+    ))
+
+
+def record_login_failure(username, ip=None):
+    """记录一次登录失败并计入客户端 IP 的滑动窗口，返回账户是否因此被锁定"""
+    _, record_script = get_login_scripts()
+    return bool(record_script(
+        keys=login_keys([attempts_key(username), lock_key(username)], ip),
+        args=[Config.MAX_LOGIN_ATTEMPTS, Config.LOCK_TIME, int(time.time() * 1000), Config.LOGIN_IP_WINDOW * 1000,
+              os.urandom(8).hex()],
+    ))
+
+
+def reset_login_failures(username):
+    """登录成功后清除失败次数"""
+    redis_client.delete(attempts_key(username))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+# 文件名称: utils/wechat_utils.py
+# 作者: 罗嘉淳
+# 创建日期: 2024-10-28
+# 版本: 1.0
+# 描述: 微信接口客户端，复用长连接，设置超时、连接失败时有限次数的重试和熔断，接口地址可配置为本地模拟服务。
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import Config
+
+
+# 表示微信接口自身故障的错误码，-1 为系统繁忙
+WECHAT_BUSY_ERRCODES = (-1,)
+
+
+class WeChatUnavailable(Exception):
+    """微信接口超时、出错或已熔断"""
+
+
+class CircuitBreaker:
+    """熔断器，连续失败达到阈值后在一段时间内直接拒绝请求，之后放行一个试探请求"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """判断当前是否允许发起请求"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            # 熔断时间结束后只放行一个试探请求
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """请求成功，关闭熔断器"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """请求失败，连续失败达到阈值或试探请求失败时打开熔断器"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class WeChatClient:
+    """微信接口客户端，线程安全，在进程内共用"""
+
+    def __init__(self, base_url=None, session=None):
+        self.base_url = (base_url or Config.WECHAT_API_BASE_URL).rstrip('/')
+        self.timeout = (Config.WECHAT_CONNECT_TIMEOUT, Config.WECHAT_READ_TIMEOUT)
+        self.breaker = CircuitBreaker(Config.WECHAT_BREAKER_THRESHOLD, Config.WECHAT_BREAKER_RESET)
+        self.session = session or self.create_session()
+
+    @staticmethod
+    def create_session():
+        """
+        创建复用长连接的会话，只有连接失败按指数退避重试。
+
+        登录凭证 code 只能使用一次，请求一旦发出，微信可能已经消费了 code，读取超时或 5xx 响应后重试只会得到
+        “code 已被使用”的错误，因此不重试。
+        """
+        retry = Retry(total=Config.WECHAT_MAX_RETRIES, connect=Config.WECHAT_MAX_RETRIES, read=0, status=0, other=0,
+                      backoff_factor=Config.WECHAT_RETRY_BACKOFF, allowed_methods=('GET',), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.WECHAT_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get(self, path, params):
+        """发送 GET 请求并解析 JSON 响应"""
+        if not self.breaker.allow():
+            raise WeChatUnavailable('微信接口已熔断')
+        try:
+            response = self.session.get(f'{self.base_url}{path}', params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.breaker.record_failure()
+            raise WeChatUnavailable(str(e))
+
+        # 微信接口出错时仍返回 HTTP 200，errcode 为 -1 表示系统繁忙，同样计为失败；其他错误码属于请求本身的问题
+        if isinstance(data, dict) and data.get('errcode') in WECHAT_BUSY_ERRCODES:
+            self.breaker.record_failure()
+            raise WeChatUnavailable(data.get('errmsg') or '微信系统繁忙')
+        self.breaker.record_success()
+        return data
+
+    def code2session(self, code):
+        """使用登录凭证 code 换取 openid 和 session_key"""
+        return self.get('/sns/jscode2session', {
+            'appid': Config.WECHAT_APP_ID,
+            'secret': Config.WECHAT_APP_SECRET,
+            'js_code': code,
+            'grant_type': 'authorization_code',
+        })
+
+
+# 进程内共用的微信接口客户端，首次使用时创建
+_client = None
+
+
+def get_wechat_client():
+    """获取进程内共用的微信接口客户端"""
+    global _client
+    if _client is None:
+        _client = WeChatClient()
+    return _client
+
+
+def set_wechat_client(client):
+    """替换进程内共用的微信接口客户端，用于测试或压测时接入其他实现"""
+    global _client
+    _client = client